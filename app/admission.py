@@ -0,0 +1,285 @@
+import asyncio
+import functools
+import math
+import time
+import weakref
+from collections import Counter, deque
+from typing import Deque, Dict
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import release_connection, arelease_connection
+from app.metrics import record_admission, set_admission_state
+
+
+# ==============================
+# Admission Control
+# ==============================
+#
+# /query, /query/stream and /upload hold a worker thread and an LLM / Cohere
+# quota for seconds each. Without limits, one tenant firing dozens of
+# parallel requests takes every thread and everyone else waits behind them.
+# Each kind of work gets a controller with:
+#
+#   - a global concurrency limit (ADMISSION_<KIND>_CONCURRENCY)
+#   - a per-user limit (ADMISSION_USER_CONCURRENCY)
+#   - weighted fair queuing between the users waiting for a slot: start-time
+#     fair queuing, so a user with 20 queued requests doesn't delay a user
+#     with one by more than one request's turn (ADMISSION_TENANT_WEIGHTS
+#     gives some tenants a bigger share)
+#   - load shedding: past ADMISSION_MAX_QUEUE waiting requests (or
+#     ADMISSION_USER_MAX_QUEUE for one user), or after waiting
+#     ADMISSION_QUEUE_TIMEOUT_SECONDS, the request gets 429 + Retry-After
+#
+# Requests wait on the event loop, not on a threadpool thread, and without
+# a pooled connection: the session the dependencies used (get_current_user's
+# user lookup) is released before waiting. Limits and queues are per worker
+# process.
+
+
+class AdmissionRejected(Exception):
+    """Request shed by the admission controller"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "tag", "future")
+
+    def __init__(self, user_id: int, tag: float, future: asyncio.Future):
+        self.user_id = user_id
+        self.tag = tag
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Concurrency limits + weighted fair queue for one kind of work. Only used
+    from the event loop, so it needs no locks.
+    """
+
+    def __init__(self, kind: str, concurrency_setting: str):
+        self.kind = kind
+        self.concurrency_setting = concurrency_setting
+        self.running = 0
+        self.running_per_user: Counter = Counter()
+        self.queues: Dict[int, Deque[_Waiter]] = {}
+        self.queued = 0
+        # Start-time fair queuing: virtual time + each user's last finish tag
+        self.virtual_time = 0.0
+        self.last_finish: Dict[int, float] = {}
+
+    @property
+    def limit(self) -> int:
+        return getattr(settings, self.concurrency_setting)
+
+    def _weight(self, user_id: int) -> float:
+        return max(settings.ADMISSION_TENANT_WEIGHTS.get(user_id, 1.0), 0.01)
+
+    def _can_run(self, user_id: int) -> bool:
+        return self.running < self.limit and self.running_per_user[user_id] < settings.ADMISSION_USER_CONCURRENCY
+
+    def _start(self, user_id: int):
+        self.running += 1
+        self.running_per_user[user_id] += 1
+
+    def _publish(self):
+        set_admission_state(self.kind, self.running, self.queued)
+
+    def _dispatch(self):
+        """Hand free slots to the waiting users with the smallest start tags"""
+        while self.running < self.limit:
+            eligible = [
+                queue[0] for user_id, queue in self.queues.items()
+                if self.running_per_user[user_id] < settings.ADMISSION_USER_CONCURRENCY
+            ]
+            if not eligible:
+                break
+            waiter = min(eligible, key=lambda w: w.tag)
+            self._dequeue(waiter)
+            self.virtual_time = max(self.virtual_time, waiter.tag)
+            self._start(waiter.user_id)
+            waiter.future.set_result(True)
+
+    def _dequeue(self, waiter: _Waiter):
+        queue = self.queues[waiter.user_id]
+        queue.remove(waiter)
+        if not queue:
+            del self.queues[waiter.user_id]
+        self.queued -= 1
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        record_admission(self.kind, rejected=reason)
+        return AdmissionRejected(reason, settings.ADMISSION_RETRY_AFTER_SECONDS)
+
+    async def acquire(self, user_id: int, cost: float = 1.0):
+        """
+        Wait for a slot for this user's request.
+
+        Raises:
+            AdmissionRejected: queue full, or no slot within ADMISSION_QUEUE_TIMEOUT_SECONDS
+        """
+        start = time.perf_counter()
+        if not self.queues and self._can_run(user_id):
+            self._start(user_id)
+            record_admission(self.kind, waited=0.0)
+            self._publish()
+            return
+
+        if self.queued >= settings.ADMISSION_MAX_QUEUE:
+            raise self._reject("queue_full")
+        if len(self.queues.get(user_id, ())) >= settings.ADMISSION_USER_MAX_QUEUE:
+            raise self._reject("user_queue_full")
+
+        tag = max(self.virtual_time, self.last_finish.get(user_id, 0.0))
+        self.last_finish[user_id] = tag + cost / self._weight(user_id)
+        waiter = _Waiter(user_id, tag, asyncio.get_running_loop().create_future())
+        self.queues.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        self._dispatch()
+        self._publish()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # Got the slot just as the wait ended - give it back
+                self.release(user_id)
+            else:
+                self._dequeue(waiter)
+                waiter.future.cancel()
+                self._publish()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject("timeout")
+        record_admission(self.kind, waited=time.perf_counter() - start)
+
+    def release(self, user_id: int):
+        self.running -= 1
+        self.running_per_user[user_id] -= 1
+        if self.running_per_user[user_id] <= 0:
+            del self.running_per_user[user_id]
+            # Forget finish tags of idle users (they restart at virtual time)
+            if user_id not in self.queues and self.last_finish.get(user_id, 0.0) <= self.virtual_time:
+                self.last_finish.pop(user_id, None)
+        self._dispatch()
+        self._publish()
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "limit": self.limit,
+            "users_waiting": len(self.queues),
+        }
+
+
+controllers: Dict[str, AdmissionController] = {
+    "query": AdmissionController("query", "ADMISSION_QUERY_CONCURRENCY"),
+    "upload": AdmissionController("upload", "ADMISSION_UPLOAD_CONCURRENCY"),
+}
+
+
+class _Slot:
+    """One admitted request's slot; released exactly once"""
+
+    def __init__(self, controller: AdmissionController, user_id: int):
+        self.controller = controller
+        self.user_id = user_id
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.controller.release(self.user_id)
+
+
+async def _release_dependency_sessions(kwargs: dict):
+    """
+    Dependencies run before the handler is admitted - end any transaction
+    they opened, so a queued request doesn't hold a connection from the pool
+    the admitted ones need. The handler checks one out again on its next query.
+    """
+    for value in kwargs.values():
+        if isinstance(value, AsyncSession):
+            await arelease_connection(value)
+        elif isinstance(value, Session) and value.in_transaction():
+            await run_in_threadpool(release_connection, value)
+
+
+async def _release_when_done(body_iterator, slot: _Slot):
+    """Hold the slot until a streamed response has been fully sent"""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        slot.release()
+
+
+def admission_controlled(kind: str):
+    """
+    Route decorator: run the handler once the admission controller for
+    `kind` gives this user a slot; 429 + Retry-After when the request is shed.
+
+    Sync handlers become async (the wait happens on the event loop) and run
+    on the threadpool once admitted. The handler needs a `user_id` argument.
+    Streaming responses keep their slot until the stream ends.
+    """
+    controller = controllers[kind]
+
+    def decorator(handler):
+        is_async = asyncio.iscoroutinefunction(handler)
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            if not settings.ADMISSION_ENABLED:
+                if is_async:
+                    return await handler(*args, **kwargs)
+                return await run_in_threadpool(handler, *args, **kwargs)
+
+            user_id = kwargs["user_id"]
+            await _release_dependency_sessions(kwargs)
+            try:
+                await controller.acquire(user_id)
+            except AdmissionRejected as e:
+                print(f"🚦 Shed {kind} request of user {user_id} ({e.reason})")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests in progress, please retry shortly",
+                    headers={"Retry-After": str(math.ceil(e.retry_after))}
+                )
+
+            slot = _Slot(controller, user_id)
+            try:
+                if is_async:
+                    response = await handler(*args, **kwargs)
+                else:
+                    response = await run_in_threadpool(handler, *args, **kwargs)
+            except BaseException:
+                slot.release()
+                raise
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _release_when_done(response.body_iterator, slot)
+                # A client that disconnects before the body starts never runs
+                # the generator's finally - release when it's collected instead
+                weakref.finalize(response.body_iterator, asyncio.get_running_loop().call_soon_threadsafe, slot.release)
+            else:
+                slot.release()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def admission_stats() -> Dict[str, dict]:
+    """Running / queued requests per kind of work (this worker)"""
+    return {kind: controller.snapshot() for kind, controller in controllers.items()}
@@ -0,0 +1,171 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, arelease_connection, Contract, Conversation, Message
+from app.auth import get_current_user_async
+from app.read_replica import get_async_read_db, arecord_write
+from app.intent_router import route_question, search_method, route_stats, TEMPLATES, TEMPLATE_ROUTES, DOCUMENT, AGENT
+from app.api.routes import QueryRequest
+from app.config import settings
+from app.memory import aload_conversation_history, fit_history_to_budget
+from app.deadline import with_query_deadline
+from app.admission import admission_controlled
+from app.pagination import (
+    keyset_page_or_400, page_result, contract_count, contract_json, CONTRACT_SORT, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from datetime import datetime, timezone
+from typing import Optional
+import time
+
+
+# Async versions of the hot read/query routes (ASYNC_MODE).
+# main.py swaps these in for the sync handlers with the same path;
+# everything else keeps using the sync routes.
+router = APIRouter()
+
+
+async def _get_or_create_conversation(db: AsyncSession, user_id: int, request: QueryRequest) -> Conversation:
+    """Load the user's conversation from the request, or start a new one"""
+    conversation = None
+    if request.conversation_id:
+        conversation = (await db.execute(
+            select(Conversation).where(
+                Conversation.id == request.conversation_id,
+                Conversation.user_id == user_id
+            )
+        )).scalars().first()
+
+    if not conversation:
+        conversation = Conversation(
+            user_id=user_id,
+            contract_id=request.contract_id
+        )
+        db.add(conversation)
+        await db.commit()
+        await db.refresh(conversation)
+
+    return conversation
+
+
+@router.post("/query")
+@admission_controlled("query")
+@with_query_deadline
+async def query_contract(
+    request: QueryRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_async)
+):
+    """
+    Smart conversational AI that works with or without documents (async).
+    """
+    from app.llm import (
+        create_async_smart_agent, arun_smart_agent, extract_answer_text,
+        aretrieve_document_context, arun_document_answer
+    )
+
+    started = time.perf_counter()
+    print(f"🤖 Query from user {user_id}: {request.question}")
+
+    doc_count = (await db.execute(
+        select(func.count()).select_from(Contract).where(Contract.user_id == user_id)
+    )).scalar_one()
+    print(f"📚 User has {doc_count} document(s)")
+
+    route = route_question(request.question, doc_count, has_history=request.continues_conversation())
+
+    try:
+        conversation = await _get_or_create_conversation(db, user_id, request)
+        conversation_id = conversation.id
+
+        answer_text = None
+
+        if route in TEMPLATE_ROUTES:
+            answer_text = TEMPLATES[route]
+
+        else:
+            history = await aload_conversation_history(db, conversation)
+            if not history and request.conversation_history:
+                history = fit_history_to_budget(
+                    [{"role": msg.role, "content": msg.content} for msg in request.conversation_history],
+                    settings.HISTORY_TOKEN_BUDGET
+                )
+
+            # Don't keep a pooled connection through retrieval and LLM calls
+            await arelease_connection(db)
+
+            if route == DOCUMENT:
+                print("📄 Answering straight from document retrieval...")
+                context = await aretrieve_document_context(user_id, request.question)
+                if context:
+                    answer_text = await arun_document_answer(context, request.question, conversation_history=history)
+                else:
+                    route = AGENT
+
+            if answer_text is None:
+                print("🧠 Creating smart agent...")
+                agent = create_async_smart_agent(user_id)
+
+                print(f"💬 Running agent with {len(history)} previous messages...")
+
+                answer = await arun_smart_agent(agent, request.question, conversation_history=history)
+                answer_text = extract_answer_text(answer)
+
+        print(f"✅ Got answer: {answer_text[:100]}...")
+
+        db.add(Message(
+            conversation_id=conversation_id,
+            role="user",
+            content=request.question
+        ))
+        db.add(Message(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=answer_text
+        ))
+        conversation.updated_at = datetime.now(timezone.utc)
+
+        await db.commit()
+        await arecord_write(user_id)
+
+        route_stats.record(route, time.perf_counter() - started)
+
+        return {
+            "question": request.question,
+            "answer": answer_text,
+            "conversation_id": conversation_id,
+            "contract_id": request.contract_id,
+            "documents_available": doc_count,
+            "search_method": search_method(route),
+            "route": route
+        }
+
+    except Exception as e:
+        await db.rollback()
+        print(f"❌ Error in query endpoint: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@router.get("/my-contracts")
+async def list_my_contracts(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    user_id: int = Depends(get_current_user_async)
+):
+    """
+    List contracts uploaded by current user, newest first (async, keyset paginated)
+    """
+    stmt = keyset_page_or_400(
+        select(Contract).where(Contract.user_id == user_id),
+        [Contract.upload_date, Contract.id], cursor, limit
+    )
+    contracts, next_cursor = page_result((await db.execute(stmt)).scalars().all(), CONTRACT_SORT, limit)
+
+    return {
+        # Counted for the first page only (see the sync route)
+        "total": (await db.execute(contract_count(user_id))).scalar_one() if cursor is None else None,
+        "contracts": [contract_json(c) for c in contracts],
+        "next_cursor": next_cursor
+    }
@@ -1,8 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
-from app.database import get_db, User
-from app.auth import hash_password, create_access_token, verify_password
+from app.database import get_db, release_connection, User
+from app.auth import (
+    ahash_password, averify_password, create_access_token, create_refresh_token, verify_token, spend_refresh_token
+)
+from app.auth_cache import is_known_user, remember_user
+from app.password_hashing import PasswordHashingBusy
+from app.config import settings
 
 router = APIRouter()
 
@@ -17,8 +24,51 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+def _hashing_busy() -> HTTPException:
+    """503 when the password hashing queue is full (see app/password_hashing.py)"""
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins right now, please retry shortly",
+        headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+    )
+
+
+def _find_user(db: Session, email: str):
+    user = db.query(User).filter(User.email == email).first()
+    # The caller awaits bcrypt next - don't hold a pooled connection idle in
+    # transaction meanwhile (more hashes can be pending than the pool has connections)
+    release_connection(db)
+    return user
+
+
+def _create_user(db: Session, email: str, hashed_password: str) -> User:
+    new_user = User(
+        email=email,
+        hashed_password=hashed_password
+    )
+    db.add(new_user)
+    db.commit()
+    db.refresh(new_user)
+    return new_user
+
+
+def _tokens(user_id: int) -> dict:
+    return {
+        "access_token": create_access_token({"user_id": user_id}),
+        "refresh_token": create_refresh_token(user_id),
+        "token_type": "bearer"
+    }
+
+
+# Signup and login are async so the bcrypt work can be awaited on the
+# hashing pool; their short DB calls run on the threadpool.
+
 @router.post("/signup")
-def signup(request: SignupRequest, db: Session = Depends(get_db)):
+async def signup(request: SignupRequest, db: Session = Depends(get_db)):
     """
     Create new user account
     
@@ -30,21 +80,18 @@ def signup(request: SignupRequest, db: Session = Depends(get_db)):
     """
     
     # Step 1: Check if user already exists
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = await run_in_threadpool(_find_user, db, request.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Step 2: Hash password
-    hashed_password = hash_password(request.password)
+    # Step 2: Hash password (hashing pool)
+    try:
+        hashed_password = await ahash_password(request.password)
+    except PasswordHashingBusy:
+        raise _hashing_busy()
     
     # Step 3: Create user
-    new_user = User(
-        email=request.email,
-        hashed_password=hashed_password
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    new_user = await run_in_threadpool(_create_user, db, request.email, hashed_password)
     
     print(f"✅ User created: {new_user.email} (ID: {new_user.id})")
     
@@ -58,34 +105,71 @@ def signup(request: SignupRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, db: Session = Depends(get_db)):
     """
-    Login user and get JWT token
+    Login user and get JWT tokens
     
     Steps:
     1. Find user by email
     2. Check if password is correct
-    3. Create JWT token
-    4. Return token
+    3. Create access + refresh tokens
+    4. Return tokens
     """
     
     # Step 1: Find user
-    user = db.query(User).filter(User.email == request.email).first()
+    user = await run_in_threadpool(_find_user, db, request.email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Step 2: Verify password
-    if not verify_password(request.password, user.hashed_password):
+    # Step 2: Verify password (hashing pool)
+    try:
+        valid = await averify_password(request.password, user.hashed_password)
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Step 3: Create token
-    token = create_access_token({"user_id": user.id})
+    # Step 3: Create tokens
+    remember_user(user.id)
     
     print(f"✅ User logged in: {user.email}")
     
     return {
-        "access_token": token,
-        "token_type": "bearer",
+        **_tokens(user.id),
         "user_id": user.id,
         "email": user.email
-    }
\ No newline at end of file
+    }
+
+
+@router.post("/refresh")
+def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Trade a refresh token for a new access token (and a new refresh token)
+    - no password, so no bcrypt when access tokens expire.
+    Each refresh token works once; the old one is refused after rotation.
+    """
+    payload = verify_token(request.refresh_token, token_type="refresh")
+    user_id = payload.get("user_id") if payload else None
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    # Deleted accounts can't refresh
+    if not is_known_user(user_id):
+        if db.query(User.id).filter(User.id == user_id).first() is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        remember_user(user_id)
+    
+    try:
+        spent = spend_refresh_token(db, payload)
+    except IntegrityError:
+        # User deleted after the cache saw them
+        db.rollback()
+        raise HTTPException(status_code=401, detail="User not found")
+    if not spent:
+        print(f"⚠️ Refresh token reused for user {user_id}")
+        raise HTTPException(status_code=401, detail="Refresh token has already been used")
+    
+    return {
+        **_tokens(user_id),
+        "user_id": user_id
+    }
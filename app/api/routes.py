@@ -1,32 +1,56 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db, Contract, ContractChunk, User, Conversation, Message
-from app.pdf_read_chunk import extract_text_from_pdf, chunk_text
-from app.embeddingmaker import generate_many_embeddings, generate_embedding
-from sqlalchemy import text
+from app.database import get_db, release_connection, session_scope, SessionLocal, Contract, ContractChunk, User, Conversation, Message
+from app.summarizer import summarize_contract_in_background
+from app.clause_classifier import classify_chunks
+from app.purge import is_purge_running, tenant_chunk_count, purge_user_contracts
+from app.read_replica import get_read_db, record_write
+from app.pagination import (
+    keyset_page_or_400, page_result, contract_count, contract_json, conversation_json, message_json,
+    CONTRACT_SORT, CONVERSATION_SORT, MESSAGE_SORT, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from sqlalchemy import delete, select
 from pydantic import BaseModel, Field
 from typing import Annotated, Optional, List
 from app.auth import get_current_user
-from app.llm import create_smart_agent, run_smart_agent
+from app.config import settings
+from app.memory import load_conversation_history, fit_history_to_budget
+from app.intent_router import route_question, search_method, route_stats, TEMPLATES, TEMPLATE_ROUTES, DOCUMENT, AGENT
+from app.deadline import with_query_deadline, new_deadline, iterate_with_deadline
+from app.admission import admission_controlled
 from datetime import datetime, timezone
+import json
+import time
 
 
 router = APIRouter()
 
+# PDF parsing, Cohere and LangChain are imported inside the handlers that use
+# them, so workers that don't serve those routes never load them (WORKER_ROLE)
+
 
 
 @router.post("/upload")
+@admission_controlled("upload")
 def upload_contract(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     user_id: int = Depends(get_current_user)  # Now it's just an int
 ):
     """Upload a PDF contract (requires authentication)"""
+    from app.pdf_read_chunk import extract_text_from_pdf, chunk_text
+    from app.embeddingmaker import generate_many_embeddings
     
     # Check if PDF
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files allowed")
     
+    # The user lookup may have opened a transaction - don't hold its
+    # connection through PDF extraction and embedding
+    release_connection(db)
+    
     try:
         # Extract text
         print(f"📄 Extracting text from {file.filename}...")
@@ -42,32 +66,43 @@ def upload_contract(
         embeddings = generate_many_embeddings(chunks)
         print(f"✅ Generated {len(embeddings)} embeddings")
         
-        # Save contract
-        contract = Contract(
-            user_id=user_id,  # Use the user_id from token
-            filename=file.filename,
-            num_chunks=len(chunks)
-        )
-        db.add(contract)
-        db.commit()
-        db.refresh(contract)
+        # Tag clause types for filtered retrieval
+        clause_tags = classify_chunks(chunks)
         
-        # Save chunks
-        for idx, (chunk_text_val, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk = ContractChunk(
-                contract_id=contract.id,
-                chunk_text=chunk_text_val,
-                chunk_index=idx,
-                embedding=embedding
+        # Save contract + chunks in one short transaction (a connection is
+        # only checked out once everything is ready to insert)
+        with session_scope() as write_db:
+            contract = Contract(
+                user_id=user_id,  # Use the user_id from token
+                filename=file.filename,
+                num_chunks=len(chunks)
             )
-            db.add(chunk)
+            write_db.add(contract)
+            write_db.flush()
+            contract_id = contract.id
+            
+            # Save chunks
+            for idx, (chunk_text_val, embedding, tags) in enumerate(zip(chunks, embeddings, clause_tags)):
+                chunk = ContractChunk(
+                    user_id=user_id,  # Partition key
+                    contract_id=contract_id,
+                    chunk_text=chunk_text_val,
+                    chunk_index=idx,
+                    embedding=embedding,
+                    clause_types=tags
+                )
+                write_db.add(chunk)
         
-        db.commit()
-        print(f"✅ Saved contract with ID: {contract.id} for user ID: {user_id}")
+        record_write(user_id)
+        print(f"✅ Saved contract with ID: {contract_id} for user ID: {user_id}")
+        
+        # Summary tree is built after the response is sent
+        if settings.SUMMARY_ENABLED:
+            background_tasks.add_task(summarize_contract_in_background, contract_id, chunks)
         
         return {
             "message": "Contract uploaded",
-            "contract_id": contract.id,
+            "contract_id": contract_id,
             "filename": file.filename,
             "num_chunks": len(chunks),
             "user_id": user_id
@@ -84,9 +119,14 @@ class QueryRequest(BaseModel):
     contract_id: Annotated[Optional[int], Field(default=None, description="ID of the contract to query")]
     question: Annotated[str, Field(..., description="The question to ask")]
     top_k: Annotated[int, Field(5, description="Number of results")] = 5
+    # Only used when the server has no stored messages for the conversation
     conversation_history: Optional[List[ConversationMessage]] = []
     conversation_id: Optional[int] = None
 
+    def continues_conversation(self) -> bool:
+        """Follow-up in an ongoing conversation (the intent router won't answer it from a template)"""
+        return bool(self.conversation_id or self.conversation_history)
+
 
 # @router.post("/query")  # Changed from /agent-query
 # def query_contract(
@@ -129,7 +169,69 @@ class QueryRequest(BaseModel):
         
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
+def _get_or_create_conversation(db: Session, user_id: int, request: QueryRequest) -> Conversation:
+    """Load the user's conversation from the request, or start a new one"""
+    conversation = None
+    if request.conversation_id:
+        conversation = db.query(Conversation).filter(
+            Conversation.id == request.conversation_id,
+            Conversation.user_id == user_id
+        ).first()
+    
+    if not conversation:
+        # Create new conversation
+        conversation = Conversation(
+            user_id=user_id,
+            contract_id=request.contract_id  # ✅ Can be None
+        )
+        db.add(conversation)
+        db.commit()
+        db.refresh(conversation)
+    
+    return conversation
+
+
+def _load_history(db: Session, conversation: Conversation, request: QueryRequest) -> List[dict]:
+    """
+    History for the agent: stored messages for this conversation (summary +
+    recent turns within HISTORY_TOKEN_BUDGET). Client-sent history is only
+    used for conversations the server has no messages for yet.
+    """
+    history = load_conversation_history(db, conversation)
+    if not history and request.conversation_history:
+        history = fit_history_to_budget(
+            [{"role": msg.role, "content": msg.content} for msg in request.conversation_history],
+            settings.HISTORY_TOKEN_BUDGET
+        )
+    return history
+
+
+def _save_exchange(db: Session, conversation: Conversation, question: str, answer_text: str):
+    """Persist the user question and assistant answer, then bump the conversation"""
+    # Save user message
+    db.add(Message(
+        conversation_id=conversation.id,
+        role="user",
+        content=question
+    ))
+    
+    # Save assistant response with extracted text
+    db.add(Message(
+        conversation_id=conversation.id,
+        role="assistant",
+        content=answer_text
+    ))
+    
+    # Update conversation timestamp
+    conversation.updated_at = datetime.now(timezone.utc)
+    
+    db.commit()
+    record_write(conversation.user_id)
+
+
 @router.post("/query")
+@admission_controlled("query")
+@with_query_deadline
 def query_contract(
     request: QueryRequest,
     db: Session = Depends(get_db),
@@ -138,88 +240,61 @@ def query_contract(
     """
     Smart conversational AI that works with or without documents.
     """
+    from app.llm import (
+        create_smart_agent, run_smart_agent, extract_answer_text,
+        retrieve_document_context, run_document_answer
+    )
     
+    started = time.perf_counter()
     print(f"🤖 Query from user {user_id}: {request.question}")
     
     # Check how many documents user has
     doc_count = db.query(Contract).filter(Contract.user_id == user_id).count()
     print(f"📚 User has {doc_count} document(s)")
     
+    route = route_question(request.question, doc_count, has_history=request.continues_conversation())
+    
     try:
         # Get or create conversation
-        if request.conversation_id:
-            conversation = db.query(Conversation).filter(
-                Conversation.id == request.conversation_id,
-                Conversation.user_id == user_id
-            ).first()
-            if not conversation:
-                # Create new conversation
-                conversation = Conversation(
-                    user_id=user_id,
-                    contract_id=request.contract_id  # ✅ Can be None
-                )
-                db.add(conversation)
-                db.commit()
-                db.refresh(conversation)
-        else:
-            # Create new conversation
-            conversation = Conversation(
-                user_id=user_id,
-                contract_id=request.contract_id  # ✅ Can be None
-            )
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-        
-        print("🧠 Creating smart agent...")
-        agent = create_smart_agent(db, user_id)
-        
-        # Convert conversation history to proper format
-        history = [{"role": msg.role, "content": msg.content} 
-                   for msg in request.conversation_history]
+        conversation = _get_or_create_conversation(db, user_id, request)
         
-        print(f"💬 Running agent with {len(history)} previous messages...")
+        answer_text = None
         
-        # Run smart agent
-        answer = run_smart_agent(agent, request.question, conversation_history=history)
+        if route in TEMPLATE_ROUTES:
+            answer_text = TEMPLATES[route]
         
-        # Extract just the text from the answer (handle different response formats)
-        if isinstance(answer, list) and len(answer) > 0:
-            # If it's a list of message parts, extract the text
-            text_parts = []
-            for part in answer:
-                if isinstance(part, dict) and part.get('type') == 'text':
-                    text_parts.append(part.get('text', ''))
-            answer_text = ' '.join(text_parts)
-        elif isinstance(answer, dict) and 'text' in answer:
-            # If it's a dict with text field
-            answer_text = answer['text']
         else:
-            # If it's already a string
-            answer_text = str(answer)
+            history = _load_history(db, conversation, request)
+            
+            # Don't keep a pooled connection through retrieval and LLM calls
+            release_connection(db)
+            
+            # The search tools open their own read sessions (read replica when configured)
+            if route == DOCUMENT:
+                print("📄 Answering straight from document retrieval...")
+                context = retrieve_document_context(user_id, request.question)
+                if context:
+                    answer_text = run_document_answer(context, request.question, conversation_history=history)
+                else:
+                    route = AGENT
+            
+            if answer_text is None:
+                print("🧠 Creating smart agent...")
+                agent = create_smart_agent(user_id)
+                
+                print(f"💬 Running agent with {len(history)} previous messages...")
+                
+                # Run smart agent
+                answer = run_smart_agent(agent, request.question, conversation_history=history)
+                
+                # Extract just the text from the answer (handle different response formats)
+                answer_text = extract_answer_text(answer)
         
         print(f"✅ Got answer: {answer_text[:100]}...")
         
-        # Save user message
-        user_message = Message(
-            conversation_id=conversation.id,
-            role="user",
-            content=request.question
-        )
-        db.add(user_message)
-        
-        # Save assistant response with extracted text
-        assistant_message = Message(
-            conversation_id=conversation.id,
-            role="assistant",
-            content=answer_text  # ← Now it's a string
-        )
-        db.add(assistant_message)
-        
-        # Update conversation timestamp
-        conversation.updated_at = datetime.now(timezone.utc)
+        _save_exchange(db, conversation, request.question, answer_text)
         
-        db.commit()
+        route_stats.record(route, time.perf_counter() - started)
         
         return {
             "question": request.question,
@@ -227,7 +302,8 @@ def query_contract(
             "conversation_id": conversation.id,
             "contract_id": request.contract_id,
             "documents_available": doc_count,
-            "search_method": "smart_conversational_ai"
+            "search_method": search_method(route),
+            "route": route
         }
         
     except Exception as e:
@@ -238,29 +314,198 @@ def query_contract(
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+def _template_events(text: str):
+    """Events for a templated answer, in the same shape as stream_smart_agent"""
+    yield {"event": "token", "text": text}
+    yield {"event": "done", "answer": text}
+
+
+def _sse(event: dict) -> str:
+    """Format an event dict as a Server-Sent Events frame"""
+    name = event.get("event", "message")
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.post("/query/stream")
+@admission_controlled("query")
+def query_contract_stream(
+    request: QueryRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user)
+):
+    """
+    Streaming version of /query over Server-Sent Events.
+    
+    Sends LLM tokens and tool progress (searching documents, searching web,
+    reranking) as they happen. The last event is "done" with the full answer
+    plus time-to-first-token and total latency; messages are saved before it.
+    """
+    from app.llm import create_smart_agent, stream_smart_agent, retrieve_document_context, stream_document_answer
+    
+    started = time.perf_counter()
+    print(f"🤖 Streaming query from user {user_id}: {request.question}")
+    # Checked by the generator below, which outlives this function
+    deadline = new_deadline(settings.QUERY_DEADLINE_SECONDS)
+    
+    doc_count = db.query(Contract).filter(Contract.user_id == user_id).count()
+    route = route_question(request.question, doc_count, has_history=request.continues_conversation())
+    
+    conversation = _get_or_create_conversation(db, user_id, request)
+    conversation_id = conversation.id
+    
+    history = [] if route in TEMPLATE_ROUTES else _load_history(db, conversation, request)
+    # The request session is only closed once the whole stream has been sent
+    release_connection(db)
+    
+    def event_stream():
+        # The request session may be closed before the body finishes streaming,
+        # so the agent and the final save use their own session
+        stream_db = SessionLocal()
+        first_token_at = None
+        answer_text = ""
+        path = route
+        
+        try:
+            yield _sse({"event": "start", "conversation_id": conversation_id, "route": path})
+            
+            events = None
+            
+            if path in TEMPLATE_ROUTES:
+                events = _template_events(TEMPLATES[path])
+            
+            elif path == DOCUMENT:
+                yield _sse({"event": "progress", "stage": "searching_documents"})
+                context = retrieve_document_context(user_id, request.question)
+                if context:
+                    events = stream_document_answer(context, request.question, conversation_history=history)
+                else:
+                    path = AGENT
+            
+            if events is None:
+                agent = create_smart_agent(user_id)
+                events = stream_smart_agent(agent, request.question, conversation_history=history)
+            
+            for event in events:
+                if event["event"] == "done":
+                    answer_text = event["answer"]
+                    continue
+                if event["event"] == "token" and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                yield _sse(event)
+            
+            stream_conversation = stream_db.get(Conversation, conversation_id)
+            _save_exchange(stream_db, stream_conversation, request.question, answer_text)
+            
+            route_stats.record(path, time.perf_counter() - started)
+            
+            total_ms = (time.perf_counter() - started) * 1000
+            ttft_ms = (first_token_at - started) * 1000 if first_token_at else None
+            ttft_log = f"{ttft_ms:.0f}ms" if ttft_ms is not None else "n/a"
+            print(f"✅ Streamed answer: ttft={ttft_log} total={total_ms:.0f}ms")
+            
+            yield _sse({
+                "event": "done",
+                "answer": answer_text,
+                "conversation_id": conversation_id,
+                "route": path,
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "total_ms": round(total_ms, 1)
+            })
+        
+        except Exception as e:
+            stream_db.rollback()
+            print(f"❌ Error in streaming query: {str(e)}")
+            yield _sse({"event": "error", "detail": f"Error: {str(e)}"})
+        
+        finally:
+            stream_db.close()
+    
+    return StreamingResponse(
+        iterate_with_deadline(deadline, event_stream()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/my-contracts")
 def list_my_contracts(
-    db: Session = Depends(get_db),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(get_current_user)
+):
+    """
+    List contracts uploaded by current user, newest first.
+    Send next_cursor back as cursor for the next page (null on the last one).
+    total (all of the user's contracts) is only counted for the first page,
+    so later pages stay constant cost - it's null when a cursor is sent.
+    """
+    stmt = keyset_page_or_400(
+        select(Contract).where(Contract.user_id == user_id),
+        [Contract.upload_date, Contract.id], cursor, limit
+    )
+    contracts, next_cursor = page_result(db.execute(stmt).scalars().all(), CONTRACT_SORT, limit)
+    
+    return {
+        "total": db.execute(contract_count(user_id)).scalar_one() if cursor is None else None,
+        "contracts": [contract_json(c) for c in contracts],
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/conversations")
+def list_conversations(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(get_current_user)
+):
+    """
+    List current user's conversations, most recently active first (keyset paginated).
+    """
+    stmt = keyset_page_or_400(
+        select(Conversation).where(Conversation.user_id == user_id),
+        [Conversation.updated_at, Conversation.id], cursor, limit
+    )
+    conversations, next_cursor = page_result(db.execute(stmt).scalars().all(), CONVERSATION_SORT, limit)
+    
+    return {
+        "conversations": [conversation_json(c) for c in conversations],
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/conversations/{conversation_id}/messages")
+def list_conversation_messages(
+    conversation_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
     user_id: int = Depends(get_current_user)
 ):
     """
-    List all contracts uploaded by current user
+    Messages of one of current user's conversations, newest first
+    (keyset paginated - follow next_cursor to load older messages).
     """
-    contracts = db.query(Contract).filter(
-        Contract.user_id == user_id
-    ).all()
+    owned = db.execute(
+        select(Conversation.id).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id
+        )
+    ).scalar()
+    if owned is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    stmt = keyset_page_or_400(
+        select(Message).where(Message.conversation_id == conversation_id),
+        [Message.created_at, Message.id], cursor, limit
+    )
+    messages, next_cursor = page_result(db.execute(stmt).scalars().all(), MESSAGE_SORT, limit)
     
     return {
-        "total": len(contracts),
-        "contracts": [
-            {
-                "id": c.id,
-                "filename": c.filename,
-                "upload_date": c.upload_date.isoformat(),
-                "num_chunks": c.num_chunks
-            }
-            for c in contracts
-        ]
+        "conversation_id": conversation_id,
+        "messages": [message_json(m) for m in messages],
+        "next_cursor": next_cursor
     }
 
 
@@ -274,62 +519,65 @@ def delete_contract(
     Delete a specific contract (only if you own it)
     """
     
-    # Verify ownership
-    contract = db.query(Contract).filter(
-        Contract.id == contract_id,
-        Contract.user_id == user_id
-    ).first()
+    # One statement: ownership check + delete. Chunks and summaries go with it
+    # (ON DELETE CASCADE), conversations about it keep going (contract_id -> NULL)
+    filename = db.execute(
+        delete(Contract).where(
+            Contract.id == contract_id,
+            Contract.user_id == user_id
+        ).returning(Contract.filename)
+    ).scalar()
     
-    if not contract:
+    if filename is None:
         raise HTTPException(
             status_code=404,
             detail="Contract not found or you don't own it"
         )
     
-    # Delete chunks first (foreign key constraint)
-    db.query(ContractChunk).filter(
-        ContractChunk.contract_id == contract_id
-    ).delete()
-    
-    # Delete contract
-    db.delete(contract)
     db.commit()
+    record_write(user_id)
     
     return {
-        "message": f"Contract '{contract.filename}' deleted successfully",
+        "message": f"Contract '{filename}' deleted successfully",
         "contract_id": contract_id
     }
 
 
 @router.delete("/my-contracts/all")
 def delete_all_my_contracts(
+    response: Response,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user_id: int = Depends(get_current_user)
 ):
     """
-    Delete ALL contracts uploaded by current user
+    Delete ALL contracts uploaded by current user.
+    Very large tenants are purged in batches in the background (202).
     """
     
-    # Get user's contracts
-    user_contracts = db.query(Contract).filter(
-        Contract.user_id == user_id
-    ).all()
-    
-    if not user_contracts:
-        return {"message": "No contracts to delete"}
+    if is_purge_running(user_id):
+        response.status_code = 202
+        return {"message": "Deletion of your contracts is already in progress"}
     
-    # Delete all chunks for user's contracts
-    for contract in user_contracts:
-        db.query(ContractChunk).filter(
-            ContractChunk.contract_id == contract.id
-        ).delete()
-    
-    # Delete all contracts
-    count = db.query(Contract).filter(
-        Contract.user_id == user_id
-    ).delete()
+    # Big tenants: bounded batches instead of one long-running delete
+    chunk_count = tenant_chunk_count(db, user_id)
+    if chunk_count >= settings.PURGE_BACKGROUND_MIN_CHUNKS:
+        background_tasks.add_task(purge_user_contracts, user_id)
+        response.status_code = 202
+        return {
+            "message": f"Deleting your contracts ({chunk_count} chunks) in the background",
+            "background": True
+        }
     
+    # Delete all contracts (chunks and summaries cascade)
+    count = db.execute(
+        delete(Contract).where(Contract.user_id == user_id)
+    ).rowcount
     db.commit()
+    record_write(user_id)
+    
+    if not count:
+        return {"message": "No contracts to delete"}
     
     return {
         "message": f"Deleted {count} contracts successfully"
@@ -1,14 +1,19 @@
-import hashlib
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+import uuid
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import get_db, User
+from app.database import get_db, get_async_db, User, UsedRefreshToken
+# bcrypt runs on the hashing process pool - re-exported for existing imports
+from app.password_hashing import hash_password, verify_password, ahash_password, averify_password  # noqa: F401
+from app.auth_cache import cached_token, cache_token, is_known_user, remember_user
 from app.config import settings
 
 
@@ -18,42 +23,10 @@ from app.config import settings
 
 security = HTTPBearer()
 
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto"
-)
-
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-
-# ==============================
-# Password Hashing
-# ==============================
-
-def _normalize_password(password: str) -> str:
-    """
-    Pre-hash password with SHA256 to avoid bcrypt 72-byte limit.
-    Returns fixed-length hex string.
-    """
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
-
-
-def hash_password(password: str) -> str:
-    """
-    Convert plain password to secure hashed password.
-    """
-    normalized = _normalize_password(password)
-    return pwd_context.hash(normalized)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Verify user password.
-    """
-    normalized = _normalize_password(plain_password)
-    return pwd_context.verify(normalized, hashed_password)
+REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
 
 
 # ==============================
@@ -82,9 +55,29 @@ def create_access_token(data: dict) -> str:
     return encoded_jwt
 
 
-def verify_token(token: str) -> Optional[dict]:
+def create_refresh_token(user_id: int) -> str:
+    """
+    Create long-lived JWT refresh token. Only accepted by /auth/refresh,
+    which trades it for a new access token without a password check.
+    Each one has a unique jti so it can only be traded in once.
+    """
+    now = datetime.now(timezone.utc)
+    return jwt.encode(
+        {
+            "user_id": user_id,
+            "exp": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            "iat": now,
+            "type": "refresh",
+            "jti": uuid.uuid4().hex
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+
+
+def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
     """
-    Decode and validate JWT token.
+    Decode and validate JWT token of the given type ("access" or "refresh").
     """
     try:
         payload = jwt.decode(
@@ -93,7 +86,7 @@ def verify_token(token: str) -> Optional[dict]:
             algorithms=[ALGORITHM]
         )
 
-        if payload.get("type") != "access":
+        if payload.get("type") != token_type:
             return None
 
         return payload
@@ -102,20 +95,48 @@ def verify_token(token: str) -> Optional[dict]:
         return None
 
 
+def spend_refresh_token(db: Session, payload: dict) -> bool:
+    """
+    Mark a verified refresh token as used (rotation). Returns False if it was
+    already traded in - a replayed or stolen old token - or has no jti
+    (issued before rotation was enforced). Commits.
+    """
+    jti = payload.get("jti")
+    if not jti:
+        return False
+    
+    user_id = payload["user_id"]
+    # Forget this user's used tokens that have expired anyway
+    db.execute(delete(UsedRefreshToken).where(
+        UsedRefreshToken.user_id == user_id,
+        UsedRefreshToken.expires_at < datetime.now(timezone.utc)
+    ))
+    # Atomic: of two concurrent refreshes with the same token only one inserts
+    spent = db.execute(
+        insert(UsedRefreshToken)
+        .values(jti=jti, user_id=user_id, expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc))
+        .on_conflict_do_nothing(index_elements=["jti"])
+        .returning(UsedRefreshToken.jti)
+    ).scalar()
+    db.commit()
+    return spent is not None
+
+
 # ==============================
 # FastAPI Dependency
 # ==============================
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> int:
+def _user_id_from_credentials(credentials: HTTPAuthorizationCredentials) -> int:
     """
-    Validate JWT and return current user object.
+    Validate the bearer token and return the user_id claim.
     """
 
     token = credentials.credentials
-    payload = verify_token(token)
+    payload = cached_token(token)
+    if payload is None:
+        payload = verify_token(token)
+        if payload:
+            cache_token(token, payload)
 
     if not payload:
         raise HTTPException(
@@ -131,7 +152,47 @@ def get_current_user(
             detail="Invalid token payload"
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    return user_id
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> int:
+    """
+    Validate JWT and return current user object.
+    The user lookup only runs when the id isn't in the user cache.
+    """
+
+    user_id = _user_id_from_credentials(credentials)
+    if is_known_user(user_id):
+        return user_id
+
+    user = db.query(User.id).filter(User.id == user_id).first()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+
+    remember_user(user.id)
+    return user.id
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> int:
+    """
+    Async version of get_current_user (ASYNC_MODE routes).
+    """
+
+    user_id = _user_id_from_credentials(credentials)
+    if is_known_user(user_id):
+        return user_id
+
+    user = await db.get(User, user_id)
 
     if not user:
         raise HTTPException(
@@ -139,4 +200,5 @@ def get_current_user(
             detail="User not found"
         )
 
+    remember_user(user.id)
     return user.id
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import User
+
+
+# ==============================
+# Authentication Caches
+# ==============================
+#
+# get_current_user used to decode the JWT and load the user row on every
+# request. Two per-process caches take both off the hot path:
+#
+#   tokens - decoded payload keyed by the token's SHA-256, until the token
+#            expires (invalid tokens are never cached)
+#   users  - ids confirmed to exist, for AUTH_USER_CACHE_TTL_SECONDS
+#
+# Deleting a user (ORM delete or a bulk delete(User) statement) drops the
+# cached entries in this process; other workers notice within the user TTL.
+
+
+class TTLCache:
+    """Thread-safe LRU with a per-entry expiry time and hit / miss counters"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0}
+
+    def get(self, key) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, expires = entry
+            if now >= expires:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl if ttl_seconds is None else min(ttl_seconds, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_where(self, predicate) -> int:
+        """Drop every entry whose (key, value) matches; returns how many"""
+        with self._lock:
+            keys = [key for key, (value, _) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                del self._entries[key]
+            self.stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus hit rate and size, for logging and metrics"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+token_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_TOKEN_CACHE_MAX_SECONDS)
+user_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+
+def token_key(token: str) -> str:
+    """Cache key for a bearer token (the token itself is never kept)"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def cached_token(token: str) -> Optional[dict]:
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    return token_cache.get(token_key(token))
+
+
+def cache_token(token: str, payload: dict):
+    """Keep a verified token's payload until the token expires"""
+    if not settings.AUTH_CACHE_ENABLED or "exp" not in payload:
+        return
+    token_cache.set(token_key(token), payload, payload["exp"] - time.time())
+
+
+def is_known_user(user_id: int) -> bool:
+    return settings.AUTH_CACHE_ENABLED and user_cache.get(user_id) is not None
+
+
+def remember_user(user_id: int):
+    if settings.AUTH_CACHE_ENABLED:
+        user_cache.set(user_id, True)
+
+
+def invalidate_user(user_id: int):
+    """Forget a user and every cached token issued to them (this process)"""
+    user_cache.discard_where(lambda key, _: key == user_id)
+    token_cache.discard_where(lambda _, payload: payload.get("user_id") == user_id)
+
+
+def invalidate_all():
+    user_cache.clear()
+    token_cache.clear()
+
+
+# ---------------------------
+# Invalidation on delete
+# ---------------------------
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _users_bulk_deleted(orm_execute_state):
+    # delete(User).where(...) doesn't load the rows, so their ids are unknown
+    if orm_execute_state.is_delete and any(m.class_ is User for m in orm_execute_state.all_mappers):
+        invalidate_all()
@@ -0,0 +1,197 @@
+import re
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.metrics import span
+
+
+# ==============================
+# Clause-Type Tags
+# ==============================
+#
+# Every chunk is tagged at upload with the clause types it talks about
+# (contract_chunks.clause_types, GIN indexed). A question that asks about a
+# clause type ("what termination clauses do I have") then only searches the
+# chunks carrying that tag, instead of running vector + keyword scoring over
+# every chunk of the contract.
+#
+# Backends (CLAUSE_CLASSIFIER_BACKEND):
+#   rules - keyword patterns below, no dependencies
+#   model - rules plus a small local sentence-transformers model that compares
+#           each chunk with a description of every clause type
+
+TERMINATION = "termination"
+PAYMENT = "payment"
+INDEMNITY = "indemnity"
+CONFIDENTIALITY = "confidentiality"
+GOVERNING_LAW = "governing_law"
+LIABILITY = "liability"
+RENEWAL = "renewal"
+DISPUTE_RESOLUTION = "dispute_resolution"
+INTELLECTUAL_PROPERTY = "intellectual_property"
+NON_COMPETE = "non_compete"
+FORCE_MAJEURE = "force_majeure"
+WARRANTY = "warranty"
+
+CLAUSE_PATTERNS: Dict[str, re.Pattern] = {
+    TERMINATION: re.compile(r"\b(terminat\w*|cancel\w*|notice period|expir\w*|end (of|the) (the )?(agreement|contract|term))\b"),
+    PAYMENT: re.compile(r"\b(payments?|pay|paid|payable|invoic\w*|fees?|late fee|interest|price|compensation|salary|rent|deposit)\b"),
+    INDEMNITY: re.compile(r"\b(indemn\w*|hold harmless|defend and hold)\b"),
+    CONFIDENTIALITY: re.compile(r"\b(confidential\w*|non-disclosure|nda|proprietary information|trade secrets?)\b"),
+    GOVERNING_LAW: re.compile(r"\b(governing law|governed by|laws of the|jurisdiction|venue|choice of law)\b"),
+    LIABILITY: re.compile(r"\b(liab\w*|damages|limitation of liability|liability cap|consequential)\b"),
+    RENEWAL: re.compile(r"\b(renew\w*|auto-?renew\w*|extension|extend\w*|successive terms?)\b"),
+    DISPUTE_RESOLUTION: re.compile(r"\b(arbitrat\w*|dispute\w*|mediat\w*|litigation)\b"),
+    INTELLECTUAL_PROPERTY: re.compile(r"\b(intellectual property|copyright\w*|patent\w*|trademark\w*|licen[cs]\w*|work product)\b"),
+    NON_COMPETE: re.compile(r"\b(non-?compet\w*|non-?solicit\w*|restrictive covenants?)\b"),
+    FORCE_MAJEURE: re.compile(r"\b(force majeure|acts? of god|beyond (its|their) (reasonable )?control)\b"),
+    WARRANTY: re.compile(r"\b(warrant\w*|represents and warrants|guarantee\w*|as is)\b"),
+}
+
+# What the model backend compares chunks with
+CLAUSE_DESCRIPTIONS: Dict[str, str] = {
+    TERMINATION: "Termination of the agreement, notice period, ending or cancelling the contract",
+    PAYMENT: "Payment terms, fees, invoices, prices, late payment interest",
+    INDEMNITY: "Indemnification: one party indemnifies and holds the other harmless against claims",
+    CONFIDENTIALITY: "Confidential information must be protected and not disclosed",
+    GOVERNING_LAW: "The agreement is governed by the laws of a state or country and its courts",
+    LIABILITY: "Limitation of liability, damages and liability caps",
+    RENEWAL: "Renewal or extension of the term of the agreement",
+    DISPUTE_RESOLUTION: "Disputes are resolved by arbitration, mediation or litigation",
+    INTELLECTUAL_PROPERTY: "Ownership and licensing of intellectual property, copyrights and patents",
+    NON_COMPETE: "Non-compete and non-solicitation restrictions",
+    FORCE_MAJEURE: "Force majeure: events beyond a party's reasonable control excuse performance",
+    WARRANTY: "Warranties and representations made by a party",
+}
+
+CLAUSE_TYPES = list(CLAUSE_PATTERNS)
+
+# Query words that ask about a clause type without naming it the way
+# contracts do (checked in addition to CLAUSE_PATTERNS)
+_QUERY_PATTERNS: Dict[str, re.Pattern] = {
+    TERMINATION: re.compile(r"\b(get out of|exit|walk away|quit|end my)\b"),
+    PAYMENT: re.compile(r"\b(how much|cost|owe)\b"),
+    GOVERNING_LAW: re.compile(r"\b(which law|what law|courts?)\b"),
+    DISPUTE_RESOLUTION: re.compile(r"\b(sue|lawsuit)\b"),
+}
+
+# Used instead of CLAUSE_PATTERNS on queries, where a false match narrows the
+# search. Tagging chunks generously is cheap, but "who has to pay for
+# damages" or "conflict of interest" are not payment questions.
+_QUERY_CLAUSE_PATTERNS: Dict[str, re.Pattern] = {
+    PAYMENT: re.compile(
+        r"\b(payments?|payment terms|payable|invoic\w*|fees?|late fee|late payment|"
+        r"compensation|salary|rent|deposit|pricing)\b"
+    ),
+}
+
+
+# ---------------------------
+# Rule-based tagging
+# ---------------------------
+
+def classify_by_rules(text: str) -> List[str]:
+    """Clause types whose keywords appear in the text (CLAUSE_TYPES order)"""
+    lowered = text.lower()
+    return [clause for clause, pattern in CLAUSE_PATTERNS.items() if pattern.search(lowered)]
+
+
+# ---------------------------
+# Small local model (optional)
+# ---------------------------
+
+_clause_model = None
+_description_embeddings = None
+
+
+def get_clause_model():
+    """Get or initialize the sentence-transformers model and the clause description embeddings"""
+    global _clause_model, _description_embeddings
+    if _clause_model is None:
+        from sentence_transformers import SentenceTransformer
+        print(f"🔧 Loading clause classifier model ({settings.CLAUSE_MODEL_NAME})...")
+        _clause_model = SentenceTransformer(settings.CLAUSE_MODEL_NAME)
+        _description_embeddings = _clause_model.encode(
+            list(CLAUSE_DESCRIPTIONS.values()), normalize_embeddings=True
+        )
+        print("✅ Clause classifier model loaded")
+    return _clause_model, _description_embeddings
+
+
+def classify_by_model(texts: List[str], threshold: Optional[float] = None) -> List[List[str]]:
+    """Clause types whose description is similar enough to each text"""
+    threshold = settings.CLAUSE_MODEL_THRESHOLD if threshold is None else threshold
+    model, descriptions = get_clause_model()
+    embeddings = model.encode(texts, normalize_embeddings=True, batch_size=32)
+    similarities = embeddings @ descriptions.T
+    labels = list(CLAUSE_DESCRIPTIONS)
+    return [[labels[i] for i, score in enumerate(row) if score >= threshold] for row in similarities]
+
+
+# ---------------------------
+# Public API
+# ---------------------------
+
+def classify_chunks(texts: List[str], backend: Optional[str] = None) -> List[List[str]]:
+    """
+    Clause-type tags for each chunk (upload and backfill).
+
+    Args:
+        texts: chunk texts
+        backend: "rules" or "model" (default CLAUSE_CLASSIFIER_BACKEND)
+
+    Returns:
+        One list of clause types per chunk (empty when none apply)
+    """
+    backend = backend or settings.CLAUSE_CLASSIFIER_BACKEND
+    with span("clause_tagging"):
+        tags = [classify_by_rules(text) for text in texts]
+        if backend == "model" and texts:
+            for chunk_tags, model_tags in zip(tags, classify_by_model(texts)):
+                chunk_tags.extend(t for t in model_tags if t not in chunk_tags)
+        elif backend != "rules":
+            raise ValueError(f"Unknown CLAUSE_CLASSIFIER_BACKEND: {backend}")
+    return tags
+
+
+def query_clause_types(question: str) -> List[str]:
+    """
+    Clause types a search query asks about - empty when it isn't about a
+    specific clause type, or names too many of them to be worth filtering on.
+    """
+    if not settings.CLAUSE_FILTER_ENABLED:
+        return []
+    lowered = question.lower()
+    types = [
+        clause for clause in CLAUSE_TYPES
+        if _QUERY_CLAUSE_PATTERNS.get(clause, CLAUSE_PATTERNS[clause]).search(lowered)
+        or (clause in _QUERY_PATTERNS and _QUERY_PATTERNS[clause].search(lowered))
+    ]
+    return types if len(types) <= settings.CLAUSE_FILTER_MAX_TYPES else []
+
+
+def backfill_clause_types(batch_size: int = 500, backend: Optional[str] = None):
+    """Tag chunks uploaded before clause tags existed (clause_types IS NULL)"""
+    from app.database import SessionLocal, ContractChunk
+
+    db = SessionLocal()
+    try:
+        tagged = 0
+        while True:
+            chunks = db.query(ContractChunk).filter(
+                ContractChunk.clause_types.is_(None)
+            ).order_by(ContractChunk.id).limit(batch_size).all()
+            if not chunks:
+                break
+            for chunk, tags in zip(chunks, classify_chunks([c.chunk_text for c in chunks], backend)):
+                chunk.clause_types = tags
+            db.commit()
+            tagged += len(chunks)
+            print(f"🏷️ Tagged {tagged} chunk(s)...")
+        print(f"✅ Clause tags backfilled for {tagged} chunk(s)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill_clause_types()
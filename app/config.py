@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Dict, Optional
 import os
 
 class Settings(BaseSettings):
@@ -8,6 +9,138 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "dev-secret-key-change-in-production"
     COHERE_API_KEY: str
 
+    # Alternative API endpoints, e.g. the local stand-ins in
+    # benchmarks/fake_services.py for load tests (empty = the real services)
+    COHERE_BASE_URL: str = ""  # e.g. http://localhost:9101/v1
+    GEMINI_BASE_URL: str = ""  # e.g. http://localhost:9102
+    TAVILY_BASE_URL: str = ""  # e.g. http://localhost:9103
+
+    # SQLAlchemy connection pool (per worker process, see app/database.py)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0  # max wait for a free connection before erroring
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # replace connections older than this
+    DB_POOL_PRE_PING: bool = True  # test connections on checkout (drops dead ones)
+    DB_PGBOUNCER: bool = False  # behind PgBouncer transaction pooling: no app-side pool, no prepared statement cache
+
+    # Streaming replica for search and listing reads (see app/read_replica.py);
+    # empty = everything on DATABASE_URL
+    DATABASE_REPLICA_URL: str = ""
+    ASYNC_DATABASE_REPLICA_URL: Optional[str] = None  # derived from DATABASE_REPLICA_URL when not set
+    REPLICA_RETRY_SECONDS: float = 30.0  # reads stay on the primary this long after a replica error
+    REPLICA_READ_YOUR_WRITES_SECONDS: float = 300.0  # how long a user's last write position is remembered
+
+    # Hash partitions of contract_chunks by user_id. Fixed when the table is
+    # created - changing it needs `python -m app.partition_chunks --partitions N`
+    CHUNK_PARTITIONS: int = 16
+    # Chunks given their owner's user_id per transaction by
+    # `python -m app.partition_chunks --backfill-user-ids`
+    CHUNK_BACKFILL_BATCH_SIZE: int = 5000
+    # Candidates fetched by the tenant-wide search before reranking
+    TENANT_SEARCH_TOP_K: int = 20
+    # pgvector 0.8+ hnsw.iterative_scan for filtered vector searches
+    # ("relaxed_order", "strict_order"; "" = leave the server default)
+    HNSW_ITERATIVE_SCAN: str = "strict_order"
+    # Reciprocal Rank Fusion constant: higher k flattens the difference
+    # between ranks (benchmarks/retrieval_quality.py compares values)
+    RRF_K: int = 60
+
+    # /my-contracts/all for tenants with at least this many chunks runs as a
+    # batched background purge (see app/purge.py)
+    PURGE_BACKGROUND_MIN_CHUNKS: int = 20000
+    PURGE_BATCH_SIZE: int = 5000  # rows per delete transaction
+    PURGE_BATCH_PAUSE_SECONDS: float = 0.1  # lets autovacuum/replicas keep up between batches
+
+    # Admission control for /query and /upload (see app/admission.py), per worker
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_QUERY_CONCURRENCY: int = 32  # /query + /query/stream running at once
+    ADMISSION_UPLOAD_CONCURRENCY: int = 4
+    ADMISSION_USER_CONCURRENCY: int = 4  # per user, per kind of work
+    ADMISSION_MAX_QUEUE: int = 64  # waiting requests beyond this are shed with 429
+    ADMISSION_USER_MAX_QUEUE: int = 8  # ... or beyond this for one user
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0  # max wait for a slot before 429
+    ADMISSION_RETRY_AFTER_SECONDS: int = 2
+    # Fair-queuing weight per user id (default 1.0; 2.0 = twice the share when queued)
+    ADMISSION_TENANT_WEIGHTS: Dict[int, float] = {}
+
+    # Routes this process serves: all | api | ingest | search (see app/worker_role.py)
+    WORKER_ROLE: str = "all"
+    # gunicorn.conf.py: load the app and local models in the master so the
+    # workers share the weights copy-on-write (see app/preload.py)
+    PRELOAD_MODELS: bool = False
+
+    # Async execution mode: asyncpg engine + async /query and listing routes
+    ASYNC_MODE: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None  # derived from DATABASE_URL when not set
+
+    # Server-side conversation memory
+    HISTORY_TOKEN_BUDGET: int = 2000  # tokens of history (summary + recent turns) sent to the agent
+    HISTORY_LOAD_LIMIT: int = 50  # max unsummarized messages loaded per query
+
+    # Per-tool timeouts (tools called in the same agent step run in parallel)
+    DOCUMENT_SEARCH_TIMEOUT_SECONDS: float = 20.0
+    WEB_SEARCH_TIMEOUT_SECONDS: float = 10.0
+
+    # Web search result cache (memory + SQLite, stale-while-revalidate)
+    WEB_CACHE_ENABLED: bool = True
+    WEB_CACHE_TTL_SECONDS: float = 24 * 3600
+    WEB_CACHE_STALE_SECONDS: float = 7 * 24 * 3600
+    WEB_CACHE_MAX_ENTRIES: int = 1000
+    WEB_CACHE_PATH: str = "web_search_cache.sqlite3"  # empty = memory only
+    WEB_CACHE_PRUNE_EVERY: int = 200  # SQLite writes between sweeps of expired rows
+
+    # bcrypt runs on a process pool with a bounded queue (see app/password_hashing.py)
+    PASSWORD_HASH_WORKERS: int = 2  # 0 = hash on a thread in the API process
+    PASSWORD_HASH_MAX_PENDING: int = 32  # queued + running; beyond this signup/login return 503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+    # Refresh tokens let clients get a new access token without a bcrypt login
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+
+    # Per-process caches of verified tokens and user ids (see app/auth_cache.py)
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_MAX_ENTRIES: int = 10000  # per cache
+    AUTH_USER_CACHE_TTL_SECONDS: float = 60.0  # a deleted user is rejected by other workers within this
+    AUTH_TOKEN_CACHE_MAX_SECONDS: float = 3600.0  # tokens are also never cached past their exp
+
+    # Route greetings / thanks / off-topic / obvious document questions
+    # around the full agent (see app/intent_router.py)
+    INTENT_ROUTER_ENABLED: bool = True
+
+    # Overall time budget per /query (0 disables) - see app/deadline.py
+    QUERY_DEADLINE_SECONDS: float = 45.0
+    # Time kept back for the agent's final answer
+    DEADLINE_ANSWER_RESERVE_SECONDS: float = 8.0
+    # Skip a stage when less than this much time is left
+    DEADLINE_RERANK_MIN_SECONDS: float = 3.0
+    DEADLINE_SEARCH_MIN_SECONDS: float = 2.0
+    DEADLINE_WEB_SEARCH_MIN_SECONDS: float = 5.0
+
+    # Max tokens of document text each search tool returns to the LLM,
+    # after merging adjacent chunks (see app/context_packing.py)
+    TOOL_TOKEN_BUDGETS: Dict[str, int] = {
+        "search_all_my_documents": 1200,
+        "search_contract": 1000,
+    }
+
+    # Summary tree built for each upload (see app/summarizer.py)
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_BACKEND: str = "llm"  # "llm" (Gemini) or "extractive" (no LLM - tests/offline)
+    SUMMARY_SECTION_CHUNKS: int = 8  # Chunks per section summary
+    SUMMARY_FANOUT: int = 6  # Summaries combined per reduce step
+
+    # Clause-type tags on chunks + filtered retrieval (see app/clause_classifier.py)
+    CLAUSE_CLASSIFIER_BACKEND: str = "rules"  # "rules" or "model" (rules + local sentence-transformers model)
+    CLAUSE_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
+    CLAUSE_MODEL_THRESHOLD: float = 0.45
+    CLAUSE_FILTER_ENABLED: bool = True
+    CLAUSE_FILTER_MAX_TYPES: int = 3  # Don't filter queries that name more clause types than this
+
+    # Startup warmup (see app/warmup.py): load models / clients and open DB
+    # connections before taking traffic; /health is 503 until it's done
+    WARMUP_ENABLED: bool = False
+    WARMUP_COMPONENTS: str = "reranker,clause_model,cohere,llm,db"  # comma-separated
+    WARMUP_DB_CONNECTIONS: int = 0  # connections opened per pool (0 = DB_POOL_SIZE)
+
     model_config = SettingsConfigDict(env_file=".env",extra="ignore")
 
 settings = Settings()
@@ -15,4 +148,4 @@ settings = Settings()
 
 os.environ["GOOGLE_API_KEY"] = settings.GOOGLE_API_KEY
 os.environ["TAVILY_API_KEY"] = settings.TAVILY_API_KEY
-os.environ["COHERE_API_KEY"] = settings.COHERE_API_KEY
\ No newline at end of file
+os.environ["COHERE_API_KEY"] = settings.COHERE_API_KEY
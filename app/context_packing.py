@@ -0,0 +1,156 @@
+from typing import Dict, List
+
+from app.memory import estimate_tokens
+from app.metrics import record_context_packing
+
+
+# ==============================
+# Context Packing for Tool Output
+# ==============================
+#
+# chunk_text() splits with overlap, so neighbouring chunks repeat text, and
+# every tool result is resent to Gemini on each later agent step. Before a
+# search tool returns, its chunks are packed:
+#   1. chunks with consecutive chunk_index from the same document are merged
+#      into one passage, dropping the repeated overlap
+#   2. passages are kept best-first until the tool's token budget is used
+#   3. the kept passages are ordered by document, then by position in it
+
+# Longest repeated text we look for between neighbouring chunks (characters).
+# chunk_text uses a 50 character overlap; splitting on separators can shift it.
+MAX_OVERLAP_CHARS = 200
+MIN_OVERLAP_CHARS = 8
+
+
+def strip_overlap(previous: str, following: str) -> str:
+    """
+    Remove the start of `following` that repeats the end of `previous`.
+    Returns `following` unchanged when there is no overlap.
+    """
+    longest = min(len(previous), len(following), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return following
+
+
+def _join(previous: str, following: str) -> str:
+    remainder = strip_overlap(previous, following)
+    if not remainder:
+        return previous
+    if remainder is following:
+        # Not an overlap after all - keep both, separated
+        return f"{previous}\n{following}"
+    return previous + remainder
+
+
+def merge_adjacent(chunks: List[Dict]) -> List[Dict]:
+    """
+    Merge chunks with consecutive chunk_index from the same document.
+
+    Each passage keeps the document, the chunk range it covers and the best
+    score of the chunks in it.
+    """
+    by_document: Dict = {}
+    for chunk in chunks:
+        by_document.setdefault(chunk.get("contract_id"), []).append(chunk)
+
+    passages = []
+    for contract_id, document_chunks in by_document.items():
+        document_chunks = sorted(document_chunks, key=lambda c: c.get("chunk_index", 0))
+        current = None
+        for chunk in document_chunks:
+            index = chunk.get("chunk_index", 0)
+            score = chunk.get("rerank_score", chunk.get("hybrid_score", 0))
+            if current is not None and index == current["end_index"]:
+                # Same chunk returned twice
+                current["score"] = max(current["score"], score)
+                continue
+            if current is not None and index == current["end_index"] + 1:
+                current["text"] = _join(current["text"], chunk["text"])
+                current["end_index"] = index
+                current["score"] = max(current["score"], score)
+                current["chunks"] += 1
+                continue
+            current = {
+                "contract_id": contract_id,
+                "source_document": chunk.get("source_document"),
+                "start_index": index,
+                "end_index": index,
+                "text": chunk["text"],
+                "score": score,
+                "chunks": 1,
+            }
+            passages.append(current)
+    return passages
+
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    # estimate_tokens is ~4 characters per token
+    limit = max(tokens - 1, 0) * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit] + " …"
+
+
+def select_within_budget(passages: List[Dict], token_budget: int) -> List[Dict]:
+    """
+    Keep the best passages that fit in the token budget, then order them by
+    document (best document first) and position within the document.
+    """
+    ranked = sorted(passages, key=lambda p: p["score"], reverse=True)
+
+    kept = []
+    used = 0
+    for passage in ranked:
+        tokens = estimate_tokens(passage["text"])
+        if used + tokens > token_budget:
+            if not kept:
+                # Always return something - trim the best passage to fit
+                passage = dict(passage, text=_truncate_to_tokens(passage["text"], token_budget))
+                kept.append(passage)
+            continue
+        kept.append(passage)
+        used += tokens
+
+    document_rank = {}
+    for passage in kept:
+        document_rank.setdefault(passage["contract_id"], len(document_rank))
+    return sorted(kept, key=lambda p: (document_rank[p["contract_id"]], p["start_index"]))
+
+
+def pack_chunks(chunks: List[Dict], token_budget: int, tool_name: str) -> List[Dict]:
+    """
+    Merge, dedupe and budget the search results of one tool call.
+
+    Args:
+        chunks: search results (text, chunk_index, contract_id, scores)
+        token_budget: max tokens of passage text this tool may return
+        tool_name: for the log line and metrics
+
+    Returns:
+        Passages in the order they should be shown to the LLM
+    """
+    passages = select_within_budget(merge_adjacent(chunks), token_budget)
+
+    raw_tokens = sum(estimate_tokens(c["text"]) for c in chunks)
+    packed_tokens = sum(estimate_tokens(p["text"]) for p in passages)
+    saved = max(raw_tokens - packed_tokens, 0)
+    share = saved / raw_tokens * 100 if raw_tokens else 0.0
+    print(
+        f"📦 {tool_name}: {len(chunks)} chunk(s) -> {len(passages)} passage(s), "
+        f"{raw_tokens} -> {packed_tokens} tokens (saved {saved}, {share:.0f}%)"
+    )
+    record_context_packing(tool_name, raw_tokens, packed_tokens)
+    return passages
+
+
+def chunk_range(passage: Dict) -> str:
+    """
+    " (chunks 4-6)" for a merged passage, "" for a single chunk - so packing
+    never makes unmerged results longer than before.
+    """
+    if passage["start_index"] == passage["end_index"]:
+        return ""
+    return f" (chunks {passage['start_index']}-{passage['end_index']})"
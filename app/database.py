@@ -1,15 +1,83 @@
 from sqlalchemy import Index, create_engine, Column, Integer, String, Text, DateTime, ForeignKey, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from app.config import settings
+from app.metrics import record_pool_checkout
+from sqlalchemy.dialects.postgresql import ARRAY
 from pgvector.sqlalchemy import Vector
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from uuid import uuid4
+import time
 
-engine = create_engine(settings.DATABASE_URL)
+
+# ==============================
+# Connection Pool
+# ==============================
+#
+# Sized by DB_POOL_SIZE + DB_MAX_OVERFLOW per worker process. Connections are
+# pre-pinged and recycled so restarts/failovers and idle-timeouts on the
+# server side don't surface as request errors. With DB_PGBOUNCER=true the app
+# keeps no pool of its own (PgBouncer in transaction mode does the pooling)
+# and asyncpg doesn't cache prepared statements, which PgBouncer can't route.
+#
+# Every checkout is timed (jurisai_db_pool_checkout_seconds, and db_checkout
+# in the request's Server-Timing); pool occupancy is exported at /metrics.
+
+class _TimedCheckout:
+    """Pool mixin: time every connection checkout (queue wait + connect + pre-ping)"""
+
+    metrics_name = "sync"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            record_pool_checkout(self.metrics_name, time.perf_counter() - start, timed_out=True)
+            raise
+        record_pool_checkout(self.metrics_name, time.perf_counter() - start)
+        return connection
+
+
+def _instrumented(pool_class, name: str):
+    return type(f"Instrumented{pool_class.__name__}", (_TimedCheckout, pool_class), {"metrics_name": name})
+
+
+def engine_options(name: str, async_driver: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments from the DB_POOL_* settings"""
+    if settings.DB_PGBOUNCER:
+        options = {"poolclass": _instrumented(NullPool, name)}
+        if async_driver:
+            # Transaction pooling hands each transaction to any server
+            # connection - prepared statements must not outlive it
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+
+    pool_class = AsyncAdaptedQueuePool if async_driver else QueuePool
+    return {
+        "poolclass": _instrumented(pool_class, name),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(settings.DATABASE_URL, **engine_options("sync"))
 
 Base = declarative_base()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: loaded objects stay usable after release_connection()
+# commits, instead of reloading (and checking a connection out again) on access
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 class User(Base):
     __tablename__ = "users"
@@ -19,23 +87,49 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+class UsedRefreshToken(Base):
+    """
+    Refresh tokens already traded in at /auth/refresh (by jti claim). A
+    rotated-out token is refused if it's presented again. Rows are only
+    needed until the token would have expired anyway.
+    """
+    __tablename__ = "used_refresh_tokens"
+    
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
 class Contract(Base):
     __tablename__ = "contracts"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     filename = Column(String, nullable=False)
     upload_date = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     num_chunks = Column(Integer, default=0)
+    
+    __table_args__ = (
+        # Keyset pagination of /my-contracts (app/pagination.py); also serves user_id lookups
+        Index('idx_contracts_user_upload', 'user_id', 'upload_date', 'id'),
+    )
 
 class ContractChunk(Base):
+    """
+    Hash-partitioned by user_id (CHUNK_PARTITIONS partitions, see
+    create_chunk_partitions). Searches filter on user_id, so Postgres only
+    reads the tenant's partition and its own vector / full-text indexes.
+    """
     __tablename__ = "contract_chunks"
     
-    id = Column(Integer, primary_key=True, index=True)
-    contract_id = Column(Integer, ForeignKey("contracts.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Partition key, copied from contracts.user_id (part of the primary key,
+    # as Postgres requires for partitioned tables)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    contract_id = Column(Integer, ForeignKey("contracts.id", ondelete="CASCADE"), nullable=False)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
     embedding = Column(Vector(1024), nullable=False)  # Assuming 1024-dim embeddings from Cohere
+    clause_types = Column(ARRAY(String), nullable=True)  # Set at upload (app/clause_classifier.py); NULL = not tagged yet
 
     __table_args__ = (
         Index(
@@ -43,22 +137,62 @@ class ContractChunk(Base):
             text("to_tsvector('english', chunk_text)"),
             postgresql_using='gin'
         ),
+        Index('idx_chunk_clause_types', 'clause_types', postgresql_using='gin'),
+        Index('idx_chunks_contract_id', 'contract_id'),  # Search filter + cascade lookups
+        Index('idx_chunks_user_id', 'user_id'),  # Tenant-wide search
+        Index(
+            'idx_chunk_embedding_hnsw',
+            'embedding',
+            postgresql_using='hnsw',
+            postgresql_ops={'embedding': 'vector_l2_ops'}
+        ),
+        # Indexes declared here are created on every partition
+        {"postgresql_partition_by": "HASH (user_id)"},
+    )
+
+class ContractSummary(Base):
+    """
+    Node of a contract's map-reduce summary tree (built at upload).
+    level 0 = section summaries over consecutive chunks; each level above
+    combines the one below; the single node on the top level is the
+    whole-document summary.
+    """
+    __tablename__ = "contract_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    contract_id = Column(Integer, ForeignKey("contracts.id", ondelete="CASCADE"), nullable=False)
+    level = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)  # Order within the level
+    chunk_start = Column(Integer, nullable=False)  # First chunk_index covered
+    chunk_end = Column(Integer, nullable=False)  # Last chunk_index covered
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        Index('idx_contract_summary_tree', 'contract_id', 'level', 'position'),
     )
 
 class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    contract_id = Column(Integer, ForeignKey("contracts.id"), nullable=True)  # ✅ NULLABLE for general chat
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    contract_id = Column(Integer, ForeignKey("contracts.id", ondelete="SET NULL"), nullable=True, index=True)  # ✅ NULLABLE for general chat
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    summary = Column(Text, nullable=True)  # Rolling summary of messages folded out of the history window
+    summary_message_id = Column(Integer, nullable=True)  # Last message id included in summary
+    
+    __table_args__ = (
+        # Keyset pagination of /conversations, most recently active first
+        Index('idx_conversations_user_updated', 'user_id', 'updated_at', 'id'),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String, nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -67,6 +201,84 @@ class Message(Base):
         Index('idx_conversation_messages', 'conversation_id', 'created_at'),
     )
 
+def _foreign_key_on_delete(table: str, column: str, referenced: str, on_delete: str) -> str:
+    """
+    Migration: recreate the default-named foreign key of table.column with
+    ON DELETE <on_delete>. Skipped once pg_constraint shows the rule is set,
+    so the referencing table is only re-validated the first time.
+    """
+    constraint = f"{table}_{column}_fkey"
+    rule = {"CASCADE": "c", "SET NULL": "n"}[on_delete]
+    return f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint WHERE conname = '{constraint}' AND confdeltype = '{rule}'
+            ) THEN
+                ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint};
+                ALTER TABLE {table} ADD CONSTRAINT {constraint}
+                    FOREIGN KEY ({column}) REFERENCES {referenced}(id) ON DELETE {on_delete};
+            END IF;
+        END $$
+    """
+
+
+# Schema changes for tables that already exist (create_all only creates
+# missing tables). Every statement must be safe to run on each startup.
+MIGRATIONS = [
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_message_id INTEGER",
+    "ALTER TABLE contract_chunks ADD COLUMN IF NOT EXISTS clause_types VARCHAR[]",
+    # Filled in from contracts by `python -m app.partition_chunks --backfill-user-ids`
+    "ALTER TABLE contract_chunks ADD COLUMN IF NOT EXISTS user_id INTEGER",
+    "CREATE INDEX IF NOT EXISTS idx_chunk_clause_types ON contract_chunks USING gin (clause_types)",
+    # Deleting a user/contract/conversation removes what belongs to it in
+    # the same statement; conversations outlive the contract they were about
+    "CREATE INDEX IF NOT EXISTS idx_chunks_contract_id ON contract_chunks (contract_id)",
+    "CREATE INDEX IF NOT EXISTS idx_contracts_user_upload ON contracts (user_id, upload_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations (user_id, updated_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_conversations_contract_id ON conversations (contract_id)",
+    _foreign_key_on_delete("contracts", "user_id", "users", "CASCADE"),
+    _foreign_key_on_delete("contract_chunks", "contract_id", "contracts", "CASCADE"),
+    _foreign_key_on_delete("contract_summaries", "contract_id", "contracts", "CASCADE"),
+    _foreign_key_on_delete("conversations", "user_id", "users", "CASCADE"),
+    _foreign_key_on_delete("conversations", "contract_id", "contracts", "SET NULL"),
+    _foreign_key_on_delete("messages", "conversation_id", "conversations", "CASCADE"),
+]
+
+
+def chunks_partitioned(conn, table: str = "contract_chunks") -> bool:
+    """True if the chunks table is a partitioned table"""
+    return conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = :table
+        )
+    """), {"table": table}).scalar()
+
+
+def create_chunk_partitions(conn, table: str = "contract_chunks", partitions: int = None):
+    """Create the hash partitions of the chunks table (skips existing ones)"""
+    partitions = partitions or settings.CHUNK_PARTITIONS
+    for remainder in range(partitions):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table}_p{remainder} PARTITION OF {table} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        ))
+
+
+class SchemaNotReady(RuntimeError):
+    """The database needs a one-off migration before the app can serve traffic"""
+
+
+def chunks_missing_user_id(conn) -> bool:
+    """True if some chunk has no user_id yet (stops at the first one)"""
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM contract_chunks WHERE user_id IS NULL)"
+    )).scalar()
+
+
 # Function to create tables
 def init_db():
     """Create all tables"""
@@ -74,6 +286,22 @@ def init_db():
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         conn.commit()
     Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        partitioned = chunks_partitioned(conn)
+        if partitioned:
+            create_chunk_partitions(conn)
+        else:
+            print("⚠️ contract_chunks is not partitioned - run `python -m app.partition_chunks` to migrate it")
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+        conn.commit()
+        # Tenant searches filter on contract_chunks.user_id - a chunk without
+        # one would never be found, so don't start until it's filled in
+        if not partitioned and chunks_missing_user_id(conn):
+            raise SchemaNotReady(
+                "contract_chunks rows have no user_id - run "
+                "`python -m app.partition_chunks --backfill-user-ids` (or the full partition migration) first"
+            )
     print("✅ Database tables created")
 
 
@@ -86,6 +314,87 @@ def get_db():
     finally:
         db.close()
 
+
+@contextmanager
+def session_scope():
+    """Short-lived session for background jobs and scripts: commit on success, rollback on error"""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def release_connection(db):
+    """
+    End the session's transaction so its connection goes back to the pool.
+
+    Call before slow LLM / network work - otherwise the connection stays
+    checked out (idle in transaction) for the whole call. Commits anything
+    pending; the session checks a connection out again on its next query.
+    """
+    if db.in_transaction():
+        db.commit()
+
+
+async def arelease_connection(db):
+    """Async version of release_connection (AsyncSession)"""
+    if db.in_transaction():
+        await db.commit()
+
+
+# ==============================
+# Async engine (ASYNC_MODE)
+# ==============================
+
+_async_engine = None
+_async_session_factory = None
+
+
+def _to_async_url(url: str) -> str:
+    """Turn a sync postgres URL into an asyncpg one"""
+    for prefix in ("postgresql+psycopg2://", "postgresql+psycopg://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            url = "postgresql+asyncpg://" + url[len(prefix):]
+            break
+    # asyncpg takes ssl=..., not libpq's sslmode=...
+    return url.replace("sslmode=", "ssl=")
+
+
+def get_async_engine():
+    """Get or initialize the asyncpg engine (singleton, created on first use)"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        url = settings.ASYNC_DATABASE_URL or _to_async_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(url, **engine_options("async", async_driver=True))
+        _async_session_factory = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """Create a new AsyncSession bound to the asyncpg engine"""
+    get_async_engine()
+    return _async_session_factory()
+
+
+async def get_async_db():
+    """Get async database session for FastAPI"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """Close pooled asyncpg connections (on shutdown)"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
 def drop_db():
     """Drop all tables"""
     Base.metadata.drop_all(bind=engine)
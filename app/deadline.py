@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.config import settings
+
+
+# ==============================
+# Request Deadlines
+# ==============================
+#
+# Each /query gets a time budget (QUERY_DEADLINE_SECONDS). The deadline lives
+# in a ContextVar, so it follows the request into tool threads (copy_context),
+# async tasks and the agent graph without being passed around explicitly.
+#
+# Work checks the remaining budget and degrades instead of running over:
+#   hybrid_search -> Postgres statement_timeout, stops early
+#   embeddings    -> Cohere request timeout
+#   rerank        -> skipped, hybrid order kept
+#   tools         -> timeout clamped, web search skipped when time is short
+#   agent         -> tools disabled, model told to answer with what it has
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget has run out"""
+
+
+class Deadline:
+    """Absolute point in time (monotonic clock) a request must finish by"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for this request, or None when there is no deadline"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def has_time_for(seconds: float) -> bool:
+    """True when there is no deadline or at least `seconds` are left"""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def check_deadline(stage: str):
+    """Raise DeadlineExceeded if the request is already out of time"""
+    deadline = _current_deadline.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"Request deadline of {deadline.seconds:.0f}s exceeded before {stage}")
+
+
+def clamp_timeout(timeout: float, reserve: float = 0.0) -> float:
+    """Shorten a timeout so it ends `reserve` seconds before the deadline"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(min(timeout, left - reserve), 0.0)
+
+
+def new_deadline(seconds: Optional[float]) -> Optional[Deadline]:
+    """Deadline `seconds` from now, or None when seconds is 0/None (disabled)"""
+    return Deadline(seconds) if seconds else None
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """Run the block with a deadline `seconds` from now (no deadline if falsy)"""
+    with use_deadline(new_deadline(seconds)) as deadline:
+        yield deadline
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]):
+    """Make an existing deadline current for the block"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def with_query_deadline(handler):
+    """
+    Route decorator: run the handler under a QUERY_DEADLINE_SECONDS deadline.
+    Works for sync and async handlers (keeps the signature for FastAPI).
+    """
+    if asyncio.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(*args, **kwargs):
+            with request_deadline(settings.QUERY_DEADLINE_SECONDS):
+                return await handler(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with request_deadline(settings.QUERY_DEADLINE_SECONDS):
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+def iterate_with_deadline(deadline: Optional[Deadline], iterator: Iterable) -> Iterator:
+    """
+    Re-enter the deadline on every step of a generator.
+
+    StreamingResponse resumes sync generators in a fresh worker-thread
+    context each time, so a ContextVar set inside the generator would be lost.
+    """
+    iterator = iter(iterator)
+    while True:
+        with use_deadline(deadline):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+# ---------------------------
+# External calls
+# ---------------------------
+
+def cohere_request_options() -> Optional[dict]:
+    """Cohere request_options that stop the HTTP call at the deadline"""
+    left = remaining()
+    if left is None:
+        return None
+    return {"timeout_in_seconds": max(math.ceil(left), 1)}
+
+
+# ---------------------------
+# Postgres statement_timeout
+# ---------------------------
+
+# Execution option marking a transaction-local set_config(..., true): read
+# sessions run these again when they fail over to the primary mid-transaction
+TRANSACTION_SETTING = "transaction_setting"
+
+
+def transaction_setting(statement):
+    """Mark a set_config(..., true) statement to be re-applied after a read failover"""
+    return statement.execution_options(**{TRANSACTION_SETTING: True})
+
+
+_SET_STATEMENT_TIMEOUT = transaction_setting(text(
+    "SELECT current_setting('statement_timeout'), set_config('statement_timeout', :value, true)"
+))
+_RESTORE_STATEMENT_TIMEOUT = transaction_setting(text("SELECT set_config('statement_timeout', :value, true)"))
+
+QUERY_CANCELED = "57014"
+
+
+def statement_timeout_ms() -> Optional[int]:
+    """Milliseconds left for SQL in this request, or None when there is no deadline"""
+    left = remaining()
+    if left is None:
+        return None
+    return max(int(left * 1000), 1)
+
+
+def is_query_canceled(error: Exception) -> bool:
+    """True if Postgres cancelled the statement (statement_timeout)"""
+    return isinstance(error, DBAPIError) and getattr(error.orig, "pgcode", None) == QUERY_CANCELED
+
+
+@contextmanager
+def statement_timeout(db):
+    """
+    Limit the SQL in the block to the time left in the request.
+
+    Uses set_config(..., is_local => true) so it only applies to the current
+    transaction, and restores the previous value afterwards. A cancelled
+    statement rolls the session back and raises DeadlineExceeded.
+    """
+    timeout_ms = statement_timeout_ms()
+    if timeout_ms is None:
+        yield
+        return
+
+    check_deadline("database query")
+    previous = db.execute(_SET_STATEMENT_TIMEOUT, {"value": f"{timeout_ms}ms"}).scalar()
+    try:
+        yield
+    except DBAPIError as e:
+        if is_query_canceled(e):
+            db.rollback()
+            raise DeadlineExceeded("Database query cancelled at the request deadline") from e
+        raise
+    else:
+        db.execute(_RESTORE_STATEMENT_TIMEOUT, {"value": previous})
+
+
+@asynccontextmanager
+async def astatement_timeout(db):
+    """Async version of statement_timeout (AsyncSession)"""
+    timeout_ms = statement_timeout_ms()
+    if timeout_ms is None:
+        yield
+        return
+
+    check_deadline("database query")
+    previous = (await db.execute(_SET_STATEMENT_TIMEOUT, {"value": f"{timeout_ms}ms"})).scalar()
+    try:
+        yield
+    except DBAPIError as e:
+        if is_query_canceled(e):
+            await db.rollback()
+            raise DeadlineExceeded("Database query cancelled at the request deadline") from e
+        raise
+    else:
+        await db.execute(_RESTORE_STATEMENT_TIMEOUT, {"value": previous})
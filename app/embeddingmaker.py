@@ -2,29 +2,64 @@ import cohere
 from typing import List
 import time
 from app.config import settings
+from app.metrics import span
+from app.deadline import check_deadline, cohere_request_options
 
 _cohere_client = None
+_async_cohere_client = None
+
+def _client_options() -> dict:
+    """COHERE_BASE_URL, when set (load tests point it at a local stand-in)"""
+    return {"base_url": settings.COHERE_BASE_URL} if settings.COHERE_BASE_URL else {}
 
 def get_cohere_client():
     """Initialize Cohere client (singleton)"""
     global _cohere_client
     if _cohere_client is None:
         print("🔧 Initializing Cohere client...")
-        _cohere_client = cohere.Client(settings.COHERE_API_KEY)
+        _cohere_client = cohere.Client(settings.COHERE_API_KEY, **_client_options())
         print("✅ Cohere client ready")
     return _cohere_client
 
+def get_async_cohere_client():
+    """Initialize async Cohere client (singleton)"""
+    global _async_cohere_client
+    if _async_cohere_client is None:
+        print("🔧 Initializing async Cohere client...")
+        _async_cohere_client = cohere.AsyncClient(settings.COHERE_API_KEY, **_client_options())
+        print("✅ Async Cohere client ready")
+    return _async_cohere_client
+
 def generate_embedding(text: str) -> List[float]:
     """
     Generate single embedding using Cohere API.
     Returns 1024-dimensional vector.
     """
     client = get_cohere_client()
-    response = client.embed(
-        texts=[text],
-        model="embed-english-v3.0",
-        input_type="search_document"
-    )
+    check_deadline("embedding")
+    with span("embed_query"):
+        response = client.embed(
+            texts=[text],
+            model="embed-english-v3.0",
+            input_type="search_document",
+            request_options=cohere_request_options()
+        )
+    return response.embeddings[0]
+
+async def agenerate_embedding(text: str) -> List[float]:
+    """
+    Async version of generate_embedding.
+    Doesn't block the event loop while waiting on Cohere.
+    """
+    client = get_async_cohere_client()
+    check_deadline("embedding")
+    with span("embed_query"):
+        response = await client.embed(
+            texts=[text],
+            model="embed-english-v3.0",
+            input_type="search_document",
+            request_options=cohere_request_options()
+        )
     return response.embeddings[0]
 
 def generate_many_embeddings(texts: List[str]) -> List[List[float]]:
@@ -48,11 +83,13 @@ def generate_many_embeddings(texts: List[str]) -> List[List[float]]:
         batch = texts[i:i + batch_size]
         
         try:
-            response = client.embed(
-                texts=batch,
-                model="embed-english-v3.0",
-                input_type="search_document"
-            )
+            with span("embed_batch"):
+                response = client.embed(
+                    texts=batch,
+                    model="embed-english-v3.0",
+                    input_type="search_document",
+                    request_options=cohere_request_options()
+                )
             all_embeddings.extend(response.embeddings)
             
             batch_num = i // batch_size + 1
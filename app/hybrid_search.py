@@ -1,11 +1,109 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict
-from app.embeddingmaker import generate_embedding
-from sentence_transformers import CrossEncoder
+from typing import List, Dict, Optional
+from app.embeddingmaker import generate_embedding, agenerate_embedding
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from app.metrics import span
+from app.deadline import statement_timeout, astatement_timeout, has_time_for, transaction_setting
+from app.config import settings
 
 
-def hybrid_search(db: Session,query: str,contract_id: int,top_k: int = 10) -> List[Dict]:
+VECTOR_SQL_TEMPLATE = """
+    SELECT 
+        id,
+        contract_id,
+        chunk_text,
+        chunk_index,
+        embedding <-> CAST(:query_embedding AS vector) AS distance
+    FROM contract_chunks
+    WHERE {scope}{clause_filter}
+    ORDER BY distance ASC
+    LIMIT :limit
+"""
+
+KEYWORD_SQL_TEMPLATE = """
+    SELECT 
+        id,
+        contract_id,
+        chunk_text,
+        chunk_index,
+        ts_rank(
+            to_tsvector('english', chunk_text),
+            plainto_tsquery('english', :query)
+        ) AS rank
+    FROM contract_chunks
+    WHERE {scope}{clause_filter}
+      AND to_tsvector('english', chunk_text) @@ plainto_tsquery('english', :query) 
+    ORDER BY rank DESC
+    LIMIT :limit
+""" #@@ means Does left match right?
+
+# What a search covers. contract_chunks is hash-partitioned on user_id, so
+# any scope with user_id only reads that tenant's partition (and its indexes)
+CONTRACT_SCOPE = "contract_id = :contract_id"
+TENANT_CONTRACT_SCOPE = "user_id = :user_id AND contract_id = :contract_id"
+TENANT_SCOPE = "user_id = :user_id"
+
+# Only chunks tagged with one of the query's clause types (GIN index on clause_types)
+CLAUSE_FILTER = "\n      AND clause_types && CAST(:clause_types AS varchar[])"
+
+_STATEMENTS = {
+    (scope, by_clause): (
+        text(VECTOR_SQL_TEMPLATE.format(scope=scope, clause_filter=CLAUSE_FILTER if by_clause else "")),
+        text(KEYWORD_SQL_TEMPLATE.format(scope=scope, clause_filter=CLAUSE_FILTER if by_clause else ""))
+    )
+    for scope in (CONTRACT_SCOPE, TENANT_CONTRACT_SCOPE, TENANT_SCOPE)
+    for by_clause in (False, True)
+}
+
+VECTOR_SQL, KEYWORD_SQL = _STATEMENTS[(CONTRACT_SCOPE, False)]
+VECTOR_SQL_BY_CLAUSE, KEYWORD_SQL_BY_CLAUSE = _STATEMENTS[(CONTRACT_SCOPE, True)]
+
+# Keep walking the HNSW graph until enough rows pass the WHERE clause
+# (pgvector 0.8+), otherwise a filtered ANN scan can come back short
+_SET_ITERATIVE_SCAN = transaction_setting(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"))
+
+
+def _search_scope(contract_id: Optional[int], user_id: Optional[int]):
+    """WHERE clause + its params for one contract, one contract of a tenant, or a whole tenant"""
+    if contract_id is None:
+        return TENANT_SCOPE, {"user_id": user_id}
+    if user_id is None:
+        return CONTRACT_SCOPE, {"contract_id": contract_id}
+    return TENANT_CONTRACT_SCOPE, {"user_id": user_id, "contract_id": contract_id}
+
+
+def _search_statements(scope: str, clause_types: Optional[List[str]]):
+    """Vector + keyword SQL, pre-filtered on clause type when the query has one"""
+    return _STATEMENTS[(scope, bool(clause_types))]
+
+
+def _search_params(query: str, query_embedding: List[float], scope_params: Dict, top_k: int, clause_types: Optional[List[str]]):
+    vector_params = {
+        "query_embedding": str(query_embedding),
+        "limit": top_k,
+        **scope_params
+    }
+    keyword_params = {
+        "query": query,
+        "limit": top_k,
+        **scope_params
+    }
+    if clause_types:
+        vector_params["clause_types"] = list(clause_types)
+        keyword_params["clause_types"] = list(clause_types)
+    return vector_params, keyword_params
+
+
+def hybrid_search(
+    db: Session,
+    query: str,
+    contract_id: int,
+    top_k: int = 10,
+    clause_types: Optional[List[str]] = None,
+    user_id: Optional[int] = None
+) -> List[Dict]:
     """
     Hybrid search: Combine vector search + keyword search
     
@@ -14,86 +112,173 @@ def hybrid_search(db: Session,query: str,contract_id: int,top_k: int = 10) -> Li
     2. Keyword search (exact text matches)
     3. Combine using Reciprocal Rank Fusion (RRF)
     
+    With clause_types (see app/clause_classifier.py) both searches score the
+    chunks tagged with one of those clause types first; when fewer than
+    top_k are tagged, the rest of the contract fills the remaining places. Passing the owner's user_id lets Postgres
+    prune the search to that tenant's partition.
+    
     Returns:
         List of chunks with combined scores
     """
-    
+    return _hybrid_search(db, query, _search_scope(contract_id, user_id), top_k, clause_types)
+
+
+def hybrid_search_tenant(
+    db: Session,
+    query: str,
+    user_id: int,
+    top_k: int = 20,
+    clause_types: Optional[List[str]] = None
+) -> List[Dict]:
+    """
+    Hybrid search over all of a user's contracts at once (multi-document
+    tool): one embedding and one vector + keyword query pair on the tenant's
+    partition, instead of a search per contract. Results carry contract_id.
+    """
+    return _hybrid_search(db, query, _search_scope(None, user_id), top_k, clause_types)
+
+
+def _hybrid_search(db: Session, query: str, scope, top_k: int, clause_types: Optional[List[str]]) -> List[Dict]:
     # Step 1: Vector Search
     print("🔍 Running vector search...")
     query_embedding = generate_embedding(query)
     
-    vector_sql = text("""
-        SELECT 
-            id,
-            chunk_text,
-            chunk_index,
-            embedding <-> CAST(:query_embedding AS vector) AS distance
-        FROM contract_chunks
-        WHERE contract_id = :contract_id
-        ORDER BY distance ASC
-        LIMIT :limit
-    """)
-    
-    vector_results = db.execute(
-        vector_sql,
-        {
-            "query_embedding": str(query_embedding),
-            "contract_id": contract_id,
-            "limit": top_k
-        }
-    ).fetchall()
-    
-    # Step 2: Keyword Search (Full-Text Search)
-    print("🔍 Running keyword search...")
-    keyword_sql = text("""
-        SELECT 
-            id,
-            chunk_text,
-            chunk_index,
-            ts_rank(
-                to_tsvector('english', chunk_text),
-                plainto_tsquery('english', :query)
-            ) AS rank
-        FROM contract_chunks
-        WHERE contract_id = :contract_id
-          AND to_tsvector('english', chunk_text) @@ plainto_tsquery('english', :query) 
-        ORDER BY rank DESC
-        LIMIT :limit
-    """) #@@ means Does left match right?
-    
-    keyword_results = db.execute(
-        keyword_sql,
-        {
-            "query": query,
-            "contract_id": contract_id,
-            "limit": top_k
-        }
-    ).fetchall()
+    vector_results, keyword_results = _run_searches(db, query, query_embedding, scope, top_k, clause_types)
+    if clause_types and len(vector_results) < top_k:
+        print(f"🏷️ Only {len(vector_results)} chunk(s) tagged {', '.join(clause_types)}, filling from all chunks")
+        vector_results, keyword_results = _tagged_first(
+            (vector_results, keyword_results),
+            _run_searches(db, query, query_embedding, scope, top_k, None),
+            top_k
+        )
     
     # Step 3: Reciprocal Rank Fusion (RRF)
+    final_results = _fuse_results(vector_results, keyword_results, top_k)
+    
+    print(f"✅ Hybrid search found {len(final_results)} chunks")
+    return final_results
+
+
+def _run_searches(db: Session, query: str, query_embedding: List[float], scope, top_k: int, clause_types: Optional[List[str]]):
+    scope_sql, scope_params = scope
+    vector_sql, keyword_sql = _search_statements(scope_sql, clause_types)
+    vector_params, keyword_params = _search_params(query, query_embedding, scope_params, top_k, clause_types)
+    
+    # Both queries are cut off at the request deadline
+    with statement_timeout(db):
+        if settings.HNSW_ITERATIVE_SCAN:
+            db.execute(_SET_ITERATIVE_SCAN, {"mode": settings.HNSW_ITERATIVE_SCAN})
+        with span("vector_sql"):
+            vector_results = db.execute(vector_sql, vector_params).fetchall()
+        
+        # Step 2: Keyword Search (Full-Text Search)
+        print("🔍 Running keyword search...")
+        with span("keyword_sql"):
+            keyword_results = db.execute(keyword_sql, keyword_params).fetchall()
+    
+    return vector_results, keyword_results
+
+
+async def ahybrid_search(
+    db,
+    query: str,
+    contract_id: int,
+    top_k: int = 10,
+    clause_types: Optional[List[str]] = None,
+    user_id: Optional[int] = None
+) -> List[Dict]:
+    """
+    Async version of hybrid_search (AsyncSession + async Cohere embedding).
+    Same SQL and same RRF fusion, without blocking the event loop.
+    """
+    return await _ahybrid_search(db, query, _search_scope(contract_id, user_id), top_k, clause_types)
+
+
+async def ahybrid_search_tenant(
+    db,
+    query: str,
+    user_id: int,
+    top_k: int = 20,
+    clause_types: Optional[List[str]] = None
+) -> List[Dict]:
+    """Async version of hybrid_search_tenant"""
+    return await _ahybrid_search(db, query, _search_scope(None, user_id), top_k, clause_types)
+
+
+async def _ahybrid_search(db, query: str, scope, top_k: int, clause_types: Optional[List[str]]) -> List[Dict]:
+    print("🔍 Running vector search (async)...")
+    query_embedding = await agenerate_embedding(query)
+    
+    vector_results, keyword_results = await _arun_searches(db, query, query_embedding, scope, top_k, clause_types)
+    if clause_types and len(vector_results) < top_k:
+        print(f"🏷️ Only {len(vector_results)} chunk(s) tagged {', '.join(clause_types)}, filling from all chunks")
+        vector_results, keyword_results = _tagged_first(
+            (vector_results, keyword_results),
+            await _arun_searches(db, query, query_embedding, scope, top_k, None),
+            top_k
+        )
+    
+    final_results = _fuse_results(vector_results, keyword_results, top_k)
+    
+    print(f"✅ Hybrid search found {len(final_results)} chunks")
+    return final_results
+
+
+async def _arun_searches(db, query: str, query_embedding: List[float], scope, top_k: int, clause_types: Optional[List[str]]):
+    scope_sql, scope_params = scope
+    vector_sql, keyword_sql = _search_statements(scope_sql, clause_types)
+    vector_params, keyword_params = _search_params(query, query_embedding, scope_params, top_k, clause_types)
+    
+    async with astatement_timeout(db):
+        if settings.HNSW_ITERATIVE_SCAN:
+            await db.execute(_SET_ITERATIVE_SCAN, {"mode": settings.HNSW_ITERATIVE_SCAN})
+        with span("vector_sql"):
+            vector_results = (await db.execute(vector_sql, vector_params)).fetchall()
+        
+        print("🔍 Running keyword search (async)...")
+        with span("keyword_sql"):
+            keyword_results = (await db.execute(keyword_sql, keyword_params)).fetchall()
+    
+    return vector_results, keyword_results
+
+
+def _tagged_first(tagged, unfiltered, top_k: int):
+    """
+    Per search, the clause-tagged rows first (a ranking boost), then the
+    best untagged ones up to top_k rows.
+    """
+    merged = []
+    for tagged_rows, all_rows in zip(tagged, unfiltered):
+        seen = {row.id for row in tagged_rows}
+        merged.append((list(tagged_rows) + [row for row in all_rows if row.id not in seen])[:top_k])
+    return merged
+
+
+def _fuse_results(vector_results: List, keyword_results: List, top_k: int) -> List[Dict]:
+    """
+    Combine vector + keyword rows with RRF and build the result dicts.
+    Both searches already select the chunk text, so no extra lookups are needed.
+    """
     print("🔀 Combining results with RRF...")
-    combined_scores = reciprocal_rank_fusion(vector_results, keyword_results)
+    with span("rrf"):
+        combined_scores = reciprocal_rank_fusion(vector_results, keyword_results, settings.RRF_K)
     
-    # Step 4: Get top K after fusion
+    # Get top K after fusion
     top_chunks = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
     
-    # Step 5: Fetch full chunk details
+    rows = {row.id: row for row in list(vector_results) + list(keyword_results)}
+    
     final_results = []
     for chunk_id, score in top_chunks:
-        chunk = db.execute(
-            text("SELECT id, chunk_text, chunk_index FROM contract_chunks WHERE id = :id"),
-            {"id": chunk_id}
-        ).fetchone()
-        
-        if chunk:
-            final_results.append({
-                "chunk_id": chunk.id,
-                "chunk_index": chunk.chunk_index,
-                "text": chunk.chunk_text,
-                "hybrid_score": round(score, 3)
-            })
+        chunk = rows[chunk_id]
+        final_results.append({
+            "chunk_id": chunk.id,
+            "contract_id": chunk.contract_id,
+            "chunk_index": chunk.chunk_index,
+            "text": chunk.chunk_text,
+            "hybrid_score": round(score, 3)
+        })
     
-    print(f"✅ Hybrid search found {len(final_results)} chunks")
     return final_results
 
 
@@ -140,6 +325,8 @@ def get_reranker():
     """Get or initialize reranker model"""
     global _reranker
     if _reranker is None:
+        # Imported here: sentence_transformers pulls in torch (seconds, hundreds of MB)
+        from sentence_transformers import CrossEncoder
         print("🔧 Loading reranker model...")
         _reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
         print("✅ Reranker loaded")
@@ -161,6 +348,9 @@ def rerank_chunks(query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
     if not chunks:
         return []
     
+    if not has_time_for(settings.DEADLINE_RERANK_MIN_SECONDS):
+        return _skip_rerank(chunks, top_k)
+    
     print(f"🎯 Reranking {len(chunks)} chunks...")
     
     reranker = get_reranker()
@@ -172,7 +362,8 @@ def rerank_chunks(query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
     # pairs.append((query, chunk['text']))
     
     # Get reranking scores comapi to query
-    scores = reranker.predict(pairs)
+    with span("rerank"):
+        scores = reranker.predict(pairs)
     
     # Add rerank scores to chunks
     for chunk, score in zip(chunks, scores):
@@ -183,4 +374,26 @@ def rerank_chunks(query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
     
     print(f"✅ Reranked, returning top {top_k}")
     
-    return reranked[:top_k] #slicing done for top k out of 10
\ No newline at end of file
+    return reranked[:top_k] #slicing done for top k out of 10
+
+
+def _skip_rerank(chunks: List[Dict], top_k: int) -> List[Dict]:
+    """Out of time for the cross-encoder - keep the hybrid search order"""
+    print("⏭️ Skipping rerank (request deadline close), keeping hybrid order")
+    return chunks[:top_k]
+
+
+# Cross-encoder inference is CPU bound - async callers run it here so the
+# event loop stays free (torch releases the GIL during predict)
+_rerank_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank")
+
+
+async def arerank_chunks(query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
+    """Async version of rerank_chunks, offloaded to the rerank executor"""
+    if not chunks:
+        return []
+    # Checked here - the executor thread doesn't see the request's deadline
+    if not has_time_for(settings.DEADLINE_RERANK_MIN_SECONDS):
+        return _skip_rerank(chunks, top_k)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_rerank_executor, rerank_chunks, query, chunks, top_k)
@@ -0,0 +1,283 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter, deque
+from typing import Dict, List, Tuple
+
+from app.config import settings
+from app.metrics import INTENT_ROUTES, INTENT_ROUTE_SECONDS
+
+
+# ==============================
+# Pre-agent Intent Router
+# ==============================
+#
+# Cheap local classification of each /query before we pay for the agent:
+#   greeting / thanks / off_topic -> answered from a template (no LLM call)
+#   document                      -> straight into retrieval + one short LLM call
+#   agent                         -> full tool-using agent (default when unsure)
+#
+# Keyword rules catch the obvious cases; everything else is matched against
+# labeled example intents with a small hashed n-gram embedding model.
+#
+# A wrong template answer is much worse than an unneeded agent call, so the
+# model only picks a path with a clear margin over the runner-up, never
+# refuses as off-topic for users who have documents, and never answers
+# follow-ups in an ongoing conversation ("and what about him?") from a
+# template.
+
+GREETING = "greeting"
+THANKS = "thanks"
+OFF_TOPIC = "off_topic"
+DOCUMENT = "document"
+AGENT = "agent"
+
+TEMPLATE_ROUTES = {GREETING, THANKS, OFF_TOPIC}
+
+TEMPLATES = {
+    GREETING: (
+        "Hello! I'm your legal and business document assistant. "
+        "Upload a contract or agreement, or ask me about one you've already uploaded - "
+        "for example its termination terms, payment terms or obligations."
+    ),
+    THANKS: "You're welcome! Let me know if there's anything else in your documents you'd like me to look at.",
+    OFF_TOPIC: (
+        "I specialize in analyzing legal and business documents. "
+        "Please ask about your uploaded document or related legal/business topics."
+    ),
+}
+
+
+# ---------------------------
+# Keyword rules
+# ---------------------------
+
+_GREETING_RE = re.compile(
+    r"^(hi|hii+|hello|hey|hiya|yo|greetings|good (morning|afternoon|evening))"
+    r"( there| jurisai| team)?[\s!.,:)]*$"
+)
+_THANKS_RE = re.compile(r"\b(thanks|thank you|thx|ty|cheers|appreciate it|much appreciated)\b")
+
+# Words that mean the user is talking about legal/business documents
+_LEGAL_TERMS = re.compile(
+    r"\b(contract|clause|agreement|lease|nda|terms?|section|party|parties|liabilit\w*|"
+    r"indemn\w*|terminat\w*|payment|obligation\w*|warrant\w*|confidential\w*|governing law|"
+    r"jurisdiction|breach|renewal|notice period|non-compete|force majeure|arbitration|"
+    r"document|pdf|file|signed|signature|invoice|policy|compliance|legal|law|"
+    # Parties and roles
+    r"landlord|tenant|lessee|lessor|employer|employee|employment|licensor|licensee|buyer|seller|"
+    r"vendor|supplier|customer|client|contractor|consultant|guarantor|signator\w*|owner|"
+    # Money, dates and other contract vocabulary
+    r"rent|deposit|salary|fees?|penalt\w*|dispute|amendment|assign\w*|renew\w*|schedule|"
+    r"exhibit|annex|appendix|effective date|start date|expir\w*|duration|deadline)\b"
+)
+# References to the user's own uploaded documents
+_OWN_DOCUMENT = re.compile(r"\b(my|our|this|the uploaded|uploaded|these)\b")
+# Needs outside knowledge (web search) or a comparison -> full agent
+_NEEDS_AGENT = re.compile(
+    r"\b(standard|typical|typically|industry|market|normal|usual|common|compare|comparison|"
+    r"versus|vs|benchmark|what does .+ mean|define|definition|latest|current|recent|news)\b"
+)
+
+# Whole-document summary requests -> precomputed summary tree
+_SUMMARY = re.compile(
+    r"\b(summar\w*|overview|tl;?dr|gist|key points|main points|"
+    r"what is (this|my|the) (document|contract|agreement|file) about|explain the whole)\b"
+)
+
+
+def is_summary_question(question: str) -> bool:
+    """True for "summarize my contract" style questions"""
+    return bool(_SUMMARY.search(question.lower()))
+
+
+# ---------------------------
+# Small embedding-similarity model
+# ---------------------------
+
+_DIM = 2 ** 18
+
+EXAMPLES: Dict[str, List[str]] = {
+    GREETING: [
+        "hi", "hello", "hey there", "good morning", "hello how are you",
+        "hi jurisai", "hey how is it going", "good evening",
+    ],
+    THANKS: [
+        "thanks", "thank you so much", "thanks that helps", "great thank you",
+        "appreciate it", "perfect thanks", "ok thanks a lot", "cheers",
+    ],
+    OFF_TOPIC: [
+        "who won the football match yesterday", "what is the weather today",
+        "recommend a good movie", "give me a recipe for pasta",
+        "write a python function to sort a list", "what are the symptoms of flu",
+        "tell me a joke", "which stocks should i buy", "what is the capital of france",
+        "what song is trending", "help me debug my javascript code", "plan a trip to paris",
+    ],
+    DOCUMENT: [
+        "what is the termination clause in my contract", "who are the parties to this agreement",
+        "summarize my document", "what does section 5 of my contract say",
+        "what are the payment terms in my lease", "when does my agreement expire",
+        "explain the indemnity clause in this contract", "what is the notice period in my employment contract",
+        "does my nda have a non compete", "list the obligations of the tenant in my lease",
+        "what is the governing law of this agreement", "how much is the late fee in my contract",
+    ],
+    AGENT: [
+        "is my termination clause standard compared to the industry", "what does indemnification mean",
+        "what is force majeure", "how does my non compete compare to typical ones",
+        "is this liability cap normal", "what is a typical nda duration",
+        "compare my payment terms with market practice", "explain limitation of liability in general",
+    ],
+}
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % _DIM
+
+
+def embed(text: str) -> Dict[int, float]:
+    """
+    Hashed bag of words + word bigrams + character trigrams, L2 normalized.
+    Tiny and deterministic - enough to tell short intents apart.
+    """
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    features = Counter()
+    for word in words:
+        features[_bucket("w:" + word)] += 1.0
+    for first, second in zip(words, words[1:]):
+        features[_bucket(f"b:{first} {second}")] += 1.0
+    padded = f" {' '.join(words)} "
+    for i in range(len(padded) - 2):
+        features[_bucket("c:" + padded[i:i + 3])] += 0.5
+
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+
+def _cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+_EXAMPLE_VECTORS: List[Tuple[str, Dict[int, float]]] = [
+    (label, embed(example)) for label, examples in EXAMPLES.items() for example in examples
+]
+
+
+def intent_scores(text: str) -> Dict[str, float]:
+    """Best cosine similarity per labeled intent"""
+    vector = embed(text)
+    scores = {label: 0.0 for label in EXAMPLES}
+    for label, example_vector in _EXAMPLE_VECTORS:
+        scores[label] = max(scores[label], _cosine(vector, example_vector))
+    return scores
+
+
+def nearest_intent(text: str) -> Tuple[str, float]:
+    """Closest labeled example intent and its cosine similarity"""
+    scores = intent_scores(text)
+    label = max(scores, key=scores.get)
+    return (label, scores[label]) if scores[label] > 0 else (AGENT, 0.0)
+
+
+def classify_intent(
+    question: str,
+    has_documents: bool,
+    has_history: bool = False,
+    threshold: float = 0.45,
+    margin: float = 0.1,
+    off_topic_threshold: float = 0.6
+) -> str:
+    """
+    Pick the path for a question: greeting, thanks, off_topic, document or agent.
+    Anything uncertain goes to the full agent: a similarity match needs
+    `margin` over the next-best intent, an off-topic refusal needs
+    `off_topic_threshold` and is never given to users with documents or
+    inside an ongoing conversation (has_history).
+    """
+    text = question.strip().lower()
+    words = text.split()
+
+    # Keyword rules (templates only outside an ongoing conversation -
+    # "thanks, and what about him" is a follow-up, not a thank-you)
+    if not has_history and _GREETING_RE.match(text):
+        return GREETING
+    if not has_history and len(words) <= 6 and _THANKS_RE.search(text) and "?" not in text:
+        return THANKS
+    if _NEEDS_AGENT.search(text):
+        return AGENT
+
+    legal = bool(_LEGAL_TERMS.search(text))
+    if legal and has_documents and _OWN_DOCUMENT.search(text):
+        return DOCUMENT
+
+    # Similarity model
+    scores = intent_scores(text)
+    label = max(scores, key=scores.get)
+    score = scores[label]
+    runner_up = max(value for other, value in scores.items() if other != label)
+    if score < threshold or score - runner_up < margin:
+        return AGENT
+    # Follow-ups depend on the earlier turns - only the agent sees those
+    if has_history and label in TEMPLATE_ROUTES:
+        return AGENT
+    if label == OFF_TOPIC and (legal or has_documents or score < off_topic_threshold):
+        return AGENT
+    if label == DOCUMENT and not has_documents:
+        return AGENT
+    if label in (GREETING, THANKS) and len(words) > 8:
+        return AGENT
+    return label
+
+
+def route_question(question: str, doc_count: int, has_history: bool = False) -> str:
+    """Pick the answering path for a /query (always the agent when disabled)"""
+    if not settings.INTENT_ROUTER_ENABLED:
+        return AGENT
+    route = classify_intent(question, has_documents=doc_count > 0, has_history=has_history)
+    print(f"🧭 Routed to: {route}")
+    return route
+
+
+def search_method(route: str) -> str:
+    """search_method value reported in /query responses"""
+    return "smart_conversational_ai" if route == AGENT else f"intent_router:{route}"
+
+
+# ---------------------------
+# Per-path stats
+# ---------------------------
+
+class RouteStats:
+    """Traffic share and latency per routing path (this process)"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._latencies: Dict[str, deque] = {}
+        self._window = window
+
+    def record(self, route: str, seconds: float):
+        INTENT_ROUTES.labels(route).inc()
+        INTENT_ROUTE_SECONDS.labels(route).observe(seconds)
+        with self._lock:
+            self._counts[route] += 1
+            self._latencies.setdefault(route, deque(maxlen=self._window)).append(seconds)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            total = sum(self._counts.values())
+            result = {}
+            for route, count in self._counts.items():
+                latencies = sorted(self._latencies[route])
+                result[route] = {
+                    "count": count,
+                    "share": round(count / total, 3) if total else 0.0,
+                    "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+                    "p95_ms": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 1),
+                }
+            return result
+
+
+route_stats = RouteStats()
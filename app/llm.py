@@ -1,8 +1,12 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware
 from langchain_core.messages import SystemMessage
-from sqlalchemy.orm import Session
+from app.config import settings
+from app.metrics import llm_metrics_callback
+from app.deadline import current_deadline, has_time_for, remaining
+import asyncio
 
 _llm = None
 
@@ -14,34 +18,16 @@ def get_llm():
         print("🤖 Loading Gemini LLM...")
         _llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
-            temperature=0.3
+            temperature=0.3,
+            base_url=settings.GEMINI_BASE_URL or None,
+            callbacks=[llm_metrics_callback()]
         )
         print("✅ LLM loaded")
     return _llm
 
 
-def create_smart_agent(db: Session, user_id: int):
-    """
-    Create intelligent conversational agent using NEW LangChain API.
-    
-    Can:
-    - Chat naturally without documents
-    - Search user's documents when relevant
-    - Search the web for general knowledge
-    - Combine multiple sources intelligently
-    """
-    from app.tools import create_web_search_tool, create_multi_document_search_tool
-    
-    llm = get_llm()
-    
-    # Create tools
-    tools = [
-        create_multi_document_search_tool(db, user_id),
-        create_web_search_tool()
-    ]
-    
-    # System prompt for smart behavior
-    system_prompt = """
+# System prompt for smart behavior
+SYSTEM_PROMPT = """
     You are a specialized legal and business document analysis assistant.
 
     Your mission:
@@ -72,6 +58,11 @@ def create_smart_agent(db: Session, user_id: int):
         - Legal background context
         - Comparisons to typical practice
 
+    3. get_document_summary
+    - Returns summaries of the user's documents, prepared when they were uploaded.
+    - Use this FIRST for summaries, overviews and "what is this document about".
+    - Set include_sections=true for a section-by-section breakdown of one document.
+
     ------------------------------------------------------------
     TOOL SELECTION LOGIC
     ------------------------------------------------------------
@@ -94,10 +85,13 @@ def create_smart_agent(db: Session, user_id: int):
     - "What is standard NDA duration?"
 
     FOR COMPARISON QUESTIONS:
-    Use BOTH tools in sequence:
+    Call BOTH tools in the same step (they run in parallel):
     1. search_contract to find the user’s clause
     2. tavily_search to find industry standard
-    3. Compare clearly and objectively
+    Then compare clearly and objectively.
+
+    Whenever you need several independent searches, request them all
+    at once instead of one after another.
 
     ------------------------------------------------------------
     HANDLING BROAD OR VAGUE QUESTIONS
@@ -112,7 +106,7 @@ def create_smart_agent(db: Session, user_id: int):
 
     You MUST:
 
-    1. Retrieve sufficient document content using search_contract.
+    1. Start from get_document_summary; use search_contract only for details the summary doesn't cover.
     2. Provide a structured summary including:
     - Purpose of the document
     - Parties involved
@@ -189,31 +183,122 @@ def create_smart_agent(db: Session, user_id: int):
     your goal is to make the user genuinely understand their document.
     """
 
+
+# ---------------------------
+# Request deadline
+# ---------------------------
+
+FINAL_ANSWER_NOTE = """
+
+    TIME LIMIT: This request is almost out of time. Do not call any more tools.
+    Answer now using only the information already gathered above, and say
+    briefly if something could not be checked."""
+
+OUT_OF_TIME_ANSWER = (
+    "I ran out of time while researching this question. "
+    "Please try again, or ask about a more specific part of your document."
+)
+
+
+class DeadlineMiddleware(AgentMiddleware):
+    """
+    Once the request deadline is close, stop the model from calling tools
+    (tool_choice="none") and tell it to answer with what it already has.
+    """
+    
+    def _apply_deadline(self, request):
+        if has_time_for(settings.DEADLINE_ANSWER_RESERVE_SECONDS):
+            return request
+        print(f"⏳ {remaining():.1f}s left in the request budget - forcing a final answer")
+        return request.override(
+            tool_choice="none",
+            system_message=SystemMessage(content=(request.system_prompt or "") + FINAL_ANSWER_NOTE)
+        )
+    
+    def wrap_model_call(self, request, handler):
+        return handler(self._apply_deadline(request))
+    
+    async def awrap_model_call(self, request, handler):
+        return await handler(self._apply_deadline(request))
+
+
+def create_smart_agent(user_id: int):
+    """
+    Create intelligent conversational agent using NEW LangChain API.
+    
+    Can:
+    - Chat naturally without documents
+    - Search user's documents when relevant
+    - Search the web for general knowledge
+    - Combine multiple sources intelligently
+    
+    The document tools open their own read session per call, so a tool
+    that outlives its timeout never touches the request's session.
+    """
+    from app.tools import (
+        create_web_search_tool, create_multi_document_search_tool, create_document_summary_tool, with_timeout
+    )
+    
+    llm = get_llm()
+    
+    # Create tools (each with its own timeout - tool calls from one model
+    # step run concurrently in the agent's ToolNode)
+    tools = [
+        with_timeout(
+            create_multi_document_search_tool(user_id),
+            settings.DOCUMENT_SEARCH_TIMEOUT_SECONDS,
+            min_seconds=settings.DEADLINE_SEARCH_MIN_SECONDS
+        ),
+        with_timeout(
+            create_web_search_tool(),
+            settings.WEB_SEARCH_TIMEOUT_SECONDS,
+            min_seconds=settings.DEADLINE_WEB_SEARCH_MIN_SECONDS
+        ),
+        with_timeout(create_document_summary_tool(user_id), settings.DOCUMENT_SEARCH_TIMEOUT_SECONDS)
+    ]
+    
     # Create agent with new API
-    agent = create_agent(llm, tools, system_prompt=system_prompt)
+    agent = create_agent(llm, tools, system_prompt=SYSTEM_PROMPT, middleware=[DeadlineMiddleware()])
     
     return agent
 
 
-def run_smart_agent(agent, question: str, conversation_history: list = None) -> str:
+def create_async_smart_agent(user_id: int):
     """
-    Execute smart agent with conversation context using NEW API
-    
-    Args:
-        agent: LangChain agent (from create_agent)
-        question: Current question
-        conversation_history: List of previous messages [{"role": "user", "content": "..."}, ...]
-        
-    Returns:
-        Final answer as string
+    Same agent as create_smart_agent, but with async tools for agent.astream.
+    Used in ASYNC_MODE - the tools open their own async DB sessions.
     """
+    from app.tools import (
+        create_web_search_tool, create_async_multi_document_search_tool, create_async_document_summary_tool, with_timeout
+    )
     
-    # Build messages list
+    llm = get_llm()
+    
+    tools = [
+        with_timeout(
+            create_async_multi_document_search_tool(user_id),
+            settings.DOCUMENT_SEARCH_TIMEOUT_SECONDS,
+            min_seconds=settings.DEADLINE_SEARCH_MIN_SECONDS
+        ),
+        with_timeout(
+            create_web_search_tool(),
+            settings.WEB_SEARCH_TIMEOUT_SECONDS,
+            min_seconds=settings.DEADLINE_WEB_SEARCH_MIN_SECONDS
+        ),
+        with_timeout(create_async_document_summary_tool(user_id), settings.DOCUMENT_SEARCH_TIMEOUT_SECONDS)
+    ]
+    
+    return create_agent(llm, tools, system_prompt=SYSTEM_PROMPT, middleware=[DeadlineMiddleware()])
+
+
+def _build_messages(question: str, conversation_history: list = None) -> list:
+    """Build the agent input messages from history plus the current question"""
     messages = []
     
-    # Add conversation history if provided (last 20 messages - your preference)
+    # Add conversation history if provided (already fitted to
+    # HISTORY_TOKEN_BUDGET by app.memory)
     if conversation_history:
-        for msg in conversation_history[-20:]:  # Keep your 20 message limit
+        for msg in conversation_history:
             messages.append({
                 "role": msg["role"],
                 "content": msg["content"]
@@ -225,8 +310,55 @@ def run_smart_agent(agent, question: str, conversation_history: list = None) ->
         "content": question
     })
     
+    return messages
+
+
+def extract_answer_text(answer) -> str:
+    """
+    Extract plain text from an LLM message content.
+    
+    Gemini can return a string, a dict with a text field, or a list of
+    message parts - this flattens all of them to a string.
+    """
+    if isinstance(answer, list):
+        # If it's a list of message parts, extract the text
+        text_parts = []
+        for part in answer:
+            if isinstance(part, dict) and part.get('type') == 'text':
+                text_parts.append(part.get('text', ''))
+            elif isinstance(part, str):
+                text_parts.append(part)
+        return ' '.join(text_parts)
+    if isinstance(answer, dict) and 'text' in answer:
+        # If it's a dict with text field
+        return answer['text']
+    # If it's already a string
+    return str(answer)
+
+
+def run_smart_agent(agent, question: str, conversation_history: list = None) -> str:
+    """
+    Execute smart agent with conversation context using NEW API
+    
+    Args:
+        agent: LangChain agent (from create_agent)
+        question: Current question
+        conversation_history: List of previous messages [{"role": "user", "content": "..."}, ...]
+        
+    Returns:
+        Final answer as string
+    """
+    
+    from app.tools import start_tool_trace, report_tool_trace
+    
+    # Build messages list
+    messages = _build_messages(question, conversation_history)
+    
     try:
         final_answer = ""
+        trace = start_tool_trace()
+        
+        deadline = current_deadline()
         
         # Stream agent responses
         for step in agent.stream(
@@ -240,7 +372,15 @@ def run_smart_agent(agent, question: str, conversation_history: list = None) ->
                 final_answer = last_message.content
             else:
                 final_answer = str(last_message)
+            
+            # Past the deadline - stop between graph steps (a blocking call
+            # can't be interrupted, but nothing new gets started)
+            if deadline is not None and deadline.expired():
+                print("⏱️ Request deadline reached - stopping the agent")
+                final_answer = _answer_or_fallback(last_message)
+                break
         
+        report_tool_trace(trace)
         return final_answer
         
     except Exception as e:
@@ -251,6 +391,266 @@ def run_smart_agent(agent, question: str, conversation_history: list = None) ->
         return f"I encountered an error while processing your question. Please try rephrasing or try again. Error: {str(e)}"
 
 
+async def arun_smart_agent(agent, question: str, conversation_history: list = None) -> str:
+    """
+    Async version of run_smart_agent using agent.astream.
+    Doesn't tie up a threadpool thread for the whole LLM round trip.
+    """
+    from app.tools import start_tool_trace, report_tool_trace
+    
+    messages = _build_messages(question, conversation_history)
+    
+    try:
+        final_answer = ""
+        trace = start_tool_trace()
+        
+        last_message = None
+        
+        async def consume():
+            nonlocal final_answer, last_message
+            async for step in agent.astream(
+                {"messages": messages},
+                stream_mode="values"
+            ):
+                last_message = step["messages"][-1]
+                
+                if hasattr(last_message, 'content'):
+                    final_answer = last_message.content
+                else:
+                    final_answer = str(last_message)
+        
+        # Cancels whatever is in flight (LLM call, tools) at the deadline
+        try:
+            await asyncio.wait_for(consume(), remaining())
+        except asyncio.TimeoutError:
+            print("⏱️ Request deadline reached - agent cancelled")
+            final_answer = _answer_or_fallback(last_message)
+        
+        report_tool_trace(trace)
+        return final_answer
+        
+    except Exception as e:
+        print(f"❌ Agent error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return f"I encountered an error while processing your question. Please try rephrasing or try again. Error: {str(e)}"
+
+
+def _answer_or_fallback(last_message) -> str:
+    """The agent's answer if its last message was one, else the out-of-time reply"""
+    from langchain_core.messages import AIMessage
+    
+    if isinstance(last_message, AIMessage) and not last_message.tool_calls and last_message.content:
+        return last_message.content
+    return OUT_OF_TIME_ANSWER
+
+
+# Human readable labels for tool progress events
+TOOL_LABELS = {
+    "search_all_my_documents": "Searching your documents",
+    "search_contract": "Searching the contract",
+    "tavily_search": "Searching the web",
+    "get_document_summary": "Reading document summaries",
+}
+
+
+def _update_messages(update) -> list:
+    """
+    Messages in one node's entry of an "updates" chunk. That's usually
+    {"messages": [...]}, but parallel tool calls produce a list of updates
+    and tools can return Commands; interrupts and other values have none.
+    """
+    from langchain_core.messages import BaseMessage
+    from langgraph.types import Command
+    
+    if isinstance(update, dict):
+        messages = update.get("messages", [])
+        return list(messages) if isinstance(messages, (list, tuple)) else [messages]
+    if isinstance(update, Command):
+        return _update_messages(update.update)
+    if isinstance(update, BaseMessage):
+        return [update]
+    if isinstance(update, (list, tuple)):
+        return [message for item in update for message in _update_messages(item)]
+    return []
+
+
+def stream_smart_agent(agent, question: str, conversation_history: list = None):
+    """
+    Execute smart agent and yield events as they happen.
+    
+    Events (dicts with an "event" key):
+        token       - {"text": "..."} LLM output tokens
+        tool_start  - {"tool": name, "label": "..."} agent decided to call a tool
+        tool_end    - {"tool": name} tool returned (exactly one per tool_start;
+                      "interrupted": true if the agent stopped before it did)
+        progress    - {"stage": "..."} progress reported from inside a tool (e.g. reranking)
+        done        - {"answer": "..."} final answer text (always the last event)
+    """
+    from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+    
+    messages = _build_messages(question, conversation_history)
+    final_answer = ""
+    deadline = current_deadline()
+    # tool_call_id -> tool name, for calls announced but not finished yet
+    running_tools = {}
+    
+    def tool_end(message):
+        # A ToolMessage can show up in both the messages and the updates stream
+        if message.tool_call_id in running_tools:
+            return {"event": "tool_end", "tool": running_tools.pop(message.tool_call_id)}
+        return None
+    
+    try:
+        for mode, chunk in agent.stream(
+            {"messages": messages},
+            stream_mode=["messages", "updates", "custom"]
+        ):
+            if mode == "messages":
+                # (message_chunk, metadata) - forward model tokens and finished tools
+                message, _metadata = chunk
+                if isinstance(message, AIMessageChunk) and message.content:
+                    token = extract_answer_text(message.content)
+                    if token:
+                        yield {"event": "token", "text": token}
+                elif isinstance(message, ToolMessage):
+                    event = tool_end(message)
+                    if event:
+                        yield event
+            
+            elif mode == "updates":
+                # {node_name: update} after each graph step
+                for update in chunk.values():
+                    for message in _update_messages(update):
+                        if isinstance(message, AIMessage) and message.tool_calls:
+                            for call in message.tool_calls:
+                                if call["id"] in running_tools:
+                                    continue
+                                running_tools[call["id"]] = call["name"]
+                                yield {
+                                    "event": "tool_start",
+                                    "tool": call["name"],
+                                    "label": TOOL_LABELS.get(call["name"], f"Running {call['name']}")
+                                }
+                        elif isinstance(message, ToolMessage):
+                            event = tool_end(message)
+                            if event:
+                                yield event
+                        elif isinstance(message, AIMessage):
+                            final_answer = extract_answer_text(message.content)
+            
+            elif mode == "custom":
+                # Progress written by tools through the stream writer
+                if isinstance(chunk, dict):
+                    yield chunk
+            
+            # Stop between graph steps once the request deadline has passed
+            if mode == "updates" and deadline is not None and deadline.expired():
+                print("⏱️ Request deadline reached - stopping the agent")
+                final_answer = final_answer or OUT_OF_TIME_ANSWER
+                break
+    
+    except Exception as e:
+        print(f"❌ Agent error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        final_answer = f"I encountered an error while processing your question. Please try rephrasing or try again. Error: {str(e)}"
+    
+    # Deadline, error or interrupt before these tools returned
+    for name in running_tools.values():
+        yield {"event": "tool_end", "tool": name, "interrupted": True}
+    
+    yield {"event": "done", "answer": final_answer}
+
+
+# ------------------------------------------------------------
+# Direct retrieval path (intent router "document" route)
+# ------------------------------------------------------------
+# Obvious questions about the user's own documents skip the agent loop:
+# one retrieval, then one LLM call with a short prompt.
+
+DOCUMENT_ANSWER_PROMPT = """You are a legal and business document analysis assistant.
+Answer the user's question using only the document excerpts below.
+- Name the source document and quote the relevant wording where it helps.
+- Explain legal terms in plain language.
+- If the excerpts don't contain the answer, say so clearly. Do not invent clauses.
+
+Document excerpts:
+{context}"""
+
+
+# Summary questions are answered from the precomputed summary tree
+SUMMARY_LOOKUP = {"document_name": "", "include_sections": True}
+
+
+def retrieve_document_context(user_id: int, question: str):
+    """
+    Run the multi-document search once for the question (or load the
+    precomputed summaries for summary questions).
+    Returns the formatted excerpts, or None when nothing relevant was found.
+    """
+    from app.tools import create_multi_document_search_tool, create_document_summary_tool
+    from app.intent_router import is_summary_question
+    
+    if is_summary_question(question):
+        context = create_document_summary_tool(user_id).invoke(SUMMARY_LOOKUP)
+        if not context.startswith("❌"):
+            return context
+    
+    context = create_multi_document_search_tool(user_id).invoke({"query": question})
+    return None if context.startswith("❌") else context
+
+
+async def aretrieve_document_context(user_id: int, question: str):
+    """Async version of retrieve_document_context"""
+    from app.tools import create_async_multi_document_search_tool, create_async_document_summary_tool
+    from app.intent_router import is_summary_question
+    
+    if is_summary_question(question):
+        context = await create_async_document_summary_tool(user_id).ainvoke(SUMMARY_LOOKUP)
+        if not context.startswith("❌"):
+            return context
+    
+    context = await create_async_multi_document_search_tool(user_id).ainvoke({"query": question})
+    return None if context.startswith("❌") else context
+
+
+def _document_answer_messages(context: str, question: str, conversation_history: list = None) -> list:
+    return (
+        [{"role": "system", "content": DOCUMENT_ANSWER_PROMPT.format(context=context)}]
+        + _build_messages(question, conversation_history)
+    )
+
+
+def run_document_answer(context: str, question: str, conversation_history: list = None) -> str:
+    """Answer from retrieved excerpts with a single LLM call"""
+    response = get_llm().invoke(_document_answer_messages(context, question, conversation_history))
+    return extract_answer_text(response.content)
+
+
+async def arun_document_answer(context: str, question: str, conversation_history: list = None) -> str:
+    """Async version of run_document_answer"""
+    response = await get_llm().ainvoke(_document_answer_messages(context, question, conversation_history))
+    return extract_answer_text(response.content)
+
+
+def stream_document_answer(context: str, question: str, conversation_history: list = None):
+    """Streaming version of run_document_answer - same events as stream_smart_agent"""
+    answer_parts = []
+    try:
+        for chunk in get_llm().stream(_document_answer_messages(context, question, conversation_history)):
+            token = extract_answer_text(chunk.content)
+            if token:
+                answer_parts.append(token)
+                yield {"event": "token", "text": token}
+        final_answer = "".join(answer_parts)
+    except Exception as e:
+        print(f"❌ Document answer error: {str(e)}")
+        final_answer = f"I encountered an error while processing your question. Please try rephrasing or try again. Error: {str(e)}"
+    
+    yield {"event": "done", "answer": final_answer}
+
+
 # Keep legacy function for backwards compatibility
 def run_agent(agent, question: str, conversation_history: list = None) -> str:
     """Legacy wrapper - calls run_smart_agent"""
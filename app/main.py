@@ -1,8 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
+from app.api.async_routes import router as async_router
 from app.api.auth_routes import router as auth_router
-from app.database import init_db
+from app.database import init_db, dispose_async_engine, SchemaNotReady
+from app.read_replica import dispose_replica_engines, ReadYourWritesMiddleware, LSN_HEADER
+from app.password_hashing import shutdown_hash_pool
+from app.warmup import warm_up, warmup_status
+from app.worker_role import current_role, serves_path
+from app.config import settings
+from app.intent_router import route_stats
+from app.admission import admission_stats
+from app.metrics import MetricsMiddleware
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
@@ -13,12 +25,25 @@ async def lifespan(app: FastAPI):
     try:
         init_db()
         print("✅ Database tables ready!")
+    except SchemaNotReady as e:
+        # Serving would silently hide data - refuse to start
+        print(f"❌ {e}")
+        raise
     except Exception as e:
         print(f"⚠️ Database init error: {e}")
     
+    # Models, clients and DB connections load in the background;
+    # /health reports not ready until they have
+    warmup_task = asyncio.create_task(warm_up()) if settings.WARMUP_ENABLED else None
+    
     yield
     # Shutdown logic (if needed)
     print("👋 Shutting down...")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await dispose_async_engine()
+    await dispose_replica_engines()
+    shutdown_hash_pool()
 
 # Attach the lifespan to the app
 app = FastAPI(
@@ -35,16 +60,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LSN_HEADER],
 )
 
+# Per-request stage timing (Server-Timing header) + Prometheus HTTP metrics
+app.add_middleware(MetricsMiddleware)
+
+# Read-your-writes position to/from the client, so it holds across workers
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Routes
+if settings.ASYNC_MODE:
+    # Async /query and /my-contracts replace their sync versions
+    async_paths = {route.path for route in async_router.routes}
+    router.routes = [route for route in router.routes if route.path not in async_paths]
+# Only the routes of this worker's role (WORKER_ROLE)
+router.routes = [route for route in router.routes if serves_path(route.path)]
+async_router.routes = [route for route in async_router.routes if serves_path(route.path)]
+if settings.ASYNC_MODE:
+    app.include_router(async_router)
 app.include_router(router)
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 
 @app.get("/health", tags=["System"])
 def health_check():
-    return {
-        "status": "healthy",
+    """Readiness: 503 while startup warmup (WARMUP_ENABLED) is still running"""
+    warmup = warmup_status()
+    body = {
+        "status": "healthy" if warmup["ready"] else "warming_up",
         "service": "Legal Document Analysis API",
-        "version": "1.0.0"
-    }
\ No newline at end of file
+        "version": "1.0.0",
+        "role": current_role(),
+        "warmup": warmup
+    }
+    if not warmup["ready"]:
+        return JSONResponse(body, status_code=503)
+    return body
+
+
+@app.get("/routing-stats", tags=["System"])
+def routing_stats():
+    """Share of /query traffic and latency per intent-router path (this worker)"""
+    return route_stats.snapshot()
+
+
+@app.get("/admission-stats", tags=["System"])
+def admission_state():
+    """Running and queued /query and /upload requests (this worker)"""
+    return admission_stats()
+
+
+@app.get("/metrics", tags=["System"], include_in_schema=False)
+def metrics():
+    """Prometheus metrics: stage latency histograms, counters and in-flight gauges"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,204 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from app.database import Conversation, Message, release_connection, arelease_connection
+from app.config import settings
+
+
+# ==============================
+# Server-side Conversation Memory
+# ==============================
+#
+# History sent to the agent = rolling summary (stored on Conversation)
+# + the most recent messages verbatim, kept within HISTORY_TOKEN_BUDGET.
+# Messages that fall out of the window are folded into the summary once,
+# so prompt size stays bounded however long the conversation runs.
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a legal document assistant.
+
+Keep: documents and clauses discussed, facts found in the documents, questions asked, conclusions and open follow-ups.
+Drop: greetings, filler and repeated content. Write at most 200 words of plain prose.
+
+Current summary:
+{summary}
+
+New messages to fold in:
+{messages}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) - good enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+def fit_history_to_budget(history: List[Dict], budget: int) -> List[Dict]:
+    """
+    Keep the most recent messages that fit in the token budget.
+    Used for client-sent history, which has nowhere to store a summary.
+    """
+    _older, recent = _split_recent(history, budget)
+    return recent
+
+
+def _split_recent(messages: List, budget: int) -> Tuple[List, List]:
+    """
+    Split chronologically ordered messages into (older, recent) where
+    recent is the longest suffix that fits in the budget.
+    """
+    used = 0
+    cut = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        used += estimate_tokens(_content(messages[i]))
+        if used > budget:
+            break
+        cut = i
+    return messages[:cut], messages[cut:]
+
+
+def _content(message) -> str:
+    return message["content"] if isinstance(message, dict) else message.content
+
+
+def _role(message) -> str:
+    return message["role"] if isinstance(message, dict) else message.role
+
+
+def _summary_message(summary: str) -> Dict:
+    return {
+        "role": "user",
+        "content": f"(Context: summary of our earlier conversation)\n{summary}"
+    }
+
+
+def _unsummarized_messages_query(conversation: Conversation):
+    """
+    Newest unsummarized messages first - served by idx_conversation_messages
+    (conversation_id, created_at).
+    """
+    query = select(Message).where(Message.conversation_id == conversation.id)
+    if conversation.summary_message_id:
+        query = query.where(Message.id > conversation.summary_message_id)
+    return query.order_by(Message.created_at.desc()).limit(settings.HISTORY_LOAD_LIMIT)
+
+
+def _backlog_query(conversation: Conversation, before_id: int):
+    """
+    Oldest unsummarized messages before before_id, in id order - the order
+    summary_message_id advances in, so a fold never skips past a message.
+    """
+    query = select(Message).where(Message.conversation_id == conversation.id, Message.id < before_id)
+    if conversation.summary_message_id:
+        query = query.where(Message.id > conversation.summary_message_id)
+    return query.order_by(Message.id).limit(settings.HISTORY_LOAD_LIMIT)
+
+
+def _plan_history(conversation: Conversation, messages: List[Message]) -> Tuple[List[Message], List[Message]]:
+    """Decide which messages stay verbatim and which get folded into the summary"""
+    summary_tokens = estimate_tokens(conversation.summary) if conversation.summary else 0
+    budget = max(settings.HISTORY_TOKEN_BUDGET - summary_tokens, 0)
+    return _split_recent(messages, budget)
+
+
+def _backlog_before(messages: List[Message], recent: List[Message]) -> Optional[int]:
+    """
+    When HISTORY_LOAD_LIMIT cut the load short, older unsummarized messages
+    were never loaded, so `older` is not everything since summary_message_id.
+    Returns the id the backlog fold must stop before, or None if nothing was cut.
+    """
+    if len(messages) < settings.HISTORY_LOAD_LIMIT:
+        return None
+    return recent[0].id if recent else messages[-1].id + 1
+
+
+def _format_for_summary(messages: List[Message]) -> str:
+    return "\n".join(f"{_role(m)}: {_content(m)}" for m in messages)
+
+
+def _build_history(summary: Optional[str], recent: List[Dict]) -> List[Dict]:
+    return ([_summary_message(summary)] if summary else []) + recent
+
+
+def summarize_messages(previous_summary: Optional[str], messages: List[Message]) -> str:
+    """Fold messages into the rolling summary with one short LLM call"""
+    from app.llm import get_llm, extract_answer_text
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=previous_summary or "(none yet)",
+        messages=_format_for_summary(messages)
+    )
+    return extract_answer_text(get_llm().invoke(prompt).content).strip()
+
+
+async def asummarize_messages(previous_summary: Optional[str], messages: List[Message]) -> str:
+    """Async version of summarize_messages"""
+    from app.llm import get_llm, extract_answer_text
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=previous_summary or "(none yet)",
+        messages=_format_for_summary(messages)
+    )
+    response = await get_llm().ainvoke(prompt)
+    return extract_answer_text(response.content).strip()
+
+
+def load_conversation_history(db: Session, conversation: Conversation) -> List[Dict]:
+    """
+    Load the agent history for a conversation from the messages table.
+
+    Returns:
+        [summary message (if any)] + recent messages, oldest first, within
+        HISTORY_TOKEN_BUDGET. Older messages are folded into the stored summary.
+    """
+    messages = list(reversed(db.execute(_unsummarized_messages_query(conversation)).scalars().all()))
+    older, recent = _plan_history(conversation, messages)
+    before_id = _backlog_before(messages, recent)
+    if before_id is not None:
+        # Fold from the summary pointer forward; a long backlog takes a few requests
+        older = db.execute(_backlog_query(conversation, before_id)).scalars().all()
+
+    # Copy out before commit/rollback expires the ORM objects
+    summary = conversation.summary
+    recent = [{"role": m.role, "content": m.content} for m in recent]
+
+    if older:
+        print(f"🗜️ Folding {len(older)} older message(s) into conversation summary...")
+        release_connection(db)  # not held through the LLM call
+        try:
+            summary = summarize_messages(summary, older)
+            conversation.summary = summary
+            conversation.summary_message_id = older[-1].id
+            db.commit()
+        except Exception as e:
+            # Without a summary the older turns are simply left out this time
+            db.rollback()
+            print(f"⚠️ Could not update conversation summary: {str(e)}")
+
+    return _build_history(summary, recent)
+
+
+async def aload_conversation_history(db, conversation: Conversation) -> List[Dict]:
+    """Async version of load_conversation_history (AsyncSession)"""
+    messages = list(reversed((await db.execute(_unsummarized_messages_query(conversation))).scalars().all()))
+    older, recent = _plan_history(conversation, messages)
+    before_id = _backlog_before(messages, recent)
+    if before_id is not None:
+        older = (await db.execute(_backlog_query(conversation, before_id))).scalars().all()
+
+    summary = conversation.summary
+    recent = [{"role": m.role, "content": m.content} for m in recent]
+
+    if older:
+        print(f"🗜️ Folding {len(older)} older message(s) into conversation summary...")
+        await arelease_connection(db)
+        try:
+            summary = await asummarize_messages(summary, older)
+            conversation.summary = summary
+            conversation.summary_message_id = older[-1].id
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            print(f"⚠️ Could not update conversation summary: {str(e)}")
+
+    return _build_history(summary, recent)
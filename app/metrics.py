@@ -0,0 +1,481 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from uuid import UUID
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+
+# ==============================
+# Metrics + Per-request Tracing
+# ==============================
+#
+# Every pipeline stage (pdf_extract, chunking, embed_batch, embed_query,
+# vector_sql, keyword_sql, rrf, rerank, tool_*, llm) is timed with span().
+# Each span feeds a Prometheus histogram and the current request's timing
+# breakdown, which MetricsMiddleware returns as a Server-Timing header and
+# prints in the request log line. Prometheus scrapes everything at /metrics.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "jurisai_stage_duration_seconds",
+    "Latency of pipeline stages",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "jurisai_stage_errors_total",
+    "Pipeline stages that raised",
+    ["stage"]
+)
+STAGE_IN_FLIGHT = Gauge(
+    "jurisai_stage_in_flight",
+    "Pipeline stages currently running",
+    ["stage"]
+)
+
+HTTP_SECONDS = Histogram(
+    "jurisai_http_request_duration_seconds",
+    "HTTP request latency (until the last body byte)",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "jurisai_http_requests_in_flight",
+    "HTTP requests currently being handled"
+)
+
+LLM_TOKENS = Counter(
+    "jurisai_llm_tokens_total",
+    "LLM tokens used",
+    ["type"]
+)
+CONTEXT_TOKENS = Counter(
+    "jurisai_context_tokens_total",
+    "Tool output tokens before (raw) and after (packed) context packing",
+    ["tool", "kind"]
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "jurisai_db_pool_checkout_seconds",
+    "Time to get a database connection from the pool (wait + connect + pre-ping)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_TIMEOUTS = Counter(
+    "jurisai_db_pool_timeouts_total",
+    "Checkouts that gave up waiting for a free connection (DB_POOL_TIMEOUT_SECONDS)",
+    ["pool"]
+)
+DB_READ_ROUTES = Counter(
+    "jurisai_db_read_routes_total",
+    "Read sessions per database (replica / primary) and why",
+    ["target", "reason"]
+)
+DB_REPLICA_FAILOVERS = Counter(
+    "jurisai_db_replica_failovers_total",
+    "Reads retried on the primary after a replica error"
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "jurisai_password_hash_duration_seconds",
+    "bcrypt hash / verify latency including the wait for a hashing worker",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "jurisai_password_hash_queue_depth",
+    "Password hashes queued or running on the hashing pool"
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "jurisai_password_hash_rejected_total",
+    "Password hashes refused because PASSWORD_HASH_MAX_PENDING were already queued",
+    ["operation"]
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "jurisai_admission_queue_seconds",
+    "Time admitted requests waited for a slot (see app/admission.py)",
+    ["kind"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+ADMISSION_REJECTED = Counter(
+    "jurisai_admission_rejected_total",
+    "Requests shed with 429 (queue_full, user_queue_full, timeout)",
+    ["kind", "reason"]
+)
+ADMISSION_RUNNING = Gauge(
+    "jurisai_admission_running",
+    "Admitted requests in progress",
+    ["kind"]
+)
+ADMISSION_QUEUED = Gauge(
+    "jurisai_admission_queued",
+    "Requests waiting for a slot",
+    ["kind"]
+)
+WARMUP_SECONDS = Gauge(
+    "jurisai_warmup_seconds",
+    "Startup warmup time per component (last warmup of this worker)",
+    ["component"]
+)
+INTENT_ROUTES = Counter(
+    "jurisai_intent_route_total",
+    "Queries per intent-router path",
+    ["route"]
+)
+INTENT_ROUTE_SECONDS = Histogram(
+    "jurisai_intent_route_duration_seconds",
+    "End-to-end /query latency per intent-router path",
+    ["route"],
+    buckets=LATENCY_BUCKETS
+)
+
+
+# ---------------------------
+# Per-request timing breakdown
+# ---------------------------
+
+class RequestTimings:
+    """Total seconds and call count per stage for one request, plus counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, list] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float):
+        # Tools run in worker threads, so updates can overlap
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def add_count(self, name: str, value: int):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def server_timing(self) -> str:
+        with self._lock:
+            return ", ".join(
+                f"{stage};dur={seconds * 1000:.1f}" for stage, (seconds, _count) in self.stages.items()
+            )
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [
+                f"{stage}={seconds * 1000:.0f}ms" + (f"(x{count})" if count > 1 else "")
+                for stage, (seconds, count) in self.stages.items()
+            ]
+            parts += [f"{name}={value}" for name, value in self.counts.items()]
+            return " ".join(parts)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float, error: bool = False):
+    """Record a finished stage in Prometheus and in the current request's breakdown"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if error:
+        STAGE_ERRORS.labels(stage).inc()
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def record_context_packing(tool: str, raw_tokens: int, packed_tokens: int):
+    """Record tool output tokens before/after packing (and the saving for this request)"""
+    CONTEXT_TOKENS.labels(tool, "raw").inc(raw_tokens)
+    CONTEXT_TOKENS.labels(tool, "packed").inc(packed_tokens)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add_count("context_tokens_saved", max(raw_tokens - packed_tokens, 0))
+
+
+def record_pool_checkout(pool: str, seconds: float, timed_out: bool = False):
+    """Record a connection checkout (and add it to the current request's db_checkout time)"""
+    DB_POOL_CHECKOUT_SECONDS.labels(pool).observe(seconds)
+    if timed_out:
+        DB_POOL_TIMEOUTS.labels(pool).inc()
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add("db_checkout", seconds)
+
+
+def record_password_hash(operation: str, seconds: Optional[float] = None, rejected: bool = False):
+    if rejected:
+        PASSWORD_HASH_REJECTED.labels(operation).inc()
+    if seconds is not None:
+        PASSWORD_HASH_SECONDS.labels(operation).observe(seconds)
+
+
+def set_password_hash_queue_depth(depth: int):
+    PASSWORD_HASH_QUEUE_DEPTH.set(depth)
+
+
+def record_admission(kind: str, waited: Optional[float] = None, rejected: Optional[str] = None):
+    """Record an admission decision (and add the wait to the current request's breakdown)"""
+    if rejected is not None:
+        ADMISSION_REJECTED.labels(kind, rejected).inc()
+    if waited is not None:
+        ADMISSION_QUEUE_SECONDS.labels(kind).observe(waited)
+        timings = _request_timings.get()
+        if timings is not None and waited > 0:
+            timings.add("admission_wait", waited)
+
+
+def set_admission_state(kind: str, running: int, queued: int):
+    ADMISSION_RUNNING.labels(kind).set(running)
+    ADMISSION_QUEUED.labels(kind).set(queued)
+
+
+def record_warmup(component: str, seconds: float):
+    WARMUP_SECONDS.labels(component).set(seconds)
+
+
+def record_read_route(target: str, reason: str):
+    DB_READ_ROUTES.labels(target, reason).inc()
+
+
+def record_replica_failover():
+    DB_REPLICA_FAILOVERS.inc()
+
+
+@contextmanager
+def collect_timings():
+    """Stage breakdown of the work inside the block, outside an HTTP request (scripts, benchmarks)"""
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block of work as a pipeline stage"""
+    STAGE_IN_FLIGHT.labels(stage).inc()
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        STAGE_IN_FLIGHT.labels(stage).dec()
+        record_stage(stage, time.perf_counter() - start, error)
+
+
+# ---------------------------
+# LLM calls (LangChain callback)
+# ---------------------------
+
+class _LLMMetricsHandler:
+    """Times every chat model call and counts tokens, as the "llm" stage"""
+
+    def __init__(self):
+        self._starts: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        STAGE_IN_FLIGHT.labels("llm").inc()
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error=False)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                if usage.get("input_tokens"):
+                    LLM_TOKENS.labels("input").inc(usage["input_tokens"])
+                if usage.get("output_tokens"):
+                    LLM_TOKENS.labels("output").inc(usage["output_tokens"])
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error=True)
+
+    def _finish(self, run_id: UUID, error: bool):
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        STAGE_IN_FLIGHT.labels("llm").dec()
+        record_stage("llm", time.perf_counter() - start, error)
+
+
+_llm_metrics_callback_class = None
+
+
+def llm_metrics_callback():
+    """
+    New LangChain callback handler for the LLM. langchain_core is imported
+    on first call, so processes that never use the LLM don't load it.
+    """
+    global _llm_metrics_callback_class
+    if _llm_metrics_callback_class is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMMetricsCallback(_LLMMetricsHandler, BaseCallbackHandler):
+            pass
+
+        _llm_metrics_callback_class = LLMMetricsCallback
+    return _llm_metrics_callback_class()
+
+
+# ---------------------------
+# Web search cache stats
+# ---------------------------
+
+class WebCacheCollector:
+    """Exposes WebSearchCache counters (read at scrape time)"""
+
+    def collect(self):
+        from app import web_cache
+
+        cache = web_cache._web_search_cache
+        if cache is None:
+            return
+        stats = cache.snapshot()
+        lookups = CounterMetricFamily(
+            "jurisai_web_cache_lookups",
+            "Web search cache lookups by outcome",
+            labels=["outcome"]
+        )
+        for outcome in ("memory_hits", "disk_hits", "stale_hits", "misses"):
+            lookups.add_metric([outcome], stats[outcome])
+        yield lookups
+        yield GaugeMetricFamily("jurisai_web_cache_hit_ratio", "Web search cache hit rate", value=stats["hit_rate"])
+        yield GaugeMetricFamily("jurisai_web_cache_entries", "Entries in the in-memory tier", value=stats["memory_entries"])
+        yield CounterMetricFamily(
+            "jurisai_web_cache_disk_errors", "SQLite tier reads/writes that failed (served from memory)",
+            value=stats["disk_errors"]
+        )
+
+
+REGISTRY.register(WebCacheCollector())
+
+
+class AuthCacheCollector:
+    """Exposes the token and user cache counters of app/auth_cache.py (read at scrape time)"""
+
+    def collect(self):
+        auth_cache = sys.modules.get("app.auth_cache")
+        if auth_cache is None:
+            return
+        lookups = CounterMetricFamily(
+            "jurisai_auth_cache_lookups",
+            "Authentication cache lookups by cache and outcome (user misses = auth DB queries)",
+            labels=["cache", "outcome"]
+        )
+        hit_ratio = GaugeMetricFamily("jurisai_auth_cache_hit_ratio", "Authentication cache hit rate", labels=["cache"])
+        entries = GaugeMetricFamily("jurisai_auth_cache_entries", "Entries in the authentication cache", labels=["cache"])
+        invalidations = CounterMetricFamily(
+            "jurisai_auth_cache_invalidations",
+            "Entries dropped because their user was deleted",
+            labels=["cache"]
+        )
+        for name, cache in (("tokens", auth_cache.token_cache), ("users", auth_cache.user_cache)):
+            stats = cache.snapshot()
+            lookups.add_metric([name, "hits"], stats["hits"])
+            lookups.add_metric([name, "misses"], stats["misses"])
+            hit_ratio.add_metric([name], stats["hit_rate"])
+            entries.add_metric([name], stats["entries"])
+            invalidations.add_metric([name], stats["invalidations"])
+        yield from (lookups, hit_ratio, entries, invalidations)
+
+
+REGISTRY.register(AuthCacheCollector())
+
+
+# ---------------------------
+# Database connection pools
+# ---------------------------
+
+class DbPoolCollector:
+    """Exposes pool occupancy of the sync, async and replica engines (read at scrape time)"""
+
+    def collect(self):
+        from sqlalchemy.pool import QueuePool
+        from app import database
+
+        engine = getattr(database, "engine", None)
+        if engine is None:
+            # Registered while app.database is still importing
+            return
+        pools = {"sync": engine.pool}
+        if database._async_engine is not None:
+            pools["async"] = database._async_engine.sync_engine.pool
+        read_replica = sys.modules.get("app.read_replica")
+        if read_replica is not None:
+            if read_replica._replica_engine is not None:
+                pools["replica"] = read_replica._replica_engine.pool
+            if read_replica._async_replica_engine is not None:
+                pools["async_replica"] = read_replica._async_replica_engine.sync_engine.pool
+
+        families = {
+            "size": GaugeMetricFamily("jurisai_db_pool_size", "Configured pool size", labels=["pool"]),
+            "checked_out": GaugeMetricFamily("jurisai_db_pool_checked_out", "Connections in use", labels=["pool"]),
+            "checked_in": GaugeMetricFamily("jurisai_db_pool_checked_in", "Idle connections in the pool", labels=["pool"]),
+            "overflow": GaugeMetricFamily("jurisai_db_pool_overflow", "Connections open beyond the pool size", labels=["pool"]),
+        }
+        for name, pool in pools.items():
+            # NullPool (DB_PGBOUNCER) keeps nothing to report
+            if not isinstance(pool, QueuePool):
+                continue
+            families["size"].add_metric([name], pool.size())
+            families["checked_out"].add_metric([name], pool.checkedout())
+            families["checked_in"].add_metric([name], pool.checkedin())
+            families["overflow"].add_metric([name], max(pool.overflow(), 0))
+        yield from families.values()
+
+
+REGISTRY.register(DbPoolCollector())
+
+
+# ---------------------------
+# ASGI middleware
+# ---------------------------
+
+class MetricsMiddleware:
+    """
+    Times each HTTP request, tracks in-flight requests, adds a Server-Timing
+    header with the stage breakdown and prints one log line per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = {"code": 500}
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total = f"total;dur={(time.perf_counter() - start) * 1000:.1f}"
+                header = ", ".join(filter(None, [timings.server_timing(), total]))
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_SECONDS.labels(scope["method"], path, str(status["code"])).observe(elapsed)
+            breakdown = timings.summary()
+            print(f"⏱️ {scope['method']} {path} {status['code']} {elapsed * 1000:.0f}ms" + (f" | {breakdown}" if breakdown else ""))
+            _request_timings.reset(token)
@@ -0,0 +1,157 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_
+
+from app.database import Contract, Conversation, Message
+
+
+# ==============================
+# Keyset (cursor) Pagination
+# ==============================
+#
+# OFFSET pagination reads and throws away every row before the page, so it
+# gets slower the further a user scrolls. Keyset pagination remembers the
+# sort key of the last row returned (the cursor) and asks for rows after it:
+#
+#   WHERE (upload_date, id) < (:last_upload_date, :last_id)
+#   ORDER BY upload_date DESC, id DESC
+#   LIMIT :limit + 1
+#
+# With a composite index on (owner, sort column, id) every page is one index
+# range scan, however many rows the user has. The extra row tells us whether
+# there's a next page. The id tie-breaker keeps rows with equal timestamps
+# from being skipped or repeated.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Cursor that wasn't produced by encode_cursor (or by this endpoint)"""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque URL-safe cursor for a row's sort key (datetimes kept as ISO strings)"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: int) -> List[Any]:
+    """
+    Sort key from a cursor. Strings that look like ISO datetimes become
+    datetimes again.
+
+    Raises:
+        InvalidCursor: malformed cursor or wrong number of values
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != columns:
+        raise InvalidCursor("Invalid cursor")
+    return [_parse_value(v) for v in values]
+
+
+def _parse_value(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def keyset_page(stmt, sort_columns: Sequence, cursor: Optional[str], limit: int, descending: bool = True):
+    """
+    Add keyset pagination to a select().
+
+    Args:
+        stmt: select() already filtered to the owner's rows
+        sort_columns: sort key columns, last one unique (e.g. upload_date, id)
+        cursor: next_cursor from the previous page (None = first page)
+        limit: page size (one extra row is fetched to detect a next page)
+        descending: newest first
+
+    Raises:
+        InvalidCursor: from decode_cursor
+    """
+    if cursor:
+        after = decode_cursor(cursor, len(sort_columns))
+        key = tuple_(*sort_columns)
+        stmt = stmt.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    order = [c.desc() if descending else c.asc() for c in sort_columns]
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+def page_result(rows: Sequence, sort_attributes: Sequence[str], limit: int) -> Tuple[List, Optional[str]]:
+    """
+    Split the fetched rows into the page and the cursor for the next one.
+
+    Returns:
+        (rows of this page, next_cursor or None on the last page)
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, attribute) for attribute in sort_attributes])
+
+
+# ---------------------------
+# Listing helpers (shared by the sync and async routes)
+# ---------------------------
+
+CONTRACT_SORT = ["upload_date", "id"]
+CONVERSATION_SORT = ["updated_at", "id"]
+MESSAGE_SORT = ["created_at", "id"]
+
+
+def keyset_page_or_400(stmt, sort_columns: Sequence, cursor: Optional[str], limit: int):
+    """keyset_page, with a bad cursor reported as 400"""
+    try:
+        return keyset_page(stmt, sort_columns, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def contract_count(user_id: int):
+    """
+    select() of the user's contract count. O(n) in the user's contracts
+    (index-only scan on (user_id, upload_date, id)), so listings only run it
+    for the first page.
+    """
+    return select(func.count()).select_from(Contract).where(Contract.user_id == user_id)
+
+
+def contract_json(c: Contract) -> dict:
+    return {
+        "id": c.id,
+        "filename": c.filename,
+        "upload_date": c.upload_date.isoformat(),
+        "num_chunks": c.num_chunks
+    }
+
+
+def conversation_json(c: Conversation) -> dict:
+    return {
+        "id": c.id,
+        "contract_id": c.contract_id,
+        "created_at": c.created_at.isoformat(),
+        "updated_at": c.updated_at.isoformat()
+    }
+
+
+def message_json(m: Message) -> dict:
+    return {
+        "id": m.id,
+        "role": m.role,
+        "content": m.content,
+        "created_at": m.created_at.isoformat()
+    }
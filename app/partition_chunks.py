@@ -0,0 +1,233 @@
+import argparse
+import time
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.config import settings
+from app.database import engine, ContractChunk, create_chunk_partitions, chunks_missing_user_id
+
+
+# ==============================
+# contract_chunks -> hash-partitioned by user_id
+# ==============================
+#
+# Tables created before partitioning are one heap without user_id, and a
+# table can't be partitioned in place. This copies the chunks into a new
+# partitioned table while the old one keeps serving, then swaps the names:
+#
+#   1. create contract_chunks_new (+ partitions), PARTITION BY HASH (user_id)
+#   2. copy rows in id order, user_id taken from contracts, one batch per
+#      transaction (re-running the script resumes from the last copied id)
+#   3. build the indexes on the copy (faster than maintaining them per row)
+#   4. in one transaction: block writes, copy rows added since, rename
+#      contract_chunks -> contract_chunks_old and the copy -> contract_chunks
+#
+# Deleting a contract during the copy reaches both tables (both have the
+# cascading foreign key). Writes only block for step 4. Also re-partitions an
+# already partitioned table (--partitions).
+
+NEW_TABLE = "contract_chunks_new"
+OLD_TABLE = "contract_chunks_old"
+
+CREATE_NEW_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {NEW_TABLE} (
+        id INTEGER NOT NULL DEFAULT nextval('contract_chunks_id_seq'),
+        user_id INTEGER NOT NULL,
+        contract_id INTEGER NOT NULL,
+        chunk_text TEXT NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        embedding vector(1024) NOT NULL,
+        clause_types VARCHAR[],
+        CONSTRAINT {NEW_TABLE}_pkey PRIMARY KEY (id, user_id),
+        CONSTRAINT contract_chunks_user_id_fkey
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        CONSTRAINT contract_chunks_contract_id_fkey
+            FOREIGN KEY (contract_id) REFERENCES contracts(id) ON DELETE CASCADE
+    ) PARTITION BY HASH (user_id)
+"""
+
+COPY_BATCH = f"""
+    INSERT INTO {NEW_TABLE} (id, user_id, contract_id, chunk_text, chunk_index, embedding, clause_types)
+    SELECT ch.id, c.user_id, ch.contract_id, ch.chunk_text, ch.chunk_index, ch.embedding, ch.clause_types
+    FROM contract_chunks ch
+    JOIN contracts c ON c.id = ch.contract_id
+    WHERE ch.id > :after AND ch.id <= :upto
+"""
+
+NEXT_BATCH_END = """
+    SELECT max(id) FROM (
+        SELECT id FROM contract_chunks WHERE id > :after ORDER BY id LIMIT :batch_size
+    ) batch
+"""
+
+PARTITIONS_OF = """
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = :table
+    ORDER BY c.relname
+"""
+
+
+def _index_ddl() -> List[Tuple[str, str]]:
+    """(name, CREATE INDEX for the new table) for every index of the ContractChunk model"""
+    dialect = postgresql.dialect()
+    statements = []
+    for index in sorted(ContractChunk.__table__.indexes, key=lambda i: i.name):
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+        ddl = ddl.replace(f" {index.name} ON contract_chunks ", f" {index.name}_new ON {NEW_TABLE} ", 1)
+        statements.append((index.name, ddl))
+    return statements
+
+
+def _table_exists(conn, table: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar()
+
+
+def _copy_batches(after: int, batch_size: int) -> int:
+    """Copy the chunks with id > after in batches; returns the last copied id"""
+    copied = 0
+    start = time.time()
+    while True:
+        with engine.begin() as conn:
+            upto = conn.execute(text(NEXT_BATCH_END), {"after": after, "batch_size": batch_size}).scalar()
+            if upto is None:
+                return after
+            copied += conn.execute(text(COPY_BATCH), {"after": after, "upto": upto}).rowcount
+        after = upto
+        print(f"📦 Copied {copied} chunk(s) (up to id {after}, {time.time() - start:.0f}s)")
+
+
+def _swap(conn, after: int, partitions: int):
+    """Copy the last rows and rename the tables (writes blocked until commit)"""
+    conn.execute(text("LOCK TABLE contract_chunks IN EXCLUSIVE MODE"))
+    upto = conn.execute(text("SELECT coalesce(max(id), 0) FROM contract_chunks")).scalar()
+    late = conn.execute(text(COPY_BATCH), {"after": after, "upto": upto}).rowcount
+    print(f"📦 Copied {late} chunk(s) written during the migration")
+
+    old_partitions = conn.execute(text(PARTITIONS_OF), {"table": "contract_chunks"}).scalars().all()
+    conn.execute(text(f"ALTER TABLE contract_chunks RENAME TO {OLD_TABLE}"))
+    conn.execute(text(f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT contract_chunks_pkey TO {OLD_TABLE}_pkey"))
+    for partition in old_partitions:
+        conn.execute(text(f"ALTER TABLE {partition} RENAME TO {OLD_TABLE}{partition[len('contract_chunks'):]}"))
+    for name, _ in _index_ddl():
+        conn.execute(text(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old"))
+
+    conn.execute(text(f"ALTER TABLE {NEW_TABLE} RENAME TO contract_chunks"))
+    conn.execute(text(f"ALTER TABLE contract_chunks RENAME CONSTRAINT {NEW_TABLE}_pkey TO contract_chunks_pkey"))
+    for remainder in range(partitions):
+        conn.execute(text(f"ALTER TABLE {NEW_TABLE}_p{remainder} RENAME TO contract_chunks_p{remainder}"))
+    for name, _ in _index_ddl():
+        conn.execute(text(f"ALTER INDEX {name}_new RENAME TO {name}"))
+
+    # The id sequence must belong to the new table, or dropping the old one drops it
+    conn.execute(text("ALTER SEQUENCE contract_chunks_id_seq OWNED BY contract_chunks.id"))
+
+
+def migrate(batch_size: int = 5000, partitions: int = None, drop_old: bool = False):
+    """
+    Move contract_chunks into a table hash-partitioned by user_id.
+
+    Args:
+        batch_size: rows copied per transaction
+        partitions: hash partitions (default CHUNK_PARTITIONS)
+        drop_old: drop contract_chunks_old after the swap
+    """
+    partitions = partitions or settings.CHUNK_PARTITIONS
+    start = time.time()
+
+    with engine.begin() as conn:
+        if _table_exists(conn, OLD_TABLE):
+            print(f"❌ {OLD_TABLE} exists from an earlier migration - drop it first")
+            return
+        conn.execute(text(CREATE_NEW_TABLE))
+        create_chunk_partitions(conn, NEW_TABLE, partitions)
+        after = conn.execute(text(f"SELECT coalesce(max(id), 0) FROM {NEW_TABLE}")).scalar()
+    if after:
+        print(f"↩️ Resuming after chunk id {after}")
+
+    print(f"🚚 Copying chunks into {NEW_TABLE} ({partitions} partitions)...")
+    after = _copy_batches(after, batch_size)
+
+    print("🔧 Building indexes (vector indexes can take a while)...")
+    for name, ddl in _index_ddl():
+        with engine.begin() as conn:
+            conn.execute(text(ddl))
+        print(f"✅ {name}")
+
+    with engine.begin() as conn:
+        _swap(conn, after, partitions)
+    print(f"✅ contract_chunks is partitioned by user_id ({time.time() - start:.0f}s)")
+
+    if drop_old:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {OLD_TABLE}"))
+        print(f"🗑️ Dropped {OLD_TABLE}")
+    else:
+        print(f"ℹ️ Old table kept as {OLD_TABLE} - drop it once the new one is verified")
+
+
+# Key of the Postgres advisory lock held while backfilling user_id
+BACKFILL_LOCK_KEY = 7_040_001
+
+
+def backfill_user_ids(batch_size: int = None) -> int:
+    """
+    Copy contracts.user_id onto chunks that don't have one yet (unpartitioned
+    tables from before the column existed), batch_size rows per transaction
+    in id order. Holds an advisory lock so two runs don't race on the same
+    batches. Returns the rows updated.
+    """
+    batch_size = batch_size or settings.CHUNK_BACKFILL_BATCH_SIZE
+    updated = 0
+    after = 0
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": BACKFILL_LOCK_KEY}).scalar():
+            print("⏭️ Another user_id backfill is running")
+            return 0
+        try:
+            while True:
+                ids = conn.execute(text("""
+                    SELECT id FROM contract_chunks
+                    WHERE id > :after AND user_id IS NULL
+                    ORDER BY id LIMIT :batch
+                """), {"after": after, "batch": batch_size}).scalars().all()
+                if not ids:
+                    break
+                updated += conn.execute(text("""
+                    UPDATE contract_chunks ch SET user_id = c.user_id
+                    FROM contracts c
+                    WHERE c.id = ch.contract_id AND ch.id = ANY(:ids)
+                """), {"ids": ids}).rowcount
+                conn.commit()
+                after = ids[-1]
+                print(f"🔧 Backfilled user_id on {updated} chunk(s)...")
+
+            if chunks_missing_user_id(conn):
+                print("❌ Some chunks still have no user_id (their contract is missing?) - fix or delete them")
+            else:
+                print(f"✅ user_id backfilled on {updated} chunk(s)")
+            conn.commit()
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BACKFILL_LOCK_KEY})
+            conn.commit()
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move contract_chunks into a table hash-partitioned by user_id")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows copied per transaction")
+    parser.add_argument("--partitions", type=int, help="number of hash partitions (default CHUNK_PARTITIONS)")
+    parser.add_argument("--drop-old", action="store_true", help="drop contract_chunks_old after the swap")
+    parser.add_argument(
+        "--backfill-user-ids", action="store_true",
+        help="only fill in contract_chunks.user_id on the unpartitioned table (no copy)"
+    )
+    args = parser.parse_args()
+    if args.backfill_user_ids:
+        backfill_user_ids(args.batch_size)
+    else:
+        migrate(args.batch_size, args.partitions, args.drop_old)
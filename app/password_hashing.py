@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.metrics import record_password_hash, set_password_hash_queue_depth
+
+
+# ==============================
+# Password Hashing Pool
+# ==============================
+#
+# bcrypt is ~250ms of CPU per hash or verify. Done inside the request
+# handlers it ties up threadpool threads and competes for the GIL with
+# every other endpoint, so a burst of logins slows the whole API down.
+# Signup and login hand the work to a small process pool instead
+# (PASSWORD_HASH_WORKERS, spawned so the workers don't inherit the
+# server's threads or models).
+#
+# Admission control: at most PASSWORD_HASH_MAX_PENDING hashes are queued or
+# running. Past that, PasswordHashingBusy is raised (503 + Retry-After)
+# instead of letting the queue - and every caller's latency - grow.
+# PASSWORD_HASH_WORKERS=0 hashes on a thread instead (tests, local dev).
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto"
+)
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password hashes queued - retry after a short wait"""
+
+
+def _normalize_password(password: str) -> str:
+    """
+    Pre-hash password with SHA256 to avoid bcrypt 72-byte limit.
+    Returns fixed-length hex string.
+    """
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def hash_password(password: str) -> str:
+    """
+    Convert plain password to secure hashed password (on the calling thread).
+    """
+    normalized = _normalize_password(password)
+    return pwd_context.hash(normalized)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify user password (on the calling thread).
+    """
+    normalized = _normalize_password(plain_password)
+    return pwd_context.verify(normalized, hashed_password)
+
+
+# ---------------------------
+# Process pool + admission control
+# ---------------------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def get_hash_pool() -> Optional[ProcessPoolExecutor]:
+    """Get or initialize the hashing process pool (None with PASSWORD_HASH_WORKERS=0)"""
+    global _pool
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            print(f"🔧 Starting {settings.PASSWORD_HASH_WORKERS} password hashing worker process(es)...")
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _pool
+
+
+def shutdown_hash_pool():
+    """Stop the worker processes (on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _admit(operation: str):
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            record_password_hash(operation, rejected=True)
+            raise PasswordHashingBusy(f"{_pending} password hashes already queued")
+        _pending += 1
+        set_password_hash_queue_depth(_pending)
+
+
+def _release():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+        set_password_hash_queue_depth(_pending)
+
+
+async def _run(operation: str, fn, *args):
+    _admit(operation)
+    start = time.perf_counter()
+    try:
+        # No pool: the event loop's default thread executor
+        return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), fn, *args)
+    except BrokenProcessPool:
+        # A worker died - start a fresh pool on the next call
+        print("⚠️ Password hashing pool broke, restarting it")
+        shutdown_hash_pool()
+        raise
+    finally:
+        _release()
+        record_password_hash(operation, seconds=time.perf_counter() - start)
+
+
+async def ahash_password(password: str) -> str:
+    """
+    hash_password on the process pool.
+
+    Raises:
+        PasswordHashingBusy: PASSWORD_HASH_MAX_PENDING hashes already queued
+    """
+    return await _run("hash", hash_password, password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password on the process pool.
+
+    Raises:
+        PasswordHashingBusy: PASSWORD_HASH_MAX_PENDING hashes already queued
+    """
+    return await _run("verify", verify_password, plain_password, hashed_password)
@@ -0,0 +1,91 @@
+import gc
+import os
+import time
+from typing import Dict
+
+from app.config import settings
+from app.worker_role import needs_component
+
+
+# ==============================
+# Pre-fork Model Preloading
+# ==============================
+#
+# Each uvicorn / gunicorn worker normally loads its own copy of torch and the
+# CrossEncoder weights, so memory - not CPU - caps workers per node. With
+# PRELOAD_MODELS, gunicorn.conf.py loads the models once in the master before
+# forking; the workers share those pages copy-on-write for as long as nobody
+# writes to them:
+#
+#   - weights move to shared memory (share_memory()) and are frozen
+#     (eval mode, requires_grad off), so inference only reads them
+#   - the master never runs inference, so torch's thread pool starts in each
+#     worker after the fork, not in the master (OpenMP isn't fork-safe)
+#   - gc.freeze() moves everything allocated so far out of the collector's
+#     reach - otherwise every worker's first full collection writes to the
+#     GC header of each object and un-shares the pages they live on
+#
+# benchmarks/shared_memory.py reports unique vs shared memory per worker.
+
+_threads_before_fork = None
+
+
+def _share_weights(model):
+    """Read-only weights in shared memory"""
+    import torch
+    # Older sentence-transformers CrossEncoders wrap the torch module
+    module = model if isinstance(model, torch.nn.Module) else model.model
+    module.eval()
+    for parameter in module.parameters():
+        parameter.requires_grad_(False)
+    module.share_memory()
+
+
+def preload_models() -> Dict[str, float]:
+    """
+    Load this role's local models (run in the gunicorn master, before fork).
+
+    Returns:
+        Seconds spent per model
+    """
+    import torch
+
+    global _threads_before_fork
+    # Tokenizer thread pools started before fork deadlock in the workers
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    # Loading the clause model encodes its descriptions - keep that single
+    # threaded so the master's OpenMP pool never starts
+    _threads_before_fork = torch.get_num_threads()
+    torch.set_num_threads(1)
+
+    timings = {}
+    if needs_component("reranker"):
+        from app.hybrid_search import get_reranker
+        start = time.perf_counter()
+        _share_weights(get_reranker())
+        timings["reranker"] = time.perf_counter() - start
+
+    if settings.CLAUSE_CLASSIFIER_BACKEND == "model" and needs_component("clause_model"):
+        from app.clause_classifier import get_clause_model
+        start = time.perf_counter()
+        model, _ = get_clause_model()
+        _share_weights(model)
+        timings["clause_model"] = time.perf_counter() - start
+
+    for name, seconds in timings.items():
+        print(f"✅ Preloaded {name} in {seconds:.2f}s (shared with workers)")
+    return timings
+
+
+def freeze_heap():
+    """Exclude everything allocated so far from garbage collection (call right before fork)"""
+    gc.freeze()
+    print(f"🧊 Froze {gc.get_freeze_count()} objects for copy-on-write sharing")
+
+
+def after_fork():
+    """Per-worker setup after the fork (gunicorn post_fork)"""
+    if _threads_before_fork is not None:
+        import torch
+        torch.set_num_threads(_threads_before_fork)
+    gc.enable()
@@ -0,0 +1,127 @@
+import argparse
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.read_replica import record_write
+from app.database import session_scope, Contract, ContractChunk, ContractSummary, Conversation, Message, User
+
+
+# ==============================
+# Batched Tenant Purge
+# ==============================
+#
+# Foreign keys cascade (ON DELETE CASCADE), so deleting a contract or user
+# row removes everything under it in one statement. For a tenant with a very
+# large number of chunks that one statement would hold row locks and write
+# WAL for a long time, so /my-contracts/all hands those tenants to this job:
+# each contract's chunks are deleted PURGE_BATCH_SIZE rows per transaction,
+# with a short pause between batches, before the (now cheap) contract row.
+#
+# Contracts disappear one by one while the job runs.
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def is_purge_running(user_id: int) -> bool:
+    with _running_lock:
+        return user_id in _running
+
+
+def tenant_chunk_count(db: Session, user_id: int) -> int:
+    """Chunks stored for a user's contracts (from contracts.num_chunks - no chunk scan)"""
+    return db.execute(
+        select(func.coalesce(func.sum(Contract.num_chunks), 0)).where(Contract.user_id == user_id)
+    ).scalar_one()
+
+
+def _delete_in_batches(db: Session, model, condition, batch_size: int, pause: float) -> int:
+    """Delete matching rows batch_size at a time, one transaction per batch"""
+    deleted = 0
+    while True:
+        batch = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        # condition repeated on the delete so it's pruned to the same partition
+        count = db.execute(delete(model).where(condition, model.id.in_(batch))).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def purge_user_contracts(
+    user_id: int,
+    batch_size: Optional[int] = None,
+    pause: Optional[float] = None,
+    delete_user: bool = False
+):
+    """
+    Delete all of a user's contracts in bounded batches (background task / CLI).
+
+    Args:
+        user_id: tenant to purge
+        batch_size: rows per delete statement (default PURGE_BATCH_SIZE)
+        pause: seconds between batches (default PURGE_BATCH_PAUSE_SECONDS)
+        delete_user: also delete the user's conversations and the account
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    pause = settings.PURGE_BATCH_PAUSE_SECONDS if pause is None else pause
+
+    with _running_lock:
+        if user_id in _running:
+            print(f"⏭️ Purge for user {user_id} already running")
+            return
+        _running.add(user_id)
+
+    start = time.time()
+    try:
+        with session_scope() as db:
+            contract_ids = db.execute(
+                select(Contract.id).where(Contract.user_id == user_id).order_by(Contract.id)
+            ).scalars().all()
+            print(f"🗑️ Purging {len(contract_ids)} contract(s) of user {user_id} in batches of {batch_size}...")
+
+            chunks = 0
+            for contract_id in contract_ids:
+                chunks += _delete_in_batches(
+                    db, ContractChunk,
+                    (ContractChunk.user_id == user_id) & (ContractChunk.contract_id == contract_id),
+                    batch_size, pause
+                )
+                _delete_in_batches(db, ContractSummary, ContractSummary.contract_id == contract_id, batch_size, pause)
+                db.execute(delete(Contract).where(Contract.id == contract_id))
+                db.commit()
+
+            if delete_user:
+                conversations = select(Conversation.id).where(Conversation.user_id == user_id)
+                _delete_in_batches(db, Message, Message.conversation_id.in_(conversations), batch_size, pause)
+                db.execute(delete(User).where(User.id == user_id))
+                db.commit()
+
+        record_write(user_id)
+
+        print(
+            f"✅ Purged user {user_id}: {len(contract_ids)} contract(s), {chunks} chunk(s)"
+            f"{' and the account' if delete_user else ''} in {time.time() - start:.1f}s"
+        )
+    except Exception as e:
+        print(f"❌ Purge of user {user_id} stopped: {str(e)} (run it again to finish)")
+    finally:
+        with _running_lock:
+            _running.discard(user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete a tenant's contracts in bounded batches")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--pause", type=float, help="seconds between batches")
+    parser.add_argument("--delete-user", action="store_true", help="also delete conversations and the account")
+    args = parser.parse_args()
+    purge_user_contracts(args.user_id, args.batch_size, args.pause, args.delete_user)
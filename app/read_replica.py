@@ -0,0 +1,403 @@
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.database import engine, engine_options, get_async_engine, _to_async_url
+from app.deadline import is_query_canceled, TRANSACTION_SETTING
+from app.metrics import record_read_route, record_replica_failover
+from app.auth import get_current_user, get_current_user_async
+
+
+# ==============================
+# Read Replica Routing
+# ==============================
+#
+# With DATABASE_REPLICA_URL set, search and listing reads (the document
+# tools and hybrid_search, /my-contracts, /conversations) run on a streaming
+# replica, so pgvector scans don't compete with uploads and message writes on
+# the primary. Writes, and reads that are part of a write (conversation
+# history, ownership checks before a delete), stay on SessionLocal.
+#
+# Read-your-writes: after a user's upload / delete / new messages commit,
+# record_write() remembers the primary's WAL position for that user. Their
+# next read session checks pg_last_wal_replay_lsn() on the replica and uses
+# the primary until the replica has replayed that far. The position is kept
+# in this process and also sent back to the client (read_after_lsn cookie +
+# X-Read-After-LSN header, for REPLICA_READ_YOUR_WRITES_SECONDS), so the next
+# request is routed correctly whichever worker serves it. Streamed answers
+# save their messages after the headers are sent, so they only get the
+# in-process position.
+#
+# Failover: a read that can't reach the replica is retried on the primary,
+# and the replica is skipped for REPLICA_RETRY_SECONDS. Transaction-local
+# settings the read had made (statement_timeout, hnsw.iterative_scan) are
+# applied again on the primary first.
+
+_CURRENT_LSN = text("SELECT pg_current_wal_lsn()::text")
+# NULL replay position = not a standby (e.g. a second standalone instance)
+_CAUGHT_UP = text("SELECT coalesce(pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), true)")
+
+_ON_PRIMARY = "read_on_primary"
+
+_replica_engine = None
+_async_replica_engine = None
+_replica_lock = threading.Lock()
+_replica_down_until = 0.0
+
+_write_positions: Dict[int, Tuple[str, float]] = {}
+_positions_lock = threading.Lock()
+
+LSN_COOKIE = "read_after_lsn"
+LSN_HEADER = "x-read-after-lsn"
+_LSN_FORMAT = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+# Per request: the client's last write position and the one to send back
+_request_positions: ContextVar[Optional[dict]] = ContextVar("request_positions", default=None)
+
+_LOCAL_SETTINGS = "transaction_settings"
+
+
+# ---------------------------
+# Engines + replica health
+# ---------------------------
+
+def _watch_disconnects(replica_engine):
+    """Take the replica out of rotation as soon as one of its connections drops"""
+    @event.listens_for(replica_engine, "handle_error")
+    def _on_error(context):
+        if context.is_disconnect:
+            mark_replica_down(context.original_exception)
+
+
+def get_replica_engine():
+    """Get or initialize the replica engine (None when DATABASE_REPLICA_URL isn't set)"""
+    global _replica_engine
+    if not settings.DATABASE_REPLICA_URL:
+        return None
+    with _replica_lock:
+        if _replica_engine is None:
+            _replica_engine = create_engine(settings.DATABASE_REPLICA_URL, **engine_options("replica"))
+            _watch_disconnects(_replica_engine)
+    return _replica_engine
+
+
+def get_async_replica_engine():
+    """Get or initialize the asyncpg replica engine (None without a replica)"""
+    global _async_replica_engine
+    if not settings.DATABASE_REPLICA_URL:
+        return None
+    if _async_replica_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = settings.ASYNC_DATABASE_REPLICA_URL or _to_async_url(settings.DATABASE_REPLICA_URL)
+        _async_replica_engine = create_async_engine(url, **engine_options("async_replica", async_driver=True))
+        _watch_disconnects(_async_replica_engine.sync_engine)
+    return _async_replica_engine
+
+
+def mark_replica_down(error: Exception):
+    """Send reads to the primary for REPLICA_RETRY_SECONDS"""
+    global _replica_down_until
+    if replica_available():
+        print(f"⚠️ Read replica unavailable, using the primary for {settings.REPLICA_RETRY_SECONDS:.0f}s: {str(error)[:200]}")
+    _replica_down_until = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def replica_available() -> bool:
+    return bool(settings.DATABASE_REPLICA_URL) and time.monotonic() >= _replica_down_until
+
+
+async def dispose_replica_engines():
+    """Close pooled replica connections (on shutdown)"""
+    if _replica_engine is not None:
+        _replica_engine.dispose()
+    if _async_replica_engine is not None:
+        await _async_replica_engine.dispose()
+
+
+# ---------------------------
+# Read-your-writes
+# ---------------------------
+
+def _lsn_value(lsn: str) -> int:
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def _later_lsn(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    if a is None or b is None:
+        return a or b
+    return a if _lsn_value(a) >= _lsn_value(b) else b
+
+
+def _remember_write(user_id: int, lsn: Optional[str]):
+    if lsn is None:
+        return
+    with _positions_lock:
+        _write_positions[user_id] = (lsn, time.monotonic() + settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+    positions = _request_positions.get()
+    if positions is not None:
+        positions["written"] = lsn
+
+
+def _local_pending_write(user_id: int) -> Optional[str]:
+    with _positions_lock:
+        position = _write_positions.get(user_id)
+        if position is None:
+            return None
+        lsn, expires = position
+        if time.monotonic() >= expires:
+            del _write_positions[user_id]
+            return None
+        return lsn
+
+
+def _pending_write(user_id: Optional[int]) -> Optional[str]:
+    """
+    WAL position the replica must have replayed before serving this user:
+    the later of this process's record and the one the client sent back
+    """
+    if user_id is None:
+        return None
+    positions = _request_positions.get()
+    client_lsn = positions["client"] if positions is not None else None
+    return _later_lsn(_local_pending_write(user_id), client_lsn)
+
+
+def _caught_up(user_id: int, lsn: str):
+    """The replica has replayed the user's last write - stop checking"""
+    with _positions_lock:
+        if _write_positions.get(user_id, (None,))[0] == lsn:
+            del _write_positions[user_id]
+
+
+def record_write(user_id: int):
+    """
+    Remember the primary's WAL position after a committed write for this user,
+    so their following reads wait for the replica to catch up. No-op without
+    a replica.
+    """
+    if not settings.DATABASE_REPLICA_URL:
+        return
+    try:
+        with engine.connect() as conn:
+            _remember_write(user_id, conn.execute(_CURRENT_LSN).scalar())
+    except Exception as e:
+        print(f"⚠️ Could not read the WAL position after a write: {str(e)}")
+
+
+async def arecord_write(user_id: int):
+    """Async version of record_write (asyncpg primary engine)"""
+    if not settings.DATABASE_REPLICA_URL:
+        return
+    try:
+        async with get_async_engine().connect() as conn:
+            _remember_write(user_id, (await conn.execute(_CURRENT_LSN)).scalar())
+    except Exception as e:
+        print(f"⚠️ Could not read the WAL position after a write: {str(e)}")
+
+
+def _client_lsn(headers) -> Optional[str]:
+    """Write position from the X-Read-After-LSN header or read_after_lsn cookie (None if absent / malformed)"""
+    values = dict(headers)
+    lsn = values.get(LSN_HEADER.encode(), b"").decode("latin-1").strip()
+    if not lsn and b"cookie" in values:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(values[b"cookie"].decode("latin-1"))
+        except Exception:
+            return None
+        lsn = cookie[LSN_COOKIE].value if LSN_COOKIE in cookie else ""
+    return lsn if _LSN_FORMAT.match(lsn) else None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Carries read-your-writes positions between workers through the client:
+    reads the position a client sends back, and returns the position of any
+    write the request made (cookie + header). No-op without a replica.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.DATABASE_REPLICA_URL:
+            await self.app(scope, receive, send)
+            return
+
+        positions = {"client": _client_lsn(scope["headers"]), "written": None}
+        token = _request_positions.set(positions)
+
+        async def send_with_position(message):
+            if message["type"] == "http.response.start" and positions["written"]:
+                lsn = positions["written"]
+                max_age = int(settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (LSN_HEADER.encode(), lsn.encode()),
+                    (b"set-cookie", f"{LSN_COOKIE}={lsn}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_position)
+        finally:
+            _request_positions.reset(token)
+
+
+# ---------------------------
+# Read sessions
+# ---------------------------
+
+class ReadSession(Session):
+    """
+    Session for read-only work. Each transaction runs on the replica while
+    it's healthy (and caught up with the user's writes), otherwise on the
+    primary. A statement that fails because the replica can't be reached
+    is rolled back and run again on the primary.
+    """
+
+    def _engines(self):
+        return get_replica_engine(), engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica, primary = self._engines()
+        if replica is None or self.info.get(_ON_PRIMARY) or not replica_available():
+            return primary
+        return replica
+
+    def _with_failover(self, run, statement, *args, **kwargs):
+        try:
+            result = run(statement, *args, **kwargs)
+        except OperationalError as e:
+            # Already on the primary (or a statement_timeout) - nothing to fail over
+            if self.info.get(_ON_PRIMARY) or self._engines()[0] is None or is_query_canceled(e):
+                raise
+            mark_replica_down(e)
+            record_replica_failover()
+            settings_made = self.info.get(_LOCAL_SETTINGS, [])
+            self.rollback()
+            self.info[_ON_PRIMARY] = True
+            # The rollback dropped the transaction's set_config(..., true) values
+            for setting, setting_args, setting_kwargs in settings_made:
+                self.execute(setting, *setting_args, **setting_kwargs)
+            result = run(statement, *args, **kwargs)
+        if _is_transaction_setting(statement):
+            self.info.setdefault(_LOCAL_SETTINGS, []).append((statement, args, kwargs))
+        return result
+
+    def execute(self, statement, *args, **kwargs):
+        return self._with_failover(super().execute, statement, *args, **kwargs)
+
+    def scalar(self, statement, *args, **kwargs):
+        return self._with_failover(super().scalar, statement, *args, **kwargs)
+
+    def scalars(self, statement, *args, **kwargs):
+        return self._with_failover(super().scalars, statement, *args, **kwargs)
+
+
+def _is_transaction_setting(statement) -> bool:
+    options = getattr(statement, "get_execution_options", None)
+    return bool(options and options().get(TRANSACTION_SETTING))
+
+
+@event.listens_for(ReadSession, "after_transaction_end")
+def _forget_transaction_settings(session, transaction):
+    """set_config(..., true) values end with the transaction"""
+    if transaction.parent is None:
+        session.info.pop(_LOCAL_SETTINGS, None)
+
+
+class _AsyncReadSession(ReadSession):
+    """Sync side of an async read session - binds to the asyncpg engines"""
+
+    def _engines(self):
+        replica = get_async_replica_engine()
+        return (replica.sync_engine if replica is not None else None), get_async_engine().sync_engine
+
+
+ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+def _route(db: Session, user_id: Optional[int], caught_up: Optional[bool]):
+    """Pin the session to the primary when the replica is behind the user's writes"""
+    if not settings.DATABASE_REPLICA_URL:
+        return
+    if not replica_available():
+        record_read_route("primary", "replica_down")
+        db.info[_ON_PRIMARY] = True
+    elif caught_up is not None and not caught_up:
+        record_read_route("primary", "lagging")
+        db.info[_ON_PRIMARY] = True
+    else:
+        record_read_route("replica", "ok")
+
+
+def _settle_catch_up(db: Session, user_id: int, lsn: str, caught_up: Optional[bool]) -> bool:
+    """
+    Interpret the catch-up check. If it failed over, it ran on the primary,
+    where pg_last_wal_replay_lsn() is NULL and the check says true - that
+    says nothing about the replica, so keep the write pending and the
+    session pinned to the primary.
+    """
+    if db.info.get(_ON_PRIMARY):
+        return False
+    if caught_up:
+        _caught_up(user_id, lsn)
+    return bool(caught_up)
+
+
+def read_session(user_id: Optional[int] = None) -> Session:
+    """
+    Session for search / listing reads of this user (close it when done).
+    Uses the replica unless it's down or hasn't replayed the user's last write.
+    """
+    db = ReadSessionLocal()
+    lsn = _pending_write(user_id)
+    caught_up = None
+    if lsn and replica_available():
+        caught_up = db.scalar(_CAUGHT_UP, {"lsn": lsn})
+        db.rollback()
+        caught_up = _settle_catch_up(db, user_id, lsn, caught_up)
+    _route(db, user_id, caught_up)
+    return db
+
+
+@asynccontextmanager
+async def aread_session(user_id: Optional[int] = None):
+    """Async version of read_session (AsyncSession on the asyncpg engines)"""
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async with AsyncSession(sync_session_class=_AsyncReadSession, autoflush=False, expire_on_commit=False) as db:
+        lsn = _pending_write(user_id)
+        caught_up = None
+        if lsn and replica_available():
+            caught_up = await db.scalar(_CAUGHT_UP, {"lsn": lsn})
+            await db.rollback()
+            caught_up = _settle_catch_up(db.sync_session, user_id, lsn, caught_up)
+        _route(db.sync_session, user_id, caught_up)
+        yield db
+
+
+def get_read_db(user_id: int = Depends(get_current_user)):
+    """Read session for FastAPI listing routes (replica when possible)"""
+    db = read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(user_id: int = Depends(get_current_user_async)):
+    """Async read session for FastAPI listing routes"""
+    async with aread_session(user_id) as db:
+        yield db
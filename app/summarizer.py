@@ -0,0 +1,274 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, Contract, ContractChunk, ContractSummary, release_connection, session_scope
+from app.metrics import span
+from app.read_replica import record_write
+
+
+# ==============================
+# Hierarchical Contract Summaries
+# ==============================
+#
+# Built once per upload, so "summarize my contract" is a lookup instead of
+# several agent search rounds over five chunks at a time:
+#
+#   map:    every SUMMARY_SECTION_CHUNKS consecutive chunks -> section summary (level 0)
+#   reduce: every SUMMARY_FANOUT summaries -> one summary on the next level,
+#           repeated until a single document summary is left (top level)
+
+SECTION_PROMPT = """Summarize this section of a legal/business document.
+
+Keep: parties, obligations, amounts, dates, deadlines, durations, termination and renewal terms, liability and other key clauses.
+Use plain language and at most 120 words. Do not add anything that is not in the text.
+
+Section text:
+{text}
+
+Summary:"""
+
+COMBINE_PROMPT = """Combine these consecutive section summaries of the document "{filename}" into one summary.
+
+Keep the most important terms (parties, obligations, money, dates, termination, liability, unusual clauses), in document order.
+Use plain language and at most {words} words. Do not add anything that is not in the summaries.
+
+Section summaries:
+{text}
+
+Combined summary:"""
+
+
+# ---------------------------
+# Summarizers
+# ---------------------------
+
+class LLMSummarizer:
+    """Summaries written by Gemini"""
+
+    name = "llm"
+
+    def summarize_section(self, text: str) -> str:
+        return self._invoke(SECTION_PROMPT.format(text=text))
+
+    def combine(self, summaries: List[str], filename: str, words: int) -> str:
+        return self._invoke(COMBINE_PROMPT.format(filename=filename, words=words, text="\n\n".join(summaries)))
+
+    def _invoke(self, prompt: str) -> str:
+        from app.llm import get_llm, extract_answer_text
+        return extract_answer_text(get_llm().invoke(prompt).content).strip()
+
+
+class ExtractiveSummarizer:
+    """
+    LLM stand-in: keeps the leading sentences of each input.
+    Deterministic and free - for tests, local development and backfills
+    without a Gemini key.
+    """
+
+    name = "extractive"
+
+    def __init__(self, sentences_per_section: int = 2, words_per_summary: int = 120):
+        self.sentences_per_section = sentences_per_section
+        self.words_per_summary = words_per_summary
+
+    def summarize_section(self, text: str) -> str:
+        sentences = _sentences(text)[:self.sentences_per_section]
+        return _limit_words(" ".join(sentences), self.words_per_summary)
+
+    def combine(self, summaries: List[str], filename: str, words: int) -> str:
+        # First sentence of each summary, in order, within the word limit
+        return _limit_words(" ".join(_sentences(s)[0] for s in summaries if s.strip()), words)
+
+
+def _sentences(text: str, min_words: int = 5) -> List[str]:
+    """Sentences of the text, skipping headings and fragments shorter than min_words"""
+    text = re.sub(r"\s+", " ", text).strip()
+    sentences = [s for s in re.split(r"(?<=[.!?;])\s+", text) if s]
+    return [s for s in sentences if len(s.split()) >= min_words] or sentences or [text]
+
+
+def _limit_words(text: str, words: int) -> str:
+    parts = text.split()
+    return text if len(parts) <= words else " ".join(parts[:words]) + " …"
+
+
+def get_summarizer(backend: Optional[str] = None):
+    """Summarizer for SUMMARY_BACKEND ("llm" or "extractive")"""
+    backend = backend or settings.SUMMARY_BACKEND
+    if backend == "extractive":
+        return ExtractiveSummarizer()
+    if backend == "llm":
+        return LLMSummarizer()
+    raise ValueError(f"Unknown SUMMARY_BACKEND: {backend}")
+
+
+# ---------------------------
+# Map-reduce tree
+# ---------------------------
+
+# Section summaries are independent LLM calls - run a few at once
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="summary")
+
+
+def build_summary_tree(
+    chunks: List[str],
+    filename: str,
+    summarizer=None,
+    section_chunks: Optional[int] = None,
+    fanout: Optional[int] = None
+) -> List[Dict]:
+    """
+    Build the summary tree for a document's chunks (in chunk_index order).
+
+    Returns:
+        Nodes as dicts (level, position, chunk_start, chunk_end, summary);
+        the last node is the document summary.
+    """
+    summarizer = summarizer or get_summarizer()
+    section_chunks = section_chunks or settings.SUMMARY_SECTION_CHUNKS
+    fanout = max(fanout or settings.SUMMARY_FANOUT, 2)
+
+    if not chunks:
+        return []
+
+    # Map: one summary per group of consecutive chunks
+    ranges = [(start, min(start + section_chunks, len(chunks)) - 1) for start in range(0, len(chunks), section_chunks)]
+    with span("summary_map"):
+        summaries = list(_summary_executor.map(
+            lambda r: summarizer.summarize_section("\n".join(chunks[r[0]:r[1] + 1])),
+            ranges
+        ))
+    level_nodes = [
+        {"level": 0, "position": i, "chunk_start": start, "chunk_end": end, "summary": summary}
+        for i, ((start, end), summary) in enumerate(zip(ranges, summaries))
+    ]
+    nodes = list(level_nodes)
+
+    # Reduce: combine groups until one document summary is left. A single
+    # section still gets a document-level node so the tree always has a root.
+    level = 0
+    while len(level_nodes) > 1 or level == 0:
+        level += 1
+        groups = [level_nodes[i:i + fanout] for i in range(0, len(level_nodes), fanout)]
+        words = 250 if len(groups) == 1 else 150
+        with span("summary_reduce"):
+            combined = list(_summary_executor.map(
+                lambda group: summarizer.combine([n["summary"] for n in group], filename, words),
+                groups
+            ))
+        level_nodes = [
+            {
+                "level": level,
+                "position": i,
+                "chunk_start": group[0]["chunk_start"],
+                "chunk_end": group[-1]["chunk_end"],
+                "summary": summary,
+            }
+            for i, (group, summary) in enumerate(zip(groups, combined))
+        ]
+        nodes.extend(level_nodes)
+
+    return nodes
+
+
+def store_summary_tree(db: Session, contract_id: int, nodes: List[Dict]):
+    """Replace the stored summary tree of a contract"""
+    db.query(ContractSummary).filter(ContractSummary.contract_id == contract_id).delete()
+    db.add_all([ContractSummary(contract_id=contract_id, **node) for node in nodes])
+    db.commit()
+
+
+def summarize_contract(db: Session, contract: Contract, chunks: List[str], summarizer=None) -> List[Dict]:
+    """Build and store the summary tree for one contract"""
+    start = time.time()
+    summarizer = summarizer or get_summarizer()
+    print(f"📝 Building summary tree for {contract.filename} ({len(chunks)} chunks, {summarizer.name})...")
+    # The map-reduce makes many LLM calls - don't hold a connection meanwhile
+    release_connection(db)
+    nodes = build_summary_tree(chunks, contract.filename, summarizer)
+    store_summary_tree(db, contract.id, nodes)
+    levels = max((n["level"] for n in nodes), default=0) + 1
+    print(f"✅ Summary tree for {contract.filename}: {len(nodes)} nodes, {levels} levels in {time.time() - start:.1f}s")
+    return nodes
+
+
+def summarize_contract_in_background(contract_id: int, chunks: List[str]):
+    """
+    Upload background task - runs after the response is sent, with its own
+    session. A failure only means summary questions fall back to search.
+    """
+    try:
+        with session_scope() as db:
+            contract = db.get(Contract, contract_id)
+            if contract is None:
+                return
+            summarize_contract(db, contract, chunks)
+        record_write(contract.user_id)
+    except Exception as e:
+        print(f"⚠️ Could not build summary tree for contract {contract_id}: {str(e)}")
+
+
+# ---------------------------
+# Lookup
+# ---------------------------
+
+def summary_tree_query(contract_ids: List[int]):
+    """Every summary node of these contracts, ordered by contract, level and position"""
+    return select(ContractSummary).where(
+        ContractSummary.contract_id.in_(contract_ids)
+    ).order_by(ContractSummary.contract_id, ContractSummary.level, ContractSummary.position)
+
+
+def group_summary_nodes(nodes: List[ContractSummary]) -> Dict[int, List[ContractSummary]]:
+    trees: Dict[int, List[ContractSummary]] = {}
+    for node in nodes:
+        trees.setdefault(node.contract_id, []).append(node)
+    return trees
+
+
+def load_summary_trees(db: Session, contract_ids: List[int]) -> Dict[int, List[ContractSummary]]:
+    """All summary nodes for these contracts in one query, grouped by contract"""
+    if not contract_ids:
+        return {}
+    return group_summary_nodes(db.execute(summary_tree_query(contract_ids)).scalars().all())
+
+
+def format_summary_tree(filename: str, nodes: List, include_sections: bool) -> str:
+    """Document summary (top node), optionally followed by the section summaries"""
+    top_level = max(n.level for n in nodes)
+    document_summary = next(n for n in nodes if n.level == top_level)
+    result = f"📄 {filename}\n{document_summary.summary}\n"
+    if include_sections:
+        sections = [n for n in nodes if n.level == 0]
+        result += "\nSection summaries:\n"
+        for node in sections:
+            result += f"- [chunks {node.chunk_start}-{node.chunk_end}] {node.summary}\n"
+    return result
+
+
+def backfill_summaries(summarizer=None):
+    """Build summary trees for contracts uploaded before summaries existed"""
+    db = SessionLocal()
+    try:
+        summarized = db.query(ContractSummary.contract_id).distinct()
+        contracts = db.query(Contract).filter(~Contract.id.in_(summarized)).all()
+        print(f"📝 {len(contracts)} contract(s) without a summary tree")
+        for contract in contracts:
+            chunks = [
+                row.chunk_text for row in db.query(ContractChunk.chunk_text).filter(
+                    ContractChunk.contract_id == contract.id
+                ).order_by(ContractChunk.chunk_index)
+            ]
+            summarize_contract(db, contract, chunks, summarizer)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill_summaries()
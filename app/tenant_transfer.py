@@ -0,0 +1,401 @@
+import argparse
+import hashlib
+import io
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from numpy.lib import format as npy_format
+from sqlalchemy import func, insert, select, text
+
+from app.database import engine, User, Contract, ContractChunk, ContractSummary, Conversation, Message
+from app.read_replica import record_write
+
+
+# ==============================
+# Tenant Export / Import
+# ==============================
+#
+# Moves one user's contracts, chunks (text + embedding), summary trees and
+# conversations between databases without re-parsing PDFs or paying for
+# embeddings again. An export is a directory:
+#
+#   manifest.json        format version, account, row counts, embedding
+#                        dtype / dimension, sha256 of every file
+#   embeddings.npy       one row per chunk (float32, or float16 with
+#                        --float16: half the size, ranking unchanged in
+#                        practice)
+#   chunks.jsonl         chunk text / index / clause tags, same order as
+#                        embeddings.npy
+#   contracts.jsonl, summaries.jsonl, conversations.jsonl, messages.jsonl
+#
+# Export reads with server-side cursors in one REPEATABLE READ snapshot and
+# appends to the files batch by batch; embeddings are fetched in pgvector's
+# binary form (vector_send), not as text. Import memory-maps embeddings.npy
+# and loads chunks, summaries and messages with COPY, batch by batch, in one
+# transaction. Memory use doesn't grow with the tenant's size (only the
+# contract / conversation id maps do).
+#
+# The manifest holds the account's password hash, so the user can log in
+# on the target - keep exports as private as the database.
+
+FORMAT_VERSION = 1
+EMBEDDING_DIM = ContractChunk.__table__.c.embedding.type.dim
+
+FILES = ("contracts.jsonl", "chunks.jsonl", "embeddings.npy", "summaries.jsonl", "conversations.jsonl", "messages.jsonl")
+
+# Conversation.summary_message_id points at a message id; it's exported as
+# the message's position in its conversation and turned back into the new
+# id once the messages are in
+RESTORE_SUMMARY_MESSAGE = """
+    UPDATE conversations c SET summary_message_id = m.id
+    FROM (
+        SELECT id, conversation_id, row_number() OVER (PARTITION BY conversation_id ORDER BY id) AS position
+        FROM messages WHERE conversation_id = ANY(:conversation_ids)
+    ) m
+    WHERE m.conversation_id = c.id AND m.position = c.summary_message_id
+      AND c.id = ANY(:conversation_ids)
+"""
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_jsonl(path: Path, rows: Iterator[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _read_jsonl(path: Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _batches(rows: Iterator, size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------
+# Export
+# ---------------------------
+
+def _stream(conn, stmt, batch_size: int):
+    """Rows of a query through a server-side cursor"""
+    return conn.execute(stmt.execution_options(yield_per=batch_size))
+
+
+def _export_chunks(conn, user_id: int, out: Path, dtype, batch_size: int) -> int:
+    count = conn.execute(
+        select(func.count()).select_from(ContractChunk).where(ContractChunk.user_id == user_id)
+    ).scalar_one()
+    stmt = (
+        select(
+            ContractChunk.contract_id, ContractChunk.chunk_index, ContractChunk.clause_types,
+            ContractChunk.chunk_text, func.vector_send(ContractChunk.embedding).label("embedding")
+        )
+        .where(ContractChunk.user_id == user_id)
+        .order_by(ContractChunk.contract_id, ContractChunk.chunk_index)
+    )
+
+    written = 0
+    with open(out / "embeddings.npy", "wb") as vectors, open(out / "chunks.jsonl", "w", encoding="utf-8") as chunks:
+        npy_format.write_array_header_1_0(vectors, {
+            "descr": npy_format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (count, EMBEDDING_DIM),
+        })
+        for batch in _batches(_stream(conn, stmt, batch_size), batch_size):
+            # vector_send: uint16 dim, uint16 unused, then big-endian float4s
+            matrix = np.stack([np.frombuffer(row.embedding, dtype=">f4", offset=4) for row in batch])
+            vectors.write(matrix.astype(dtype).tobytes())
+            for row in batch:
+                chunks.write(json.dumps({
+                    "contract_id": row.contract_id,
+                    "chunk_index": row.chunk_index,
+                    "clause_types": row.clause_types,
+                    "text": row.chunk_text,
+                }, ensure_ascii=False) + "\n")
+            written += len(batch)
+            print(f"📦 Exported {written}/{count} chunk(s)")
+
+    if written != count:
+        raise RuntimeError(f"Expected {count} chunks, read {written}")
+    return count
+
+
+def export_tenant(user_id: int, out_dir: str, float16: bool = False, conversations: bool = True, batch_size: int = 5000) -> dict:
+    """
+    Write a user's data to out_dir (see the format above).
+
+    Args:
+        user_id: tenant to export
+        out_dir: directory to create (must not hold an export already)
+        float16: store embeddings as float16
+        conversations: include conversations and messages
+        batch_size: rows fetched per round trip
+
+    Returns:
+        The manifest
+    """
+    out = Path(out_dir)
+    if (out / "manifest.json").exists():
+        raise FileExistsError(f"{out} already holds an export")
+    out.mkdir(parents=True, exist_ok=True)
+    dtype = np.float16 if float16 else np.float32
+    start = time.time()
+
+    # One snapshot for every file, so chunks match contracts and the count
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        user = conn.execute(select(User.email, User.hashed_password).where(User.id == user_id)).first()
+        if user is None:
+            raise ValueError(f"User {user_id} not found")
+
+        counts = {}
+        contracts = (
+            select(Contract.id, Contract.filename, Contract.upload_date, Contract.num_chunks)
+            .where(Contract.user_id == user_id).order_by(Contract.id)
+        )
+        counts["contracts"] = _write_jsonl(out / "contracts.jsonl", (
+            {"id": c.id, "filename": c.filename, "upload_date": _timestamp(c.upload_date), "num_chunks": c.num_chunks}
+            for c in _stream(conn, contracts, batch_size)
+        ))
+        counts["chunks"] = _export_chunks(conn, user_id, out, dtype, batch_size)
+
+        summaries = (
+            select(
+                ContractSummary.contract_id, ContractSummary.level, ContractSummary.position,
+                ContractSummary.chunk_start, ContractSummary.chunk_end, ContractSummary.summary,
+                ContractSummary.created_at
+            )
+            .join(Contract, Contract.id == ContractSummary.contract_id)
+            .where(Contract.user_id == user_id).order_by(ContractSummary.id)
+        )
+        counts["summaries"] = _write_jsonl(out / "summaries.jsonl", (
+            {
+                "contract_id": s.contract_id, "level": s.level, "position": s.position,
+                "chunk_start": s.chunk_start, "chunk_end": s.chunk_end, "summary": s.summary,
+                "created_at": _timestamp(s.created_at),
+            }
+            for s in _stream(conn, summaries, batch_size)
+        ))
+
+        if conversations:
+            summary_position = (
+                select(func.count())
+                .where(Message.conversation_id == Conversation.id, Message.id <= Conversation.summary_message_id)
+                .correlate(Conversation).scalar_subquery()
+            )
+            stmt = (
+                select(
+                    Conversation.id, Conversation.contract_id, Conversation.created_at, Conversation.updated_at,
+                    Conversation.summary, Conversation.summary_message_id, summary_position.label("summary_position")
+                )
+                .where(Conversation.user_id == user_id).order_by(Conversation.id)
+            )
+            counts["conversations"] = _write_jsonl(out / "conversations.jsonl", (
+                {
+                    "id": row.id, "contract_id": row.contract_id, "created_at": _timestamp(row.created_at),
+                    "updated_at": _timestamp(row.updated_at), "summary": row.summary,
+                    "summary_position": row.summary_position if row.summary_message_id else None,
+                }
+                for row in _stream(conn, stmt, batch_size)
+            ))
+            messages = (
+                select(Message.conversation_id, Message.role, Message.content, Message.created_at)
+                .join(Conversation, Conversation.id == Message.conversation_id)
+                .where(Conversation.user_id == user_id).order_by(Message.conversation_id, Message.id)
+            )
+            counts["messages"] = _write_jsonl(out / "messages.jsonl", (
+                {"conversation_id": m.conversation_id, "role": m.role, "content": m.content, "created_at": _timestamp(m.created_at)}
+                for m in _stream(conn, messages, batch_size)
+            ))
+        else:
+            counts["conversations"] = _write_jsonl(out / "conversations.jsonl", iter(()))
+            counts["messages"] = _write_jsonl(out / "messages.jsonl", iter(()))
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "user": {"id": user_id, "email": user.email, "hashed_password": user.hashed_password},
+        "embedding": {"dim": EMBEDDING_DIM, "dtype": np.dtype(dtype).name},
+        "counts": counts,
+        "sha256": {name: _sha256(out / name) for name in FILES},
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    size_mb = sum((out / name).stat().st_size for name in FILES) / 1e6
+    print(
+        f"✅ Exported user {user_id}: {counts['contracts']} contract(s), {counts['chunks']} chunk(s), "
+        f"{counts['messages']} message(s) - {size_mb:.1f} MB in {time.time() - start:.1f}s"
+    )
+    return manifest
+
+
+# ---------------------------
+# Import
+# ---------------------------
+
+def _copy_value(value) -> str:
+    """One column in COPY text format"""
+    if value is None:
+        return r"\N"
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def _pg_array(values: Optional[List[str]]) -> Optional[str]:
+    if values is None:
+        return None
+    quoted = ('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return "{" + ",".join(quoted) + "}"
+
+
+def _copy(cursor, table: str, columns: List[str], rows: List[tuple]):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _check(src: Path, manifest: dict, verify: bool):
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported export format {manifest.get('format')}")
+    if manifest["embedding"]["dim"] != EMBEDDING_DIM:
+        raise ValueError(f"Export has {manifest['embedding']['dim']}-d embeddings, this database stores {EMBEDDING_DIM}-d")
+    if verify:
+        for name, digest in manifest["sha256"].items():
+            if _sha256(src / name) != digest:
+                raise ValueError(f"{name} doesn't match its checksum - the export is damaged")
+
+
+def import_tenant(src_dir: str, email: Optional[str] = None, batch_size: int = 5000, verify: bool = True) -> int:
+    """
+    Load an export into this database, as a new user or appended to an
+    existing one. All or nothing: one transaction.
+
+    Args:
+        src_dir: export directory
+        email: target account (default: the exported one); created with the
+            exported password hash if it doesn't exist
+        batch_size: rows per COPY
+        verify: check the files against the manifest's checksums first
+
+    Returns:
+        The target user id
+    """
+    src = Path(src_dir)
+    manifest = json.loads((src / "manifest.json").read_text())
+    _check(src, manifest, verify)
+    email = email or manifest["user"]["email"]
+    start = time.time()
+
+    embeddings = np.load(src / "embeddings.npy", mmap_mode="r")
+    if embeddings.shape != (manifest["counts"]["chunks"], EMBEDDING_DIM):
+        raise ValueError(f"embeddings.npy has shape {embeddings.shape}, manifest says {manifest['counts']['chunks']} chunks")
+    vector_format = "[" + ",".join(["%.9g"] * EMBEDDING_DIM) + "]"
+
+    with engine.begin() as conn:
+        user_id = conn.execute(select(User.id).where(User.email == email)).scalar()
+        if user_id is None:
+            user_id = conn.execute(
+                insert(User).values(email=email, hashed_password=manifest["user"]["hashed_password"]).returning(User.id)
+            ).scalar_one()
+            print(f"👤 Created user {email} (ID: {user_id})")
+        cursor = conn.connection.driver_connection.cursor()
+
+        contract_ids: Dict[int, int] = {}
+        for contract in _read_jsonl(src / "contracts.jsonl"):
+            contract_ids[contract["id"]] = conn.execute(insert(Contract).values(
+                user_id=user_id, filename=contract["filename"], num_chunks=contract["num_chunks"],
+                upload_date=contract["upload_date"]
+            ).returning(Contract.id)).scalar_one()
+
+        imported = 0
+        for batch in _batches(_read_jsonl(src / "chunks.jsonl"), batch_size):
+            vectors = np.asarray(embeddings[imported:imported + len(batch)], dtype=np.float32)
+            _copy(cursor, "contract_chunks", ["user_id", "contract_id", "chunk_index", "clause_types", "chunk_text", "embedding"], [
+                (user_id, contract_ids[c["contract_id"]], c["chunk_index"], _pg_array(c["clause_types"]), c["text"],
+                 vector_format % tuple(vector.tolist()))
+                for c, vector in zip(batch, vectors)
+            ])
+            imported += len(batch)
+            print(f"📥 Imported {imported}/{len(embeddings)} chunk(s)")
+
+        for batch in _batches(_read_jsonl(src / "summaries.jsonl"), batch_size):
+            _copy(cursor, "contract_summaries", ["contract_id", "level", "position", "chunk_start", "chunk_end", "summary", "created_at"], [
+                (contract_ids[s["contract_id"]], s["level"], s["position"], s["chunk_start"], s["chunk_end"], s["summary"], s["created_at"])
+                for s in batch
+            ])
+
+        conversation_ids: Dict[int, int] = {}
+        for conversation in _read_jsonl(src / "conversations.jsonl"):
+            # summary_message_id holds the message position until the messages are in
+            conversation_ids[conversation["id"]] = conn.execute(insert(Conversation).values(
+                user_id=user_id, contract_id=contract_ids.get(conversation["contract_id"]),
+                created_at=conversation["created_at"], updated_at=conversation["updated_at"],
+                summary=conversation["summary"], summary_message_id=conversation["summary_position"]
+            ).returning(Conversation.id)).scalar_one()
+
+        for batch in _batches(_read_jsonl(src / "messages.jsonl"), batch_size):
+            _copy(cursor, "messages", ["conversation_id", "role", "content", "created_at"], [
+                (conversation_ids[m["conversation_id"]], m["role"], m["content"], m["created_at"]) for m in batch
+            ])
+        if conversation_ids:
+            conn.execute(text(RESTORE_SUMMARY_MESSAGE), {"conversation_ids": list(conversation_ids.values())})
+
+    record_write(user_id)
+    print(
+        f"✅ Imported {len(contract_ids)} contract(s), {imported} chunk(s) and {len(conversation_ids)} "
+        f"conversation(s) into user {user_id} in {time.time() - start:.1f}s"
+    )
+    return user_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / import a tenant's contracts, embeddings and conversations")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write a user's data to a directory")
+    export_parser.add_argument("--user-id", type=int, required=True)
+    export_parser.add_argument("--out", required=True, help="export directory")
+    export_parser.add_argument("--float16", action="store_true", help="store embeddings as float16 (half the size)")
+    export_parser.add_argument("--no-conversations", action="store_true", help="only contracts, chunks and summaries")
+    export_parser.add_argument("--batch-size", type=int, default=5000, help="rows fetched per round trip")
+
+    import_parser = commands.add_parser("import", help="load an export into this database")
+    import_parser.add_argument("src", help="export directory")
+    import_parser.add_argument("--email", help="target account (default: the exported one)")
+    import_parser.add_argument("--batch-size", type=int, default=5000, help="rows per COPY")
+    import_parser.add_argument("--no-verify", action="store_true", help="skip the checksum check")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_tenant(args.user_id, args.out, args.float16, not args.no_conversations, args.batch_size)
+    else:
+        import_tenant(args.src, args.email, args.batch_size, not args.no_verify)
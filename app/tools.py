@@ -1,22 +1,219 @@
 from langchain.tools import tool
+from langchain_core.tools import BaseTool, StructuredTool
 from langchain_tavily import TavilySearch
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.hybrid_search import hybrid_search, rerank_chunks
-from app.database import Contract
-from typing import Dict, List
+from app.hybrid_search import hybrid_search_tenant, hybrid_search, rerank_chunks, ahybrid_search_tenant, arerank_chunks
+from app.database import Contract, ContractSummary, release_connection
+from app.read_replica import read_session, aread_session
+from app.web_cache import WebSearchCache, get_web_search_cache
+from app.config import settings
+from app.metrics import span
+from app.deadline import DeadlineExceeded, clamp_timeout, has_time_for
+from app.context_packing import pack_chunks, chunk_range
+from app.summarizer import load_summary_trees, format_summary_tree, summary_tree_query, group_summary_nodes
+from app.clause_classifier import query_clause_types
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextvars import ContextVar, copy_context
+from collections import defaultdict
+from typing import Dict, List, Optional
+import asyncio
+import time
+
+
+def _report_progress(stage: str, **details):
+    """
+    Send a progress event to a streaming client (see stream_smart_agent).
+    Does nothing when the tool isn't running inside a streamed agent.
+    """
+    try:
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+    except Exception:
+        return
+    writer({"event": "progress", "stage": stage, **details})
 
 
 # ---------------------------
-# Web Search Tool
+# Tool Timeouts + Parallel Tool Trace
 # ---------------------------
+#
+# When the model asks for several tools in one step (e.g. document search +
+# web search), the agent's ToolNode runs them concurrently and returns the
+# results in tool-call order. Every tool is wrapped with with_timeout so one
+# slow tool can't hold up the others, and each run is recorded in the
+# current turn's trace so we can see how much wall-clock the overlap saved.
+#
+# A timed-out tool keeps running in its worker thread after the turn has
+# moved on (threads can't be cancelled), so tools must never use the
+# request's Session - the DB tools open and close their own per call.
+
+_tool_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="tool")
+
+_tool_trace: ContextVar[Optional[list]] = ContextVar("tool_trace", default=None)
+
+
+def start_tool_trace() -> list:
+    """Start recording tool runs for the current agent turn"""
+    trace = []
+    _tool_trace.set(trace)
+    return trace
+
+
+def report_tool_trace(trace: list) -> float:
+    """
+    Print per-step tool timings: sequential cost vs actual wall-clock.
+    Returns total seconds saved by running tools in parallel.
+    """
+    steps = defaultdict(list)
+    for entry in trace:
+        steps[entry["step"]].append(entry)
+    
+    total_saved = 0.0
+    for step, entries in steps.items():
+        sequential = sum(e["end"] - e["start"] for e in entries)
+        wall = max(e["end"] for e in entries) - min(e["start"] for e in entries)
+        saved = sequential - wall
+        total_saved += saved
+        tools = ", ".join(
+            f"{e['tool']}={(e['end'] - e['start']) * 1000:.0f}ms{' (timeout)' if e['timed_out'] else ''}"
+            for e in entries
+        )
+        print(f"⏱️ Tool step {step}: {tools} | wall {wall * 1000:.0f}ms, saved {saved * 1000:.0f}ms")
+    
+    if trace:
+        print(f"⏱️ Parallel tool execution saved {total_saved * 1000:.0f}ms this turn")
+    return total_saved
+
+
+def _record_tool_run(name: str, start: float, end: float, timed_out: bool):
+    trace = _tool_trace.get()
+    if trace is None:
+        return
+    try:
+        from langgraph.config import get_config
+        step = get_config()["metadata"].get("langgraph_step")
+    except Exception:
+        step = None
+    trace.append({"tool": name, "step": step, "start": start, "end": end, "timed_out": timed_out})
+
+
+def _timeout_message(name: str, timeout: float) -> str:
+    return f"⏱️ {name} timed out after {timeout:.0f}s. Answer with the information you already have, or try a narrower query."
 
-def create_web_search_tool():
-    return TavilySearch(
-        max_results=3,
-        search_depth="basic"
+
+def _skipped_message(name: str) -> str:
+    return f"⏭️ {name} was skipped because this request is almost out of time. Answer now with the information you already have."
+
+
+def _tool_budget(name: str, timeout: float, min_seconds: float) -> Optional[float]:
+    """
+    Tool timeout clamped to the request deadline (keeping time back for the
+    final answer). None when there isn't enough time left to run the tool.
+    """
+    budget = clamp_timeout(timeout, reserve=settings.DEADLINE_ANSWER_RESERVE_SECONDS)
+    if budget < max(min_seconds, 0.001):
+        print(f"⏭️ Skipping {name}: only {budget:.1f}s of the request budget left for tools")
+        return None
+    return budget
+
+
+def with_timeout(base_tool: BaseTool, timeout: float, min_seconds: float = 0.0) -> BaseTool:
+    """
+    Wrap a tool so it returns a timeout message instead of holding up the turn.
+    Keeps the tool's name, description and arguments.
+    
+    The timeout is also clamped to the request deadline; when less than
+    min_seconds would be left the tool is skipped altogether.
+    """
+    name = base_tool.name
+    
+    def run(**kwargs):
+        budget = _tool_budget(name, timeout, min_seconds)
+        if budget is None:
+            return _skipped_message(name)
+        start = time.perf_counter()
+        # copy_context keeps the stream writer, trace and deadline visible in the worker thread
+        future = _tool_executor.submit(copy_context().run, base_tool.invoke, kwargs)
+        try:
+            with span(f"tool_{name}"):
+                return future.result(timeout=budget)
+        except FuturesTimeoutError:
+            print(f"⏱️ {name} timed out after {budget:.0f}s")
+            return _timeout_message(name, budget)
+        finally:
+            _record_tool_run(name, start, time.perf_counter(), not future.done())
+    
+    async def arun(**kwargs):
+        budget = _tool_budget(name, timeout, min_seconds)
+        if budget is None:
+            return _skipped_message(name)
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            with span(f"tool_{name}"):
+                return await asyncio.wait_for(base_tool.ainvoke(kwargs), budget)
+        except asyncio.TimeoutError:
+            timed_out = True
+            print(f"⏱️ {name} timed out after {budget:.0f}s")
+            return _timeout_message(name, budget)
+        finally:
+            _record_tool_run(name, start, time.perf_counter(), timed_out)
+    
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=name,
+        description=base_tool.description,
+        args_schema=base_tool.args_schema
     )
 
 
+# ---------------------------
+# Web Search Tool
+# ---------------------------
+
+def create_web_search_tool(backend=None, cache: Optional[WebSearchCache] = None):
+    """
+    Web search tool with a TTL cache in front of Tavily.
+    
+    Args:
+        backend: anything with .invoke({"query": ...}) - defaults to TavilySearch
+        cache: WebSearchCache to use - defaults to the shared one
+    """
+    if backend is None:
+        backend = TavilySearch(
+            max_results=3,
+            search_depth="basic",
+            **({"api_base_url": settings.TAVILY_BASE_URL} if settings.TAVILY_BASE_URL else {})
+        )
+    
+    if not settings.WEB_CACHE_ENABLED and cache is None:
+        return backend
+    
+    cache = cache or get_web_search_cache()
+    search_params = {
+        "max_results": getattr(backend, "max_results", None),
+        "search_depth": getattr(backend, "search_depth", None),
+    }
+    
+    @tool
+    def tavily_search(query: str):
+        """
+        Search the web for legal definitions, industry standards, legal
+        background context and comparisons to typical practice.
+        
+        Args:
+            query: The search query
+        """
+        return cache.get_or_fetch(
+            {"query": query, **search_params},
+            lambda: backend.invoke({"query": query})
+        )
+    
+    return tavily_search
+
+
 # ---------------------------
 # Single Contract Search Tool
 # ---------------------------
@@ -36,25 +233,32 @@ def create_contract_search_tool(db: Session, contract_id: int):
         try:
             # Hybrid search
             print(f"🔍 Running hybrid search for: {query}")
+            _report_progress("searching_documents")
             candidates = hybrid_search(
                 db=db,
                 query=query,
                 contract_id=contract_id,
-                top_k=10
+                top_k=10,
+                clause_types=_clause_filter(query)
             )
+            release_connection(db)
 
             if not candidates:
                 return "No relevant information found in the contract."
 
             # Rerank
             print(f"🎯 Reranking {len(candidates)} candidates...")
+            _report_progress("reranking", candidates=len(candidates))
             reranked = rerank_chunks(query, candidates, top_k=5)
 
+            # Merge neighbouring chunks, drop repeated overlap, fit the budget
+            passages = pack_chunks(reranked, _token_budget("search_contract"), "search_contract")
+
             # Format results
             result = "Found the following relevant sections from the contract:\n\n"
-            for i, chunk in enumerate(reranked, 1):
-                result += f"[Section {i}] (Relevance: {chunk.get('rerank_score', 0):.2f}):\n"
-                result += f"{chunk['text']}\n\n"
+            for i, passage in enumerate(passages, 1):
+                result += f"[Section {i}]{chunk_range(passage)} (Relevance: {passage['score']:.2f}):\n"
+                result += f"{passage['text']}\n\n"
 
             return result
 
@@ -64,14 +268,24 @@ def create_contract_search_tool(db: Session, contract_id: int):
     return search_contract
 
 
+def _clause_filter(query: str) -> List[str]:
+    """Clause types to pre-filter the search on (empty = search every chunk)"""
+    clause_types = query_clause_types(query)
+    if clause_types:
+        print(f"🏷️ Filtering on clause types: {', '.join(clause_types)}")
+    return clause_types
+
+
 # ---------------------------
 # Multi-Document Search Tool (NEW)
 # ---------------------------
 
-def create_multi_document_search_tool(db: Session, user_id: int):
+def create_multi_document_search_tool(user_id: int):
     """
     Search across ALL user's documents intelligently.
     This is the MAIN tool for document queries.
+    Each call uses its own read session, so concurrent or timed-out calls
+    never share one.
     """
     
     @tool
@@ -94,61 +308,282 @@ def create_multi_document_search_tool(db: Session, user_id: int):
         """
         
         try:
-            # Get all user's contracts
-            user_contracts = db.query(Contract).filter(
-                Contract.user_id == user_id
-            ).all()
+            db = read_session(user_id)
+            try:
+                # Get all user's contracts
+                user_contracts = db.query(Contract).filter(
+                    Contract.user_id == user_id
+                ).all()
+                release_connection(db)
             
-            if not user_contracts:
-                return "❌ You have no documents uploaded yet. Please upload a PDF document first, then I can help analyze it!"
+                if not user_contracts:
+                    return "❌ You have no documents uploaded yet. Please upload a PDF document first, then I can help analyze it!"
             
-            print(f"📚 Searching across {len(user_contracts)} document(s)")
+                print(f"📚 Searching across {len(user_contracts)} document(s)")
+                _report_progress("searching_documents", documents=len(user_contracts))
+                clause_types = _clause_filter(query)
             
-            # Search across all contracts
-            all_results = []
-            
-            for contract in user_contracts:
+                # One search over the user's partition covers every contract
+                all_results = []
+                stopped_at = None
                 try:
-                    # Hybrid search on this contract
-                    candidates = hybrid_search(db, query, contract.id, top_k=5)
+                    if not has_time_for(settings.DEADLINE_SEARCH_MIN_SECONDS):
+                        raise DeadlineExceeded("No time left to search documents")
+                    candidates = hybrid_search_tenant(
+                        db, query, user_id, top_k=settings.TENANT_SEARCH_TOP_K, clause_types=clause_types
+                    )
+                    # Not held through the rerank
+                    release_connection(db)
                     
                     if candidates:
-                        # Rerank
-                        reranked = rerank_chunks(query, candidates, top_k=3)
-                        
-                        # Add source info
-                        for chunk in reranked:
-                            chunk['source_document'] = contract.filename
-                            chunk['contract_id'] = contract.id
-                        
-                        all_results.extend(reranked)
-                        
-                except Exception as e:
-                    print(f"⚠️ Error searching {contract.filename}: {str(e)}")
-                    continue
+                        _report_progress("reranking", candidates=len(candidates))
+                        all_results = _with_sources(rerank_chunks(query, candidates, top_k=5), user_contracts)
+                
+                except DeadlineExceeded as e:
+                    print(f"⏱️ {str(e)}")
+                    stopped_at = 0
             
-            if not all_results:
-                doc_names = [c.filename for c in user_contracts]
-                return f"❌ No relevant information found in your {len(user_contracts)} document(s): {', '.join(doc_names)}"
+            finally:
+                db.close()
             
-            # Sort by relevance score
-            all_results.sort(key=lambda x: x.get('rerank_score', 0), reverse=True)
+            return _format_multi_document_results(all_results, user_contracts, stopped_at)
             
-            # Take top 5 across all documents
-            top_results = all_results[:5]
+        except Exception as e:
+            return f"❌ Error searching documents: {str(e)}"
+    
+    return search_all_my_documents
+
+
+def _with_sources(chunks: List[Dict], user_contracts: List[Contract]) -> List[Dict]:
+    """Add the source document name to tenant-wide search results"""
+    filenames = {c.id: c.filename for c in user_contracts}
+    sourced = []
+    for chunk in chunks:
+        # Uploaded after the contract list was read - skip rather than guess its name
+        if chunk['contract_id'] not in filenames:
+            continue
+        chunk['source_document'] = filenames[chunk['contract_id']]
+        sourced.append(chunk)
+    return sourced
+
+
+def _format_multi_document_results(
+    all_results: List[Dict],
+    user_contracts: List[Contract],
+    stopped_at: Optional[int] = None
+) -> str:
+    """
+    Pick the top 5 chunks across all documents and format them for the LLM.
+    stopped_at is the number of documents searched when the request deadline
+    cut the search short (None if all were searched).
+    """
+    if stopped_at is not None:
+        print(f"⏱️ Search stopped at the request deadline after {stopped_at}/{len(user_contracts)} document(s)")
+        note = (
+            f"\n⏱️ Only {stopped_at} of {len(user_contracts)} document(s) could be searched in the time available. "
+            "Answer with what was found."
+        )
+    else:
+        note = ""
+    
+    if not all_results:
+        doc_names = [c.filename for c in user_contracts]
+        return f"❌ No relevant information found in your {len(user_contracts)} document(s): {', '.join(doc_names)}" + note
+    
+    # Sort by relevance score
+    all_results.sort(key=lambda x: x.get('rerank_score', 0), reverse=True)
+    
+    # Take top 5 across all documents
+    top_results = all_results[:5]
+    
+    # Merge neighbouring chunks, drop repeated overlap, fit the budget
+    passages = pack_chunks(top_results, _token_budget("search_all_my_documents"), "search_all_my_documents")
+    
+    # Format results (grouped by document, in document order)
+    result = f"✅ Found relevant information across your documents:\n\n"
+    
+    for i, passage in enumerate(passages, 1):
+        result += f"--- Result {i} ---\n"
+        result += f"📄 Source: {passage['source_document']}{chunk_range(passage)}\n"
+        result += f"📊 Relevance: {passage['score']:.2f}\n\n"
+        result += f"{passage['text']}\n\n"
+    
+    return result + note
+
+
+def _token_budget(tool_name: str) -> int:
+    return settings.TOOL_TOKEN_BUDGETS.get(tool_name, 1000)
+
+
+# ---------------------------
+# Async Multi-Document Search Tool (ASYNC_MODE)
+# ---------------------------
+
+def create_async_multi_document_search_tool(user_id: int):
+    """
+    Async version of create_multi_document_search_tool for agent.astream.
+    Each call uses its own AsyncSession (sessions can't be shared between
+    concurrent tool calls).
+    """
+    
+    @tool
+    async def search_all_my_documents(query: str) -> str:
+        """
+        Search across ALL documents uploaded by the user.
+        Use this when the user asks about their contracts, documents, files, or any content they uploaded.
+        
+        Examples:
+        - "What does my contract say?"
+        - "Summarize all my documents"
+        - "What termination clauses do I have?"
+        - "Search my files for payment terms"
+        
+        Args:
+            query: The search query
             
-            # Format results
-            result = f"✅ Found relevant information across your documents:\n\n"
+        Returns:
+            Relevant information from all user's documents with source attribution
+        """
+        
+        try:
+            async with aread_session(user_id) as db:
+                user_contracts = (await db.execute(
+                    select(Contract).where(Contract.user_id == user_id)
+                )).scalars().all()
+                
+                if not user_contracts:
+                    return "❌ You have no documents uploaded yet. Please upload a PDF document first, then I can help analyze it!"
+                
+                print(f"📚 Searching across {len(user_contracts)} document(s)")
+                _report_progress("searching_documents", documents=len(user_contracts))
+                clause_types = _clause_filter(query)
+                
+                all_results = []
+                stopped_at = None
+                try:
+                    if not has_time_for(settings.DEADLINE_SEARCH_MIN_SECONDS):
+                        raise DeadlineExceeded("No time left to search documents")
+                    candidates = await ahybrid_search_tenant(
+                        db, query, user_id, top_k=settings.TENANT_SEARCH_TOP_K, clause_types=clause_types
+                    )
+                    
+                    if candidates:
+                        _report_progress("reranking", candidates=len(candidates))
+                        all_results = _with_sources(await arerank_chunks(query, candidates, top_k=5), user_contracts)
+                
+                except DeadlineExceeded as e:
+                    print(f"⏱️ {str(e)}")
+                    stopped_at = 0
             
-            for i, chunk in enumerate(top_results, 1):
-                result += f"--- Result {i} ---\n"
-                result += f"📄 Source: {chunk['source_document']}\n"
-                result += f"📊 Relevance: {chunk.get('rerank_score', 0):.2f}\n\n"
-                result += f"{chunk['text']}\n\n"
+            return _format_multi_document_results(all_results, user_contracts, stopped_at)
+        
+        except Exception as e:
+            return f"❌ Error searching documents: {str(e)}"
+    
+    return search_all_my_documents
+
+
+# ---------------------------
+# Document Summary Tool
+# ---------------------------
+
+def _matching_contracts(contracts: List[Contract], document_name: str) -> List[Contract]:
+    """Contracts whose filename contains document_name (all of them if it's empty or matches none)"""
+    name = document_name.strip().lower()
+    if not name:
+        return contracts
+    matches = [c for c in contracts if name in c.filename.lower()]
+    return matches or contracts
+
+
+def _format_document_summaries(contracts: List[Contract], trees: Dict[int, List[ContractSummary]], include_sections: bool) -> str:
+    summarized = [c for c in contracts if trees.get(c.id)]
+    if not summarized:
+        return "❌ No precomputed summary is available for these documents yet. Use search_all_my_documents instead."
+    
+    # Section summaries only for a single document - keeps the output small
+    include_sections = include_sections and len(summarized) == 1
+    result = "✅ Precomputed document summaries:\n\n"
+    for contract in summarized:
+        result += format_summary_tree(contract.filename, trees[contract.id], include_sections) + "\n"
+    
+    missing = [c.filename for c in contracts if not trees.get(c.id)]
+    if missing:
+        result += f"(Summaries still being prepared for: {', '.join(missing)})\n"
+    return result
+
+
+def create_document_summary_tool(user_id: int):
+    """
+    Serve summary/overview questions from the summary trees built at upload
+    (app/summarizer.py) - one query instead of several search rounds.
+    Own read session per call, like create_multi_document_search_tool.
+    """
+    
+    @tool
+    def get_document_summary(document_name: str = "", include_sections: bool = False) -> str:
+        """
+        Get the precomputed summary of the user's documents.
+        Use this FIRST for "summarize my contract", "give me an overview", "what is this document about" questions.
+        
+        Args:
+            document_name: Part of the filename to summarize one document (empty = all documents)
+            include_sections: Also return section-by-section summaries (for detailed overviews of one document)
             
-            return result
+        Returns:
+            Document summaries, optionally with section summaries
+        """
+        try:
+            db = read_session(user_id)
+            try:
+                user_contracts = db.query(Contract).filter(Contract.user_id == user_id).all()
+                if not user_contracts:
+                    return "❌ You have no documents uploaded yet. Please upload a PDF document first, then I can help analyze it!"
+                
+                contracts = _matching_contracts(user_contracts, document_name)
+                _report_progress("loading_summaries", documents=len(contracts))
+                trees = load_summary_trees(db, [c.id for c in contracts])
+            finally:
+                db.close()
+            return _format_document_summaries(contracts, trees, include_sections)
+        
+        except Exception as e:
+            return f"❌ Error loading document summaries: {str(e)}"
+    
+    return get_document_summary
+
+
+def create_async_document_summary_tool(user_id: int):
+    """Async version of create_document_summary_tool (own AsyncSession per call)"""
+    
+    @tool
+    async def get_document_summary(document_name: str = "", include_sections: bool = False) -> str:
+        """
+        Get the precomputed summary of the user's documents.
+        Use this FIRST for "summarize my contract", "give me an overview", "what is this document about" questions.
+        
+        Args:
+            document_name: Part of the filename to summarize one document (empty = all documents)
+            include_sections: Also return section-by-section summaries (for detailed overviews of one document)
             
+        Returns:
+            Document summaries, optionally with section summaries
+        """
+        try:
+            async with aread_session(user_id) as db:
+                user_contracts = (await db.execute(
+                    select(Contract).where(Contract.user_id == user_id)
+                )).scalars().all()
+                if not user_contracts:
+                    return "❌ You have no documents uploaded yet. Please upload a PDF document first, then I can help analyze it!"
+                
+                contracts = _matching_contracts(user_contracts, document_name)
+                _report_progress("loading_summaries", documents=len(contracts))
+                nodes = (await db.execute(summary_tree_query([c.id for c in contracts]))).scalars().all()
+            
+            return _format_document_summaries(contracts, group_summary_nodes(nodes), include_sections)
+        
         except Exception as e:
-            return f"❌ Error searching documents: {str(e)}"
+            return f"❌ Error loading document summaries: {str(e)}"
     
-    return search_all_my_documents
\ No newline at end of file
+    return get_document_summary
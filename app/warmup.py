@@ -0,0 +1,178 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.metrics import record_warmup
+from app.worker_role import needs_component
+
+
+# ==============================
+# Startup Warmup
+# ==============================
+#
+# The reranker, Cohere clients and LLM are created lazily, so the first
+# /query after a deploy or scale-up pays for loading torch and the
+# CrossEncoder. With WARMUP_ENABLED the lifespan hook loads them in the
+# background instead, runs one dummy inference (first-call kernel setup,
+# buffer allocation) and opens the pool's connections. /health returns 503
+# until that has finished, so a load balancer or readiness probe keeps
+# traffic away from a cold worker.
+#
+# A component that fails to warm up is logged and skipped - it still loads
+# lazily on first use - and doesn't keep the worker unready.
+
+_SELECT_ONE = text("SELECT 1")
+
+_state: Dict[str, object] = {
+    "ready": not settings.WARMUP_ENABLED,
+    "timings": {},
+    "errors": {},
+}
+
+
+# ---------------------------
+# Components
+# ---------------------------
+
+def _warm_reranker():
+    from app.hybrid_search import get_reranker
+    get_reranker().predict([("warmup query", "warmup passage")])
+
+
+def _warm_clause_model():
+    if settings.CLAUSE_CLASSIFIER_BACKEND != "model":
+        return
+    from app.clause_classifier import get_clause_model
+    model, _ = get_clause_model()
+    model.encode(["warmup"], normalize_embeddings=True)
+
+
+def _warm_cohere():
+    from app.embeddingmaker import get_cohere_client, get_async_cohere_client
+    get_cohere_client()
+    get_async_cohere_client()
+
+
+def _warm_llm():
+    from app.llm import get_llm
+    get_llm()
+
+
+def _prime_pool(engine, connections: int):
+    """Check out `connections` connections at once so the pool keeps them open"""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(_SELECT_ONE)
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def _warm_db():
+    from app.database import engine
+    from app.read_replica import get_replica_engine
+
+    connections = _pool_connections()
+    _prime_pool(engine, connections)
+    replica = get_replica_engine()
+    if replica is not None:
+        _prime_pool(replica, connections)
+
+
+async def _awarm_db():
+    """Async engine's pool (ASYNC_MODE) - the sync one is primed by _warm_db"""
+    if not settings.ASYNC_MODE:
+        return
+    from app.database import get_async_engine
+
+    async_engine = get_async_engine()
+    opened = []
+    try:
+        for _ in range(_pool_connections()):
+            conn = await async_engine.connect()
+            opened.append(conn)
+            await conn.execute(_SELECT_ONE)
+    finally:
+        for conn in opened:
+            await conn.close()
+
+
+def _pool_connections() -> int:
+    # PgBouncer mode has no app-side pool - one round trip checks the database
+    if settings.DB_PGBOUNCER:
+        return 1
+    return max(1, min(settings.WARMUP_DB_CONNECTIONS or settings.DB_POOL_SIZE, settings.DB_POOL_SIZE))
+
+
+COMPONENTS = {
+    "reranker": [_warm_reranker],
+    "clause_model": [_warm_clause_model],
+    "cohere": [_warm_cohere],
+    "llm": [_warm_llm],
+    "db": [_warm_db, _awarm_db],
+}
+
+
+# ---------------------------
+# Public API
+# ---------------------------
+
+def is_ready() -> bool:
+    return bool(_state["ready"])
+
+
+def warmup_status() -> dict:
+    """Readiness plus per-component warmup timings (seconds) and errors"""
+    return {
+        "ready": is_ready(),
+        "timings": dict(_state["timings"]),
+        "errors": dict(_state["errors"]),
+    }
+
+
+def _component_names() -> List[str]:
+    names = [name.strip() for name in settings.WARMUP_COMPONENTS.split(",") if name.strip()]
+    unknown = [name for name in names if name not in COMPONENTS]
+    if unknown:
+        print(f"⚠️ Unknown warmup component(s) ignored: {', '.join(unknown)}")
+    # Components this worker's role never uses stay unloaded
+    return [name for name in names if name in COMPONENTS and needs_component(name)]
+
+
+async def warm_up(components: Optional[List[str]] = None):
+    """
+    Load and exercise each component, then mark the worker ready.
+
+    Args:
+        components: names from COMPONENTS (default WARMUP_COMPONENTS)
+    """
+    components = _component_names() if components is None else components
+    print(f"🔥 Warming up: {', '.join(components)}")
+    total_start = time.perf_counter()
+
+    for name in components:
+        start = time.perf_counter()
+        try:
+            for step in COMPONENTS[name]:
+                if asyncio.iscoroutinefunction(step):
+                    await step()
+                else:
+                    # Off the event loop, so /health keeps answering meanwhile
+                    await asyncio.to_thread(step)
+        except Exception as e:
+            _state["errors"][name] = str(e)[:200]
+            print(f"⚠️ Warmup of {name} failed (it will load on first use): {str(e)[:200]}")
+            continue
+        seconds = time.perf_counter() - start
+        _state["timings"][name] = round(seconds, 3)
+        record_warmup(name, seconds)
+        print(f"✅ Warmed up {name} in {seconds:.2f}s")
+
+    _state["ready"] = True
+    print(f"✅ Warmup finished in {time.perf_counter() - total_start:.2f}s - ready for traffic")
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+
+
+# ==============================
+# Web Search Result Cache
+# ==============================
+#
+# Two tiers: an in-memory LRU for this process and a SQLite file that
+# survives restarts. An entry is:
+#   fresh  (age < ttl)              -> served from cache
+#   stale  (ttl <= age < ttl+stale) -> served from cache, refreshed in background
+#   expired                         -> fetched again before answering
+#
+# The SQLite tier is best effort: a locked, full or unwritable file is
+# logged and counted (disk_errors), and the cache carries on from memory.
+# Every prune_every writes, rows past ttl+stale are deleted from it.
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def make_cache_key(params: Dict[str, Any]) -> str:
+    """Stable key from the normalized query plus the other search parameters"""
+    normalized = dict(params)
+    normalized["query"] = normalize_query(normalized.get("query", ""))
+    raw = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class WebSearchCache:
+    """TTL cache with memory + SQLite tiers and stale-while-revalidate"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        stale_seconds: float,
+        max_entries: int = 1000,
+        path: Optional[str] = None,
+        prune_every: int = 200
+    ):
+        self.ttl = ttl_seconds
+        self.stale = stale_seconds
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._disk_writes = 0
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="web-cache")
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "disk_errors": 0,
+        }
+
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS web_cache ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_web_cache_stored_at ON web_cache (stored_at)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Web search cache file {path} unavailable, caching in memory only: {str(e)}")
+                self._db = None
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+
+    def get_or_fetch(self, params: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for these search params, calling fetch()
+        on a miss. Stale results are returned immediately and refreshed in
+        the background.
+        """
+        key = make_cache_key(params)
+        now = time.time()
+
+        entry = self._get_memory(key)
+        tier = "memory_hits"
+        if entry is None or now - entry[1] >= self.ttl:
+            # Another worker may have stored a newer result on disk
+            disk_entry = self._get_disk(key)
+            if disk_entry is not None and (entry is None or disk_entry[1] > entry[1]):
+                entry = disk_entry
+                tier = "disk_hits"
+                self._put_memory(key, entry[0], entry[1])
+
+        if entry is not None:
+            value, stored_at = entry
+            age = now - stored_at
+            if age < self.ttl:
+                self._count(tier)
+                return value
+            if age < self.ttl + self.stale:
+                self._count("stale_hits")
+                self._refresh_in_background(key, fetch)
+                return value
+
+        self._count("misses")
+        value = fetch()
+        self._store(key, value)
+        return value
+
+    def hit_rate(self) -> float:
+        """Share of lookups answered from cache (fresh or stale)"""
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["stale_hits"]
+            total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus hit rate, for logging and metrics"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["hit_rate"] = round(self.hit_rate(), 3)
+        return stats
+
+    # ---------------------------
+    # Tiers
+    # ---------------------------
+
+    def _get_memory(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _put_memory(self, key: str, value: Any, stored_at: float):
+        with self._lock:
+            self._memory[key] = (value, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, key: str) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM web_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._disk_error("read", e)
+            return None
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            return None
+
+    def _store(self, key: str, value: Any):
+        # Don't cache failed searches
+        if isinstance(value, dict) and value.get("error"):
+            return
+        stored_at = time.time()
+        self._put_memory(key, value, stored_at)
+        if self._db is None:
+            return
+        try:
+            payload = json.dumps(value, default=str)
+        except (TypeError, ValueError):
+            return
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO web_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, payload, stored_at)
+                )
+                self._db.commit()
+                self._disk_writes += 1
+                if self.prune_every > 0 and self._disk_writes % self.prune_every == 0:
+                    self._prune_disk(stored_at)
+        except sqlite3.Error as e:
+            self._disk_error("write", e)
+
+    def _prune_disk(self, now: float):
+        """Delete rows too old to be served even stale (caller holds the lock)"""
+        deleted = self._db.execute(
+            "DELETE FROM web_cache WHERE stored_at < ?", (now - (self.ttl + self.stale),)
+        ).rowcount
+        self._db.commit()
+        if deleted:
+            print(f"🧹 Pruned {deleted} expired web search cache row(s)")
+
+    def _disk_error(self, operation: str, error: Exception):
+        """SQLite tier failed - the value is still served / kept in memory"""
+        self._count("disk_errors")
+        print(f"⚠️ Web search cache {operation} failed, using memory only for this entry: {str(error)}")
+
+    # ---------------------------
+    # Background refresh
+    # ---------------------------
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Any]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresh_executor.submit(self._refresh, key, fetch)
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]):
+        try:
+            self._store(key, fetch())
+            self._count("refreshes")
+        except Exception as e:
+            self._count("refresh_errors")
+            print(f"⚠️ Web search cache refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+
+_web_search_cache = None
+_web_search_cache_lock = threading.Lock()
+
+
+def get_web_search_cache() -> WebSearchCache:
+    """Get or initialize the shared web search cache (singleton)"""
+    global _web_search_cache
+    # Concurrent tool calls must not each open their own SQLite connection
+    with _web_search_cache_lock:
+        if _web_search_cache is None:
+            _web_search_cache = WebSearchCache(
+                ttl_seconds=settings.WEB_CACHE_TTL_SECONDS,
+                stale_seconds=settings.WEB_CACHE_STALE_SECONDS,
+                max_entries=settings.WEB_CACHE_MAX_ENTRIES,
+                path=settings.WEB_CACHE_PATH or None,
+                prune_every=settings.WEB_CACHE_PRUNE_EVERY
+            )
+    return _web_search_cache
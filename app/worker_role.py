@@ -0,0 +1,64 @@
+from typing import Dict, Optional, Set
+
+from app.config import settings
+
+
+# ==============================
+# Worker Roles
+# ==============================
+#
+# WORKER_ROLE decides which routes a process serves. Heavy dependencies are
+# imported where they are first used, so a dedicated worker never loads the
+# stacks its routes don't need:
+#
+#   all     every route (default)
+#   api     auth, health, listings and deletes - no LangChain, Cohere, PDF
+#           parsing or torch
+#   ingest  api + /upload (pypdf, text splitter, Cohere embeddings; the
+#           background summary loads the LLM)
+#   search  api + /query, /query/stream (LangChain agent, Gemini, Cohere,
+#           reranker / torch)
+#
+# Route /upload and /query* to the matching pools at the proxy or ingress.
+
+ALL = "all"
+API = "api"
+INGEST = "ingest"
+SEARCH = "search"
+
+ROLES = (ALL, API, INGEST, SEARCH)
+
+# Paths only served by one role (everything else is served by all of them)
+ROLE_PATHS: Dict[str, Set[str]] = {
+    INGEST: {"/upload"},
+    SEARCH: {"/query", "/query/stream"},
+}
+
+# Warmup components each role uses (None = all of them)
+ROLE_WARMUP: Dict[str, Optional[Set[str]]] = {
+    ALL: None,
+    API: {"db"},
+    INGEST: {"clause_model", "cohere", "db"},
+    SEARCH: {"reranker", "cohere", "llm", "db"},
+}
+
+
+def current_role() -> str:
+    role = settings.WORKER_ROLE.strip().lower()
+    if role not in ROLES:
+        raise ValueError(f"Unknown WORKER_ROLE: {settings.WORKER_ROLE} (expected one of {', '.join(ROLES)})")
+    return role
+
+
+def serves_path(path: str) -> bool:
+    """Does this worker serve the route with this path?"""
+    role = current_role()
+    if role == ALL:
+        return True
+    return all(path not in paths for owner, paths in ROLE_PATHS.items() if owner != role)
+
+
+def needs_component(name: str) -> bool:
+    """Should this worker warm up the component?"""
+    components = ROLE_WARMUP[current_role()]
+    return components is None or name in components
@@ -0,0 +1,238 @@
+"""
+Concurrency per worker: the real sync /query path vs ASYNC_MODE.
+
+Starts the actual app (uvicorn app.main:app, one worker) once per mode,
+with Cohere, Gemini and Tavily pointed at benchmarks/fake_services.py, and
+drives /query with many concurrent users:
+
+sync  = ASYNC_MODE=false: routes.py /query, run_smart_agent, psycopg2
+        sessions. Starlette runs the handler on its threadpool, so in-flight
+        requests are capped by the threadpool tokens (40 by default).
+async = ASYNC_MODE=true: async_routes.py /query, arun_smart_agent,
+        asyncpg sessions on the event loop.
+
+Both runs use the same Postgres database, users and uploaded contracts. The
+intent router is off by default so every question goes through the agent
+(--intent-router keeps it on). Admission control is off by default too, as
+it caps in-flight /query requests in both modes (--admission keeps it on).
+
+Needs a scratch pgvector database (the app creates its tables there); no
+API keys or quota. The first run downloads the reranker model.
+
+Reports peak in-flight requests (sampled from the app's
+jurisai_http_requests_in_flight gauge), throughput, p50/p95/p99 latency and
+status codes per mode.
+
+Usage:
+    python benchmarks/async_concurrency.py --database-url postgresql://localhost/jurisai_bench
+    python benchmarks/async_concurrency.py --database-url ... --requests 400 --concurrency 200 --llm-latency fixed:1500
+    python benchmarks/async_concurrency.py --database-url ... --modes async --no-fake-services
+"""
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from contract_corpus import generate
+from load_test import login_user, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_URLS = {
+    "COHERE_BASE_URL": "http://127.0.0.1:9101/v1",
+    "GEMINI_BASE_URL": "http://127.0.0.1:9102",
+    "TAVILY_BASE_URL": "http://127.0.0.1:9103",
+}
+_IN_FLIGHT = re.compile(r"^jurisai_http_requests_in_flight ([\d.e+]+)$", re.MULTILINE)
+
+
+# ---------------------------
+# Processes
+# ---------------------------
+
+def start_fake_services(llm_latency: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, str(ROOT / "benchmarks" / "fake_services.py"), "--gemini-latency", llm_latency],
+        cwd=ROOT
+    )
+
+
+def start_app(args, async_mode: bool) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        **FAKE_URLS,
+        "DATABASE_URL": args.database_url,
+        "ASYNC_MODE": str(async_mode).lower(),
+        "ADMISSION_ENABLED": str(args.admission).lower(),
+        "INTENT_ROUTER_ENABLED": str(args.intent_router).lower(),
+        "WARMUP_ENABLED": "false",
+    }
+    # The fake services ignore keys, but settings require them
+    for key in ("GOOGLE_API_KEY", "TAVILY_API_KEY", "COHERE_API_KEY"):
+        env.setdefault(key, "fake")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--workers", "1",
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL if args.quiet else None
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"App exited during startup (code {process.returncode})")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit("App did not become healthy in time")
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ---------------------------
+# Run
+# ---------------------------
+
+async def sample_in_flight(client: httpx.AsyncClient, peak: dict, stop_event: asyncio.Event):
+    """Poll /metrics for the in-flight gauge (MetricsMiddleware skips /metrics itself)"""
+    while not stop_event.is_set():
+        try:
+            match = _IN_FLIGHT.search((await client.get("/metrics")).text)
+            if match:
+                peak["value"] = max(peak["value"], int(float(match.group(1))))
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+
+
+async def drive(client: httpx.AsyncClient, users: list, questions: list, total: int, concurrency: int) -> dict:
+    """Send `total` /query requests with at most `concurrency` outstanding"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async def one(n: int):
+        user = users[n % len(users)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/query", headers=user["headers"], json={"question": questions[n % len(questions)]}
+                )
+                statuses[response.status_code] += 1
+                if response.status_code < 400:
+                    latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                statuses["error"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(total)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "throughput": len(latencies) / elapsed, "latency": summarize(latencies), "statuses": statuses}
+
+
+async def run_mode(args, mode: str, corpus: list, questions: list, run_id: str, upload: bool) -> dict:
+    process = start_app(args, async_mode=(mode == "async"))
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout, limits=limits) as client:
+            await wait_ready(client, process)
+            users = await asyncio.gather(*(
+                login_user(client, f"async-bench-{run_id}-{i}@example.com", "async-bench-password")
+                for i in range(args.users)
+            ))
+            if upload:
+                print(f"📤 Uploading {len(corpus)} contract(s) per user...")
+                for user in users:
+                    for pdf in corpus:
+                        response = await client.post(
+                            "/upload", headers=user["headers"],
+                            files={"file": (pdf.name, pdf.read_bytes(), "application/pdf")}
+                        )
+                        response.raise_for_status()
+
+            peak = {"value": 0}
+            stop_event = asyncio.Event()
+            sampler = asyncio.create_task(sample_in_flight(client, peak, stop_event))
+            result = await drive(client, users, questions, args.requests, args.concurrency)
+            stop_event.set()
+            await sampler
+            result["peak_in_flight"] = peak["value"]
+            return result
+    finally:
+        stop(process)
+
+
+async def main_async(args):
+    run_id = uuid.uuid4().hex[:8]
+    with tempfile.TemporaryDirectory() as scratch:
+        contracts = generate(Path(scratch), args.contracts, clauses=12, seed=args.seed)
+        corpus = sorted(Path(scratch).glob("*.pdf"))
+        questions = sorted({q for c in contracts for q in c["questions"]})
+
+        fakes = None if args.no_fake_services else start_fake_services(args.llm_latency)
+        try:
+            if fakes is not None:
+                await asyncio.sleep(2)  # let the fake services bind their ports
+            print(f"📊 {args.requests} /query requests, {args.concurrency} concurrent clients, {args.users} users, one worker\n")
+            results = {}
+            for n, mode in enumerate(args.modes):
+                print(f"🚀 {mode}: starting the app...")
+                results[mode] = await run_mode(args, mode, corpus, questions, run_id, upload=(n == 0))
+        finally:
+            if fakes is not None:
+                stop(fakes)
+
+    print(f"\n{'mode':<6} {'peak in-flight':>15} {'req/s':>8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9}  statuses")
+    for mode, result in results.items():
+        latency = result["latency"]
+        statuses = " ".join(f"{code}:{n}" for code, n in sorted(result["statuses"].items(), key=lambda item: str(item[0])))
+        if latency["count"]:
+            print(
+                f"{mode:<6} {result['peak_in_flight']:>15} {result['throughput']:>8.1f} "
+                f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f}  {statuses}"
+            )
+        else:
+            print(f"{mode:<6} {result['peak_in_flight']:>15} {'-':>8} {'-':>9} {'-':>9} {'-':>9}  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="scratch pgvector database")
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50, help="requests are spread over this many users")
+    parser.add_argument("--contracts", type=int, default=2, help="contracts uploaded per user")
+    parser.add_argument("--llm-latency", default="lognormal:1500,0.3", help="fake Gemini latency spec")
+    parser.add_argument("--no-fake-services", action="store_true", help="fake_services.py is already running")
+    parser.add_argument("--admission", action="store_true", help="keep admission control on")
+    parser.add_argument("--intent-router", action="store_true", help="keep the intent router on")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--quiet", action="store_true", help="hide the app's request log")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Latency and precision of clause-type pre-filtering in document search.
+
+Builds a corpus from the sample contract sections of context_packing.py
+plus boilerplate sections (shuffled per contract), chunks it the way
+/upload does, tags every chunk with classify_chunks() and
+runs each query twice:
+  unfiltered - vector + keyword scoring over every chunk (as before)
+  filtered   - only the chunks tagged with the query's clause types
+               (what the GIN index on clause_types gives Postgres)
+
+Vector scores use a deterministic hashed bag-of-words embedding (stand-in
+for Cohere), keyword scores use term overlap, fused with the real
+reciprocal_rank_fusion(), per contract like the search tools. Precision@k
+is the share of returned chunks from the section the query asks about.
+
+With --live the real VECTOR_SQL / VECTOR_SQL_BY_CLAUSE queries are timed
+against DATABASE_URL for --contract-id (tagged chunks needed - run
+`python -m app.clause_classifier` for older uploads).
+
+Usage:
+    python benchmarks/clause_filter.py
+    python benchmarks/clause_filter.py --contracts 200
+    python benchmarks/clause_filter.py --live --contract-id 12
+"""
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.pdf_read_chunk import chunk_text  # noqa: E402
+from app.clause_classifier import classify_chunks, query_clause_types  # noqa: E402
+from app.hybrid_search import reciprocal_rank_fusion  # noqa: E402
+from context_packing import SECTIONS, QUERIES  # noqa: E402
+
+
+SECTION_CLAUSES = {
+    "Payment": "payment",
+    "Termination": "termination",
+    "Liability": "liability",
+    "Confidentiality": "confidentiality",
+    "Governing Law": "governing_law",
+    "Renewal": "renewal",
+}
+
+# Boilerplate that shares words with the queries but isn't the clause asked about
+OTHER_SECTIONS = [
+    ("Notices", [
+        "All notices under this agreement must be in writing and delivered to the addresses below.",
+        "A notice is received on the day of delivery, or three days after posting by registered mail.",
+        "Either party may change its notice address by giving written notice to the other party.",
+    ]),
+    ("Services", [
+        "The Provider shall perform the services described in each statement of work during the term.",
+        "The Provider shall protect the Client's premises and equipment while performing the services.",
+        "Each period of service is documented in a monthly report that the Client may review.",
+    ]),
+    ("Definitions", [
+        "Agreement means this services agreement including every schedule and statement of work.",
+        "Information means any data the parties exchange for the purpose of the services.",
+        "Term means the initial term and any period for which the agreement continues.",
+    ]),
+    ("Insurance", [
+        "The Provider shall maintain general insurance cover of at least two million dollars.",
+        "Insurance certificates must be provided to the Client on request during the agreement.",
+        "Who carries the insurance cost for subcontractors is agreed in each statement of work.",
+    ]),
+]
+
+Row = namedtuple("Row", "id")
+
+DIM = 1024
+
+
+def _words(text: str):
+    return re.findall(r"[a-z]{3,}", text.lower())
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed bag of words, L2 normalized (stand-in for Cohere embeddings)"""
+    vector = np.zeros(DIM, dtype=np.float32)
+    for word in _words(text):
+        vector[zlib.crc32(word.encode()) % DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def gold_clauses(chunk: str) -> set:
+    """Clause types of the sections whose sentences the chunk contains"""
+    clauses = set()
+    for title, sentences in SECTIONS:
+        if any(sentence[:40] in chunk for sentence in sentences):
+            clauses.add(SECTION_CLAUSES[title])
+    return clauses
+
+
+def contract_text(rng: random.Random) -> str:
+    """Sample contract with the clause and boilerplate sections in random order"""
+    sections = list(SECTIONS) + OTHER_SECTIONS
+    rng.shuffle(sections)
+    parts = []
+    for number, (title, sentences) in enumerate(sections, 1):
+        body = " ".join(f"{number}.{i + 1} {sentence}" for i, sentence in enumerate(sentences))
+        parts.append(f"Section {number}. {title}. {body}")
+    return "\n\n".join(parts)
+
+
+def build_corpus(contracts: int):
+    rng = random.Random(7)
+    chunks = []
+    contract_chunks = []
+    for _ in range(contracts):
+        document = chunk_text(contract_text(rng), chunk_size=500, overlap=50)
+        contract_chunks.append(list(range(len(chunks), len(chunks) + len(document))))
+        chunks.extend(document)
+    tags = classify_chunks(chunks, backend="rules")
+    return {
+        "contracts": contract_chunks,
+        "text": chunks,
+        "embeddings": np.stack([embed(c) for c in chunks]),
+        "terms": [set(_words(c)) for c in chunks],
+        "tags": [set(t) for t in tags],
+        "gold": [gold_clauses(c) for c in chunks],
+    }
+
+
+def search(corpus, chunk_ids, query: str, clause_types, top_k: int):
+    """Vector + keyword scoring over one contract's candidate chunks, fused with RRF"""
+    if clause_types:
+        wanted = set(clause_types)
+        candidates = [i for i in chunk_ids if corpus["tags"][i] & wanted] or chunk_ids
+    else:
+        candidates = chunk_ids
+
+    query_vector = embed(query)
+    scores = corpus["embeddings"][candidates] @ query_vector
+    vector_rows = [Row(candidates[i]) for i in np.argsort(-scores)[:top_k]]
+
+    query_terms = set(_words(query))
+    overlaps = [(len(query_terms & corpus["terms"][i]), i) for i in candidates]
+    keyword_rows = [Row(i) for overlap, i in sorted(overlaps, reverse=True)[:top_k] if overlap]
+
+    fused = reciprocal_rank_fusion(vector_rows, keyword_rows)
+    return [i for i, _ in sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_k]], len(candidates)
+
+
+def search_all(corpus, query: str, clause_types, top_k: int):
+    """Search every contract, like search_all_my_documents does"""
+    hits, candidates = [], 0
+    for chunk_ids in corpus["contracts"]:
+        contract_hits, contract_candidates = search(corpus, chunk_ids, query, clause_types, top_k)
+        hits.append(contract_hits)
+        candidates += contract_candidates
+    return hits, candidates
+
+
+def precision(corpus, hits, clause_types) -> float:
+    """Share of returned chunks from the asked-about section, averaged over contracts"""
+    wanted = set(clause_types)
+    return statistics.mean(
+        sum(bool(corpus["gold"][i] & wanted) for i in contract_hits) / len(contract_hits)
+        for contract_hits in hits if contract_hits
+    )
+
+
+def timed(fn, runs: int):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def run_offline(args):
+    corpus = build_corpus(args.contracts)
+    total = len(corpus["text"])
+    print(f"Corpus: {args.contracts} contract(s), {total} chunks (searched one contract at a time)\n")
+    print(f"{'query':42} {'types':16} {'cands':>6} {'ms all':>7} {'ms filt':>7} {'P@k all':>8} {'P@k filt':>8}")
+
+    totals = {"all_ms": 0.0, "filtered_ms": 0.0, "all_p": 0.0, "filtered_p": 0.0}
+    for query in QUERIES:
+        clause_types = query_clause_types(query)
+        all_ms, (all_hits, _) = timed(lambda: search_all(corpus, query, [], args.top_k), args.runs)
+        filtered_ms, (filtered_hits, candidates) = timed(lambda: search_all(corpus, query, clause_types, args.top_k), args.runs)
+
+        precision_all = precision(corpus, all_hits, clause_types)
+        precision_filtered = precision(corpus, filtered_hits, clause_types)
+
+        totals["all_ms"] += all_ms * 1000
+        totals["filtered_ms"] += filtered_ms * 1000
+        totals["all_p"] += precision_all
+        totals["filtered_p"] += precision_filtered
+        print(
+            f"{query[:42]:42} {','.join(clause_types)[:16]:16} {candidates:6d} "
+            f"{all_ms * 1000:7.2f} {filtered_ms * 1000:7.2f} {precision_all:8.2f} {precision_filtered:8.2f}"
+        )
+
+    n = len(QUERIES)
+    print(
+        f"\nMean latency: {totals['all_ms'] / n:.2f}ms -> {totals['filtered_ms'] / n:.2f}ms "
+        f"({(1 - totals['filtered_ms'] / totals['all_ms']) * 100:.0f}% faster)"
+    )
+    print(f"Mean precision@{args.top_k}: {totals['all_p'] / n:.2f} -> {totals['filtered_p'] / n:.2f}")
+
+
+def run_live(args):
+    from sqlalchemy import text
+    from app.database import SessionLocal
+    from app.hybrid_search import VECTOR_SQL, VECTOR_SQL_BY_CLAUSE
+
+    db = SessionLocal()
+    try:
+        embedding = db.execute(
+            text("SELECT embedding FROM contract_chunks WHERE contract_id = :contract_id LIMIT 1"),
+            {"contract_id": args.contract_id}
+        ).scalar()
+        if embedding is None:
+            sys.exit(f"Contract {args.contract_id} has no chunks")
+
+        print(f"{'query':42} {'types':16} {'ms all':>7} {'ms filt':>7}")
+        for query in QUERIES:
+            clause_types = query_clause_types(query)
+            params = {"query_embedding": str(list(embedding)), "contract_id": args.contract_id, "limit": args.top_k * 2}
+            all_ms, _ = timed(lambda: db.execute(VECTOR_SQL, params).fetchall(), args.runs)
+            filtered_ms, _ = timed(
+                lambda: db.execute(VECTOR_SQL_BY_CLAUSE, {**params, "clause_types": clause_types}).fetchall(),
+                args.runs
+            )
+            print(f"{query[:42]:42} {','.join(clause_types)[:16]:16} {all_ms * 1000:7.2f} {filtered_ms * 1000:7.2f}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contracts", type=int, default=50, help="copies of the sample contract in the corpus")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="time the real SQL against DATABASE_URL")
+    parser.add_argument("--contract-id", type=int, help="contract to search with --live")
+    args = parser.parse_args()
+
+    if args.live:
+        if args.contract_id is None:
+            parser.error("--live needs --contract-id")
+        run_live(args)
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
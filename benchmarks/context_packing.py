@@ -0,0 +1,202 @@
+"""
+Prompt tokens saved by context packing in the document search tool output.
+
+Chunks a document with the real chunk_text(), "retrieves" the top 5 chunks for
+each query with a simple term-overlap score (stand-in for hybrid search +
+rerank), and compares the tool output before packing (5 raw chunks) with the
+packed output search_all_my_documents returns now.
+
+A tool result is sent to the LLM again on every later agent step, so the
+saving is multiplied by --later-steps.
+
+Offline, the LLM latency effect is estimated from --prefill-ms-per-1k-tokens.
+With --live (needs GOOGLE_API_KEY and the rest of .env) each context is sent
+to Gemini --live-runs times and the median latencies are compared.
+
+Usage:
+    python benchmarks/context_packing.py
+    python benchmarks/context_packing.py --pdf contract.pdf --live
+"""
+import argparse
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.pdf_read_chunk import chunk_text, extract_text_from_pdf  # noqa: E402
+from app.memory import estimate_tokens  # noqa: E402
+from app.tools import _format_multi_document_results  # noqa: E402
+
+
+QUERIES = [
+    "What is the termination notice period?",
+    "What are the payment terms and late fees?",
+    "Who is liable for damages?",
+    "How is confidential information protected?",
+    "What law governs the agreement?",
+    "Can the agreement be renewed?",
+]
+
+SECTIONS = [
+    ("Payment", [
+        "The Client shall pay each invoice within thirty (30) days of receipt.",
+        "Payment terms for milestone invoices follow the schedule agreed in each statement of work.",
+        "Late payments accrue interest at 1.5% per month until the invoice is paid in full.",
+        "A late fee of $50 applies to any payment more than fifteen days overdue.",
+        "Disputed invoice amounts must be raised in writing before the payment due date.",
+    ]),
+    ("Termination", [
+        "Either party may terminate this Agreement for convenience with sixty (60) days written notice.",
+        "Termination for material breach requires thirty days notice and an opportunity to cure.",
+        "The notice period for termination starts on the day the notice is received.",
+        "On termination the Client pays for services performed up to the termination date.",
+        "Sections on confidentiality and liability survive termination of this Agreement.",
+    ]),
+    ("Liability", [
+        "Neither party shall be liable for indirect, special or consequential damages.",
+        "Total liability for damages is capped at the fees paid in the twelve months before the claim.",
+        "The liability cap does not apply to damages caused by gross negligence or wilful misconduct.",
+        "Each party is liable for damages caused by its own breach of data protection obligations.",
+    ]),
+    ("Confidentiality", [
+        "Each party shall protect confidential information of the other party with reasonable care.",
+        "Confidential information is protected and may only be used to perform this Agreement.",
+        "Confidential information may be disclosed to employees who need to know it and are bound by similar duties.",
+        "The duty to protect confidential information continues for five years after termination.",
+    ]),
+    ("Governing Law", [
+        "This Agreement is governed by the laws of the State of New York.",
+        "The governing law applies without regard to its conflict of law principles.",
+        "Disputes under this agreement shall be resolved by arbitration in New York City.",
+        "The agreement and any arbitration award may be enforced in any competent court.",
+    ]),
+    ("Renewal", [
+        "This Agreement renews automatically for successive one year terms.",
+        "The agreement is renewed unless either party gives notice of non-renewal ninety days before the end of the term.",
+        "Fees for a renewed term may be increased by up to five percent.",
+        "The renewed agreement continues on the same terms unless amended in writing.",
+    ]),
+]
+
+
+def sample_document(repeat: int) -> str:
+    """Contract-like text whose clauses span several 350 character chunks"""
+    parts = []
+    for n in range(repeat):
+        for title, sentences in SECTIONS:
+            number = len(parts) + 1
+            body = " ".join(f"{number}.{i + 1} {sentence}" for i, sentence in enumerate(sentences))
+            parts.append(f"Section {number}. {title}. {body}")
+    return "\n\n".join(parts)
+
+
+def _terms(text: str) -> set:
+    return set(re.findall(r"[a-z]{4,}", text.lower()))
+
+
+def retrieve(chunks, query: str, top_k: int = 5):
+    """Top chunks by query term overlap (stand-in for hybrid search + rerank)"""
+    query_terms = _terms(query)
+    scored = []
+    for index, text in enumerate(chunks):
+        score = len(query_terms & _terms(text)) + 0.01 * (len(chunks) - index) / len(chunks)
+        scored.append({
+            "chunk_index": index,
+            "text": text,
+            "rerank_score": score,
+            "contract_id": 1,
+            "source_document": "sample_contract.pdf",
+        })
+    scored.sort(key=lambda c: c["rerank_score"], reverse=True)
+    return scored[:top_k]
+
+
+def unpacked_output(results) -> str:
+    """Tool output as it was before packing: the top 5 raw chunks"""
+    output = "✅ Found relevant information across your documents:\n\n"
+    for i, chunk in enumerate(results, 1):
+        output += f"--- Result {i} ---\n"
+        output += f"📄 Source: {chunk['source_document']}\n"
+        output += f"📊 Relevance: {chunk['rerank_score']:.2f}\n\n"
+        output += f"{chunk['text']}\n\n"
+    return output
+
+
+def median_latency(llm, context: str, question: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        llm.invoke([
+            {"role": "system", "content": f"Answer from these excerpts only:\n{context}"},
+            {"role": "user", "content": question},
+        ])
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to chunk instead of the generated sample contract")
+    parser.add_argument("--repeat", type=int, default=2, help="copies of the sample sections")
+    parser.add_argument("--later-steps", type=int, default=2, help="agent steps that resend the tool output")
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=40.0)
+    parser.add_argument("--live", action="store_true", help="measure Gemini latency with both contexts")
+    parser.add_argument("--live-runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            text = extract_text_from_pdf(f)
+    else:
+        text = sample_document(args.repeat)
+    chunks = chunk_text(text)
+    print(f"Document: {len(text)} chars, {len(chunks)} chunks\n")
+
+    llm = None
+    if args.live:
+        from app.llm import get_llm
+        llm = get_llm()
+
+    totals = {"before": 0, "after": 0}
+    latency = {"before": [], "after": []}
+    print(f"{'query':45} {'before':>7} {'after':>7} {'saved':>7}")
+    for query in QUERIES:
+        results = retrieve(chunks, query)
+        before = unpacked_output(results)
+        after = _format_multi_document_results([dict(r) for r in results], [])
+        before_tokens, after_tokens = estimate_tokens(before), estimate_tokens(after)
+        totals["before"] += before_tokens
+        totals["after"] += after_tokens
+        print(f"{query[:45]:45} {before_tokens:7d} {after_tokens:7d} {before_tokens - after_tokens:7d}")
+
+        if llm is not None:
+            latency["before"].append(median_latency(llm, before, query, args.live_runs))
+            latency["after"].append(median_latency(llm, after, query, args.live_runs))
+
+    saved = totals["before"] - totals["after"]
+    per_query = saved / len(QUERIES)
+    per_query_prompt = per_query * (1 + args.later_steps)
+    print(
+        f"\nTool output tokens: {totals['before']} -> {totals['after']} "
+        f"(saved {saved}, {saved / totals['before'] * 100:.0f}%)"
+    )
+    print(
+        f"Prompt tokens saved per query: ~{per_query_prompt:.0f} "
+        f"({per_query:.0f} per tool result x {1 + args.later_steps} LLM calls)"
+    )
+    print(
+        f"Estimated LLM latency saved per query: ~{per_query_prompt * args.prefill_ms_per_1k_tokens / 1000:.1f}ms "
+        f"at {args.prefill_ms_per_1k_tokens:.0f}ms per 1k prompt tokens"
+    )
+
+    if llm is not None:
+        before_ms = statistics.mean(latency["before"]) * 1000
+        after_ms = statistics.mean(latency["after"]) * 1000
+        print(f"Measured Gemini latency: {before_ms:.0f}ms -> {after_ms:.0f}ms per call ({before_ms - after_ms:+.0f}ms saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Synthetic contract corpus for load tests.
+
+Generates seeded, realistic-looking contracts (parties, term, payment,
+termination, liability, confidentiality, governing law, ...) as small PDFs
+that pypdf can extract, plus a questions.json of questions about them. The
+PDFs are written by hand (one Helvetica text stream per page), so no PDF
+library is needed.
+
+Usage:
+    python benchmarks/contract_corpus.py --out /tmp/contracts --count 50
+    python benchmarks/contract_corpus.py --out /tmp/contracts --count 20 --clauses 25 --seed 3
+"""
+import argparse
+import json
+import random
+import textwrap
+from pathlib import Path
+
+PARTIES = [
+    "Acme Corporation", "Globex Ltd", "Initech LLC", "Umbrella Holdings", "Stark Industries",
+    "Wayne Enterprises", "Hooli Inc", "Vandelay Imports", "Soylent Foods", "Tyrell Systems",
+    "Cyberdyne GmbH", "Wonka Industries", "Oscorp Labs", "Massive Dynamic", "Aperture Science",
+]
+KINDS = [
+    "Master Services Agreement", "Software License Agreement", "Non-Disclosure Agreement",
+    "Supply Agreement", "Consulting Agreement", "Lease Agreement", "Employment Agreement",
+]
+LAWS = ["the State of New York", "the State of Delaware", "England and Wales", "the State of California", "Singapore"]
+
+CLAUSES = {
+    "Term": [
+        "This Agreement commences on the Effective Date and continues for {years} years unless terminated earlier.",
+        "After the initial term, this Agreement renews automatically for successive {renewal}-month periods.",
+    ],
+    "Payment": [
+        "The Customer shall pay the Provider a fee of ${fee:,} per year, invoiced quarterly in advance.",
+        "Invoices are due within {days} days of receipt. Late payments accrue interest at {interest}% per month.",
+    ],
+    "Termination": [
+        "Either party may terminate this Agreement for convenience with {notice} days written notice.",
+        "Either party may terminate immediately if the other party materially breaches this Agreement and "
+        "fails to cure the breach within {cure} days of notice.",
+    ],
+    "Limitation of Liability": [
+        "Neither party's aggregate liability shall exceed {cap} times the fees paid in the twelve months before the claim.",
+        "Neither party is liable for indirect, incidental, special or consequential damages, including lost profits.",
+    ],
+    "Indemnification": [
+        "The Provider shall indemnify the Customer against third-party claims that the Services infringe "
+        "intellectual property rights.",
+        "The indemnified party must give prompt notice of the claim and reasonable cooperation in its defence.",
+    ],
+    "Confidentiality": [
+        "Each party shall keep the other party's Confidential Information secret for {conf_years} years after disclosure.",
+        "Confidential Information does not include information that is public or independently developed.",
+    ],
+    "Intellectual Property": [
+        "All intellectual property created by the Provider under this Agreement is assigned to the Customer on payment.",
+        "The Provider retains ownership of its pre-existing tools, libraries and know-how.",
+    ],
+    "Data Protection": [
+        "The Provider shall process personal data only on the Customer's documented instructions.",
+        "The Provider shall notify the Customer of a personal data breach within {breach_hours} hours.",
+    ],
+    "Warranties": [
+        "The Provider warrants that the Services will be performed in a professional and workmanlike manner.",
+        "The warranty period is {warranty} days from delivery of each deliverable.",
+    ],
+    "Force Majeure": [
+        "Neither party is liable for delays caused by events beyond its reasonable control, including natural "
+        "disasters, war and epidemics.",
+    ],
+    "Non-Solicitation": [
+        "During the term and for {nonsolicit} months after, neither party shall solicit the other party's employees.",
+    ],
+    "Governing Law": [
+        "This Agreement is governed by the laws of {law}. Disputes are resolved by the courts of {law}.",
+    ],
+    "Assignment": [
+        "Neither party may assign this Agreement without the prior written consent of the other party, except "
+        "to an affiliate or successor.",
+    ],
+    "Notices": [
+        "Notices must be in writing and are effective on delivery to the addresses set out above.",
+    ],
+}
+
+QUESTIONS = {
+    "Term": "How long is the initial term of the contract?",
+    "Payment": "What are the payment terms and when are invoices due?",
+    "Termination": "How much notice is needed to terminate the agreement?",
+    "Limitation of Liability": "What is the liability cap?",
+    "Indemnification": "Who has to indemnify whom for IP claims?",
+    "Confidentiality": "How long do the confidentiality obligations last?",
+    "Intellectual Property": "Who owns the intellectual property created under the agreement?",
+    "Data Protection": "How quickly must a data breach be reported?",
+    "Warranties": "What warranties does the provider give?",
+    "Force Majeure": "What happens in case of force majeure?",
+    "Non-Solicitation": "Is there a non-solicitation clause?",
+    "Governing Law": "Which law governs the agreement?",
+    "Assignment": "Can the contract be assigned to another company?",
+    "Notices": "How must notices be sent?",
+}
+
+FILLER = [
+    "The parties shall act in good faith in performing their obligations under this section.",
+    "Nothing in this section limits the rights of either party under applicable law.",
+    "Any amendment to this section must be in writing and signed by both parties.",
+    "Headings are for convenience only and do not affect interpretation.",
+]
+
+
+def make_contract(rng: random.Random, index: int, clause_count: int) -> dict:
+    """One contract as title + numbered sections"""
+    provider, customer = rng.sample(PARTIES, 2)
+    kind = rng.choice(KINDS)
+    values = {
+        "years": rng.choice([1, 2, 3, 5]), "renewal": rng.choice([6, 12, 24]),
+        "fee": rng.randrange(20, 900) * 1000, "days": rng.choice([15, 30, 45, 60]),
+        "interest": rng.choice([1, 1.5, 2]), "notice": rng.choice([30, 60, 90]),
+        "cure": rng.choice([10, 15, 30]), "cap": rng.choice(["one", "two", "three"]),
+        "conf_years": rng.choice([2, 3, 5]), "breach_hours": rng.choice([24, 48, 72]),
+        "warranty": rng.choice([30, 90, 180]), "nonsolicit": rng.choice([6, 12, 24]),
+        "law": rng.choice(LAWS),
+    }
+    names = list(CLAUSES)
+    headings = rng.sample(names, min(clause_count, len(names)))
+    # Longer contracts repeat clause types (amendments, schedules)
+    headings += [rng.choice(names) for _ in range(clause_count - len(headings))]
+
+    sections = []
+    answers = {}
+    for number, heading in enumerate(headings, start=1):
+        sentences = [s.format(**values) for s in CLAUSES[heading]]
+        answers.setdefault(heading, []).extend(sentences)
+        sentences += rng.sample(FILLER, rng.randint(1, 3))
+        sections.append((f"{number}. {heading}", " ".join(sentences)))
+
+    return {
+        "filename": f"contract_{index:04d}.pdf",
+        "title": f"{kind} between {provider} and {customer}",
+        "preamble": f"This {kind} is entered into by {provider} (the Provider) and {customer} (the Customer).",
+        "sections": sections,
+        "clause_types": sorted(set(headings)),
+        "answers": answers,  # clause type -> the sentences that answer its question
+    }
+
+
+def contract_lines(contract: dict, width: int = 90) -> list:
+    lines = [contract["title"], "", *textwrap.wrap(contract["preamble"], width), ""]
+    for heading, body in contract["sections"]:
+        lines += [heading, *textwrap.wrap(body, width), ""]
+    return lines
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, lines: list, lines_per_page: int = 50):
+    """Minimal PDF: one text stream per page, Helvetica 10pt"""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    # Objects: 1 catalog, 2 pages, 3 font, then page + content per page
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for n, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * n, 5 + 2 * n
+        kids.append(f"{page_id} 0 R")
+        text = "".join(f"({_escape(line)}) Tj T*\n" for line in page_lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 800 Td\n{text}ET".encode("latin-1", "replace")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (obj_id, objects[obj_id])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for obj_id in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def generate(out_dir: Path, count: int, clauses: int, seed: int) -> list:
+    """Write count PDFs + questions.json to out_dir; returns the contract metadata"""
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    contracts = []
+    for index in range(count):
+        contract = make_contract(rng, index, clauses)
+        write_pdf(out_dir / contract["filename"], contract_lines(contract))
+        contracts.append({
+            "filename": contract["filename"],
+            "title": contract["title"],
+            "questions": [QUESTIONS[c] for c in contract["clause_types"]],
+        })
+    (out_dir / "questions.json").write_text(json.dumps(contracts, indent=2))
+    return contracts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--clauses", type=int, default=12, help="sections per contract")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    contracts = generate(Path(args.out), args.count, args.clauses, args.seed)
+    print(f"📄 Wrote {len(contracts)} contracts to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
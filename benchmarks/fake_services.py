@@ -0,0 +1,310 @@
+"""
+Local stand-ins for Cohere, Gemini and Tavily, for load tests that don't
+spend API quota.
+
+Each service is a small FastAPI app speaking just enough of the real REST API
+for the SDKs the app uses:
+  cohere  POST /v1/embed                       deterministic 1024-d embeddings
+                                               (hashed bag of words, so texts
+                                               sharing words are close)
+  gemini  POST /v1beta/models/{m}:generateContent
+          POST /v1beta/models/{m}:streamGenerateContent (SSE)
+                                               calls the document search tool
+                                               once when tools are offered,
+                                               then answers from the tool
+                                               output
+  tavily  POST /search                         canned results per query
+
+Latency is drawn from a configurable distribution per service, and a share of
+requests fails (503) with --error-rate. Everything is seeded, so runs repeat.
+
+Latency specs: fixed:MS | uniform:MIN_MS,MAX_MS | lognormal:MEDIAN_MS,SIGMA
+
+Point the app at them with:
+    COHERE_BASE_URL=http://localhost:9101/v1
+    GEMINI_BASE_URL=http://localhost:9102
+    TAVILY_BASE_URL=http://localhost:9103
+
+Usage:
+    python benchmarks/fake_services.py
+    python benchmarks/fake_services.py --gemini-latency lognormal:900,0.4 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import uuid
+import zlib
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIM = 1024
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class Latency:
+    """Seeded latency distribution parsed from a spec string"""
+
+    def __init__(self, spec: str, seed: int):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.rng = random.Random(seed)
+
+    def sample(self) -> float:
+        """Seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(self.params[0], self.params[1])
+        else:
+            median, sigma = self.params
+            ms = self.rng.lognormvariate(np.log(median), sigma)
+        return ms / 1000
+
+
+class Behaviour:
+    """Latency + error injection shared by a service's endpoints"""
+
+    def __init__(self, latency: str, error_rate: float, seed: int):
+        self.latency = Latency(latency, seed)
+        self.error_rate = error_rate
+        self.errors = random.Random(seed + 1)
+
+    async def delay(self, scale: float = 1.0):
+        await asyncio.sleep(self.latency.sample() * scale)
+
+    def failed(self) -> bool:
+        return self.errors.random() < self.error_rate
+
+
+def _unavailable():
+    return JSONResponse({"message": "fake service: injected error"}, status_code=503)
+
+
+# ---------------------------
+# Cohere
+# ---------------------------
+
+def embed_text(text: str) -> list:
+    """Unit vector: sum of a fixed random vector per word"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        seed = zlib.crc32(word.encode("utf-8"))
+        vector += np.random.default_rng(seed).standard_normal(EMBEDDING_DIM, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).round(6).tolist()
+
+
+def cohere_app(behaviour: Behaviour) -> FastAPI:
+    app = FastAPI(title="fake cohere")
+
+    @app.post("/v1/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        texts = body.get("texts", [])
+        # Batches take longer, like the real API
+        await behaviour.delay(1 + len(texts) / 96)
+        if behaviour.failed():
+            return _unavailable()
+        return {
+            "response_type": "embeddings_floats",
+            "id": str(uuid.uuid4()),
+            "embeddings": [embed_text(text) for text in texts],
+            "texts": texts,
+            "meta": {"api_version": {"version": "1"}, "billed_units": {"input_tokens": sum(len(t.split()) for t in texts)}},
+        }
+
+    return app
+
+
+# ---------------------------
+# Gemini
+# ---------------------------
+
+def _texts(parts) -> str:
+    return " ".join(part.get("text", "") for part in parts if "text" in part)
+
+
+def _last_question(contents) -> str:
+    for content in reversed(contents):
+        if content.get("role") == "user":
+            text = _texts(content.get("parts", []))
+            if text:
+                return text
+    return ""
+
+
+def _tool_outputs(contents) -> list:
+    """Function responses sent after the last user question"""
+    outputs = []
+    for content in reversed(contents):
+        parts = content.get("parts", [])
+        if content.get("role") == "user" and _texts(parts):
+            break
+        outputs.extend(part["functionResponse"] for part in parts if "functionResponse" in part)
+    return outputs
+
+
+def _pick_tool(tools) -> str:
+    names = [fn["name"] for tool in tools for fn in tool.get("functionDeclarations", tool.get("function_declarations", []))]
+    for preferred in ("search_all_my_documents", "search_contract"):
+        if preferred in names:
+            return preferred
+    return names[0] if names else ""
+
+
+def gemini_reply(body: dict, answer_words: int) -> dict:
+    """Deterministic model turn: one tool call, then an answer from its output"""
+    contents = body.get("contents", [])
+    question = _last_question(contents)
+    tool = _pick_tool(body.get("tools", []))
+
+    outputs = _tool_outputs(contents)
+    if tool and not outputs:
+        part = {"functionCall": {"name": tool, "args": {"query": question}}}
+    else:
+        source = " ".join(json.dumps(o.get("response", {})) for o in outputs) or question
+        words = _WORD.findall(source.lower())
+        rng = random.Random(hashlib.sha256(question.encode("utf-8")).hexdigest())
+        picked = [rng.choice(words) for _ in range(answer_words)] if words else ["ok"]
+        part = {"text": "Based on your documents: " + " ".join(picked) + "."}
+
+    prompt_tokens = sum(len(json.dumps(c)) for c in contents) // 4
+    output_tokens = len(json.dumps(part)) // 4
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [part]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+        "modelVersion": "fake-gemini",
+    }
+
+
+def gemini_app(behaviour: Behaviour, answer_words: int, stream_chunks: int) -> FastAPI:
+    app = FastAPI(title="fake gemini")
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate(version: str, model_action: str, request: Request):
+        body = await request.json()
+        if behaviour.failed():
+            await behaviour.delay(0.2)
+            return _unavailable()
+        reply = gemini_reply(body, answer_words)
+
+        if not model_action.endswith(":streamGenerateContent"):
+            await behaviour.delay()
+            return reply
+
+        async def events():
+            # Time to first token, then the rest of the latency spread over the chunks
+            await behaviour.delay(0.3)
+            part = reply["candidates"][0]["content"]["parts"][0]
+            if "text" not in part:
+                yield f"data: {json.dumps(reply)}\r\n\r\n"
+                return
+            words = part["text"].split(" ")
+            size = max(1, len(words) // stream_chunks)
+            for start in range(0, len(words), size):
+                chunk = json.loads(json.dumps(reply))
+                chunk["candidates"][0]["content"]["parts"] = [{"text": " ".join(words[start:start + size]) + " "}]
+                if start + size < len(words):
+                    chunk["candidates"][0].pop("finishReason")
+                    chunk.pop("usageMetadata")
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                await behaviour.delay(0.7 / stream_chunks)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+# ---------------------------
+# Tavily
+# ---------------------------
+
+def tavily_app(behaviour: Behaviour) -> FastAPI:
+    app = FastAPI(title="fake tavily")
+
+    @app.post("/search")
+    async def search(request: Request):
+        body = await request.json()
+        await behaviour.delay()
+        if behaviour.failed():
+            return _unavailable()
+        query = body.get("query", "")
+        rng = random.Random(query)
+        results = [
+            {
+                "title": f"{query.title()} - guide {i + 1}",
+                "url": f"https://example.com/{rng.randrange(10 ** 6)}",
+                "content": f"Typical practice for {query}: parties usually agree on "
+                           f"{rng.choice(['30', '60', '90'])} days notice and a liability cap of "
+                           f"{rng.choice(['one', 'two'])} times the annual fees.",
+                "score": round(0.9 - i * 0.1, 2),
+                "raw_content": None,
+            }
+            for i in range(body.get("max_results", 3))
+        ]
+        return {
+            "query": query, "follow_up_questions": None, "answer": None,
+            "images": [], "results": results, "response_time": 0.1,
+        }
+
+    return app
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+
+async def serve(apps):
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        for app, host, port in apps
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--cohere-port", type=int, default=9101)
+    parser.add_argument("--gemini-port", type=int, default=9102)
+    parser.add_argument("--tavily-port", type=int, default=9103)
+    parser.add_argument("--cohere-latency", default="lognormal:120,0.3")
+    parser.add_argument("--gemini-latency", default="lognormal:1200,0.4")
+    parser.add_argument("--tavily-latency", default="lognormal:600,0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--answer-words", type=int, default=60)
+    parser.add_argument("--stream-chunks", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    apps = [
+        (cohere_app(Behaviour(args.cohere_latency, args.error_rate, args.seed)), args.host, args.cohere_port),
+        (gemini_app(Behaviour(args.gemini_latency, args.error_rate, args.seed + 10), args.answer_words, args.stream_chunks),
+         args.host, args.gemini_port),
+        (tavily_app(Behaviour(args.tavily_latency, args.error_rate, args.seed + 20)), args.host, args.tavily_port),
+    ]
+    print(
+        f"Fake services on {args.host}: cohere :{args.cohere_port}, gemini :{args.gemini_port}, "
+        f"tavily :{args.tavily_port}"
+    )
+    asyncio.run(serve(apps))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Startup time and memory of one API worker per WORKER_ROLE.
+
+For each role, starts fresh interpreters that import app.main (what uvicorn
+does before serving) and report:
+  import ms  - time to import app.main (median of --runs)
+  total ms   - interpreter start to app ready, including Python's own startup
+  RSS MB     - resident memory after the import
+  stacks     - which heavy dependencies got loaded (torch, LangChain, ...)
+
+--slowest N also prints the N slowest top-level app modules (python -X
+importtime) for the first role, to find what to defer next. --warm runs the
+role's warmup too (downloads/loads models and needs the real services), to
+show what a ready worker costs.
+
+Needs the usual environment (.env or DATABASE_URL, API keys) - nothing is
+contacted unless --warm is given.
+
+Usage:
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --roles api search --runs 5
+    python benchmarks/importtime.py --roles search --slowest 15
+    python benchmarks/importtime.py --warm
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ROLES = ["all", "api", "ingest", "search"]
+
+STACKS = {
+    "torch": "torch",
+    "sentence_transformers": "sentence-transformers",
+    "langchain": "langchain",
+    "langchain_core": "langchain-core",
+    "langchain_google_genai": "gemini",
+    "cohere": "cohere",
+    "pypdf": "pypdf",
+    "langchain_text_splitters": "text-splitters",
+    "langchain_tavily": "tavily",
+}
+
+# Runs in the child interpreter
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter() - start
+if {warm}:
+    import asyncio
+    from app.warmup import warm_up
+    asyncio.run(warm_up())
+rss_kb = 0
+with open("/proc/self/status") as status:
+    for line in status:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+print(json.dumps({{
+    "import_s": imported,
+    "rss_mb": rss_kb / 1024,
+    "modules": sorted(name for name in {stacks!r} if name in sys.modules),
+}}))
+"""
+
+
+def probe(role: str, warm: bool, importtime: bool = False):
+    env = dict(os.environ, WORKER_ROLE=role, PYTHONPATH=str(ROOT))
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", PROBE.format(warm=warm, stacks=list(STACKS))]
+
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    total = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"WORKER_ROLE={role} failed:\n{result.stderr[-2000:]}")
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["total_s"] = total
+    return stats, result.stderr
+
+
+def slowest_modules(stderr: str, count: int):
+    """(cumulative ms, module) of the slowest app.* imports and their direct imports"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if depth <= 2 and (name.startswith("app.") or depth <= 1):
+            rows.append((int(cumulative) / 1000, name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", nargs="+", choices=ROLES, default=ROLES)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="also run the role's startup warmup")
+    parser.add_argument("--slowest", type=int, default=0, help="show the N slowest imports of the first role")
+    args = parser.parse_args()
+
+    print(f"{'role':8} {'import ms':>10} {'total ms':>9} {'RSS MB':>7}  stacks")
+    for role in args.roles:
+        runs = [probe(role, args.warm)[0] for _ in range(args.runs)]
+        loaded = ", ".join(STACKS[name] for name in runs[-1]["modules"]) or "-"
+        print(
+            f"{role:8} {statistics.median(r['import_s'] for r in runs) * 1000:10.0f} "
+            f"{statistics.median(r['total_s'] for r in runs) * 1000:9.0f} "
+            f"{statistics.median(r['rss_mb'] for r in runs):7.0f}  {loaded}"
+        )
+
+    if args.slowest:
+        _, stderr = probe(args.roles[0], args.warm, importtime=True)
+        print(f"\nSlowest imports (WORKER_ROLE={args.roles[0]}, cumulative):")
+        for ms, name in slowest_modules(stderr, args.slowest):
+            print(f"{ms:8.0f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Load test: drive a running API with many users and report latency per
+endpoint and per pipeline stage.
+
+Phases:
+  1. sign up / log in --users test users
+  2. each user uploads --uploads-per-user PDFs from --corpus
+     (benchmarks/contract_corpus.py output)
+  3. for --duration seconds, --concurrency clients send a weighted mix of
+     /query, /query/stream, /my-contracts and /conversations as random users
+
+Reports throughput, status codes (429 = shed by admission control) and
+p50/p95/p99 per endpoint, plus p50/p95/p99 per stage from the Server-Timing
+header the API returns (embed, db, rerank, llm, admission_wait, ...).
+
+Offline setup (no API quota spent), see benchmarks/fake_services.py:
+    python benchmarks/fake_services.py &
+    python benchmarks/contract_corpus.py --out /tmp/contracts --count 40
+    COHERE_BASE_URL=http://localhost:9101/v1 GEMINI_BASE_URL=http://localhost:9102 \\
+    TAVILY_BASE_URL=http://localhost:9103 uvicorn app.main:app --port 8000 &
+    python benchmarks/load_test.py --corpus /tmp/contracts --users 20 --duration 60
+
+Usage:
+    python benchmarks/load_test.py --corpus /tmp/contracts
+    python benchmarks/load_test.py --corpus /tmp/contracts --mix query=5,stream=1,contracts=2,conversations=2
+    python benchmarks/load_test.py --corpus /tmp/contracts --skip-upload --json results.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import httpx
+
+_TIMING = re.compile(r"([\w.\-]+);dur=([\d.]+)")
+
+ENDPOINTS = {
+    "query": ("POST", "/query"),
+    "stream": ("POST", "/query/stream"),
+    "contracts": ("GET", "/my-contracts"),
+    "conversations": ("GET", "/conversations"),
+}
+
+FALLBACK_QUESTIONS = [
+    "What is the termination notice period?",
+    "What is the liability cap?",
+    "When are invoices due?",
+    "Which law governs the agreement?",
+]
+
+
+class Recorder:
+    """Latencies, status codes and Server-Timing stages per endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.stages = defaultdict(lambda: defaultdict(list))
+        self.first_byte = []
+
+    def record(self, endpoint: str, status: int, seconds: float, server_timing: str = ""):
+        self.statuses[endpoint][status] += 1
+        if status < 400:
+            self.latencies[endpoint].append(seconds)
+            for stage, ms in _TIMING.findall(server_timing or ""):
+                if stage != "total":
+                    self.stages[endpoint][stage].append(float(ms) / 1000)
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+    }
+
+
+# ---------------------------
+# Phases
+# ---------------------------
+
+async def login_user(client: httpx.AsyncClient, email: str, password: str) -> dict:
+    response = await client.post("/auth/signup", json={"email": email, "password": password})
+    if response.status_code not in (200, 400):  # 400 = already registered
+        response.raise_for_status()
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    body = response.json()
+    return {"user_id": body["user_id"], "headers": {"Authorization": f"Bearer {body['access_token']}"}}
+
+
+async def upload(client: httpx.AsyncClient, user: dict, pdf: Path, recorder: Recorder):
+    start = time.perf_counter()
+    response = await client.post(
+        "/upload", headers=user["headers"],
+        files={"file": (pdf.name, pdf.read_bytes(), "application/pdf")},
+    )
+    recorder.record("upload", response.status_code, time.perf_counter() - start, response.headers.get("server-timing"))
+
+
+async def call(client: httpx.AsyncClient, endpoint: str, user: dict, question: str, recorder: Recorder):
+    method, path = ENDPOINTS[endpoint]
+    start = time.perf_counter()
+    if endpoint == "stream":
+        async with client.stream("POST", path, headers=user["headers"], json={"question": question}) as response:
+            first = None
+            async for _ in response.aiter_bytes():
+                if first is None:
+                    first = time.perf_counter() - start
+            if first is not None and response.status_code < 400:
+                recorder.first_byte.append(first)
+            # Trailing stages (llm) happen after the headers, so only the ones before streaming show up
+            recorder.record(endpoint, response.status_code, time.perf_counter() - start, response.headers.get("server-timing"))
+        return
+    if method == "POST":
+        response = await client.post(path, headers=user["headers"], json={"question": question})
+    else:
+        response = await client.get(path, headers=user["headers"], params={"limit": 20})
+    recorder.record(endpoint, response.status_code, time.perf_counter() - start, response.headers.get("server-timing"))
+
+
+async def run_phase(jobs, concurrency: int):
+    """Run coroutine factories with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(job):
+        async with semaphore:
+            await job()
+
+    await asyncio.gather(*(guarded(job) for job in jobs))
+
+
+async def run_mix(client, users, questions, mix, duration, concurrency, recorder, rng):
+    names, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(names, weights)[0]
+            user = rng.choice(users)
+            try:
+                await call(client, endpoint, user, rng.choice(questions), recorder)
+            except httpx.HTTPError as e:
+                recorder.record(endpoint, 599, 0.0)
+                print(f"⚠️ {endpoint}: {type(e).__name__}")
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+def report(recorder: Recorder, elapsed: dict) -> dict:
+    results = {"endpoints": {}, "stages": {}}
+    print(f"\n{'endpoint':14} {'ok':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for endpoint in sorted(recorder.statuses):
+        stats = summarize(recorder.latencies[endpoint])
+        phase = "upload" if endpoint == "upload" else "mix"
+        stats["throughput"] = stats["count"] / elapsed[phase] if elapsed.get(phase) else 0.0
+        stats["statuses"] = dict(recorder.statuses[endpoint])
+        results["endpoints"][endpoint] = stats
+        statuses = " ".join(f"{code}:{n}" for code, n in sorted(stats["statuses"].items()))
+        if stats["count"]:
+            print(
+                f"{endpoint:14} {stats['count']:6d} {stats['throughput']:7.1f} {stats['p50'] * 1000:8.0f} "
+                f"{stats['p95'] * 1000:8.0f} {stats['p99'] * 1000:8.0f}  {statuses}"
+            )
+        else:
+            print(f"{endpoint:14} {0:6d} {'-':>7} {'-':>8} {'-':>8} {'-':>8}  {statuses}")
+
+    if recorder.first_byte:
+        stats = summarize(recorder.first_byte)
+        results["stream_first_byte"] = stats
+        print(
+            f"{'stream 1st byte':14} {stats['count']:6d} {'':7} {stats['p50'] * 1000:8.0f} "
+            f"{stats['p95'] * 1000:8.0f} {stats['p99'] * 1000:8.0f}"
+        )
+
+    print(f"\n{'endpoint':14} {'stage':18} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint in sorted(recorder.stages):
+        results["stages"][endpoint] = {}
+        for stage, values in sorted(recorder.stages[endpoint].items()):
+            stats = summarize(values)
+            results["stages"][endpoint][stage] = stats
+            print(
+                f"{endpoint:14} {stage:18} {stats['count']:6d} {stats['p50'] * 1000:8.1f} "
+                f"{stats['p95'] * 1000:8.1f} {stats['p99'] * 1000:8.1f}"
+            )
+    return results
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    elapsed = {}
+    corpus = Path(args.corpus) if args.corpus else None
+    pdfs = sorted(corpus.glob("*.pdf")) if corpus else []
+    questions = FALLBACK_QUESTIONS
+    if corpus and (corpus / "questions.json").exists():
+        questions = sorted({q for c in json.loads((corpus / "questions.json").read_text()) for q in c["questions"]})
+
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        run_id = args.run_id or uuid.uuid4().hex[:8]
+        print(f"👥 Logging in {args.users} users (run {run_id})...")
+        users = await asyncio.gather(*(
+            login_user(client, f"loadtest-{run_id}-{i}@example.com", args.password) for i in range(args.users)
+        ))
+
+        if not args.skip_upload:
+            if not pdfs:
+                raise SystemExit("No PDFs to upload - pass --corpus (or --skip-upload)")
+            jobs = [
+                (lambda user=user, pdf=pdfs[(i * args.uploads_per_user + n) % len(pdfs)]:
+                    upload(client, user, pdf, recorder))
+                for i, user in enumerate(users) for n in range(args.uploads_per_user)
+            ]
+            print(f"📤 Uploading {len(jobs)} contracts...")
+            start = time.perf_counter()
+            await run_phase(jobs, args.concurrency)
+            elapsed["upload"] = time.perf_counter() - start
+
+        print(f"🔥 Running mix {args.mix} for {args.duration:.0f}s at concurrency {args.concurrency}...")
+        start = time.perf_counter()
+        await run_mix(client, users, questions, args.mix, args.duration, args.concurrency, recorder, rng)
+        elapsed["mix"] = time.perf_counter() - start
+
+    results = report(recorder, elapsed)
+    results["config"] = {
+        "users": args.users, "concurrency": args.concurrency, "duration": args.duration,
+        "mix": args.mix, "elapsed": elapsed,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"\n💾 Wrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--corpus", help="directory from benchmarks/contract_corpus.py")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--uploads-per-user", type=int, default=2)
+    parser.add_argument("--skip-upload", action="store_true", help="reuse the contracts of an earlier run (with --run-id)")
+    parser.add_argument("--run-id", help="user name suffix; reuse to log in the same users again")
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of mixed traffic")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("query=6,stream=1,contracts=2,conversations=1"))
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Tenant-scoped search over one chunks heap vs chunks hash-partitioned by user_id.
+
+Builds a synthetic multi-tenant corpus (random unit vectors, a few contracts
+per tenant, tenants of very different sizes) and times the multi-document
+search for a sample of tenants three ways:
+  heap, per contract  - before: no user_id on chunks, one search per
+                        contract, each one filtering the whole table
+  heap, tenant        - one search, user_id filter over the whole table
+  partitioned, tenant - one search over the tenant's partition only (what
+                        partition pruning gives Postgres)
+
+Partitions are simulated with user_id % partitions (Postgres uses its own
+hash function - the layout, not the placement, is what matters here).
+
+With --live, EXPLAIN ANALYZE of the tenant-wide vector query is run against
+DATABASE_URL for --user-id, showing which partitions were scanned.
+
+Usage:
+    python benchmarks/partitioned_chunks.py
+    python benchmarks/partitioned_chunks.py --tenants 2000 --partitions 32
+    python benchmarks/partitioned_chunks.py --live --user-id 7
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DIM = 256
+
+
+def build_corpus(tenants: int, seed: int = 7):
+    """Chunks of every tenant in one array, plus the contract -> tenant mapping"""
+    rng = random.Random(seed)
+    user_ids, contract_ids = [], []
+    contract_owner = {}
+    contract_id = 0
+    for user_id in range(1, tenants + 1):
+        # Most tenants are small, a few are large
+        contracts = min(int(rng.paretovariate(1.5)), 40)
+        for _ in range(contracts):
+            contract_id += 1
+            contract_owner[contract_id] = user_id
+            chunks = rng.randint(20, 120)
+            user_ids.extend([user_id] * chunks)
+            contract_ids.extend([contract_id] * chunks)
+
+    np_rng = np.random.default_rng(seed)
+    embeddings = np_rng.standard_normal((len(user_ids), DIM), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return {
+        "user_id": np.array(user_ids),
+        "contract_id": np.array(contract_ids),
+        "embeddings": embeddings,
+        "contract_owner": contract_owner,
+    }
+
+
+def partition(corpus, partitions: int):
+    """Split the heap into hash partitions by user_id"""
+    parts = []
+    for remainder in range(partitions):
+        rows = np.flatnonzero(corpus["user_id"] % partitions == remainder)
+        parts.append({
+            "rows": rows,
+            "user_id": corpus["user_id"][rows],
+            "embeddings": corpus["embeddings"][rows],
+        })
+    return parts
+
+
+def top_k(embeddings, rows, query, k: int):
+    if len(rows) == 0:
+        return rows
+    distances = embeddings[rows] @ -query
+    best = np.argpartition(distances, min(k, len(rows) - 1))[:k]
+    return rows[best[np.argsort(distances[best])]]
+
+
+def search_heap_per_contract(corpus, user_id: int, query, k: int):
+    """One filtered search per contract of the tenant (contract ids from contracts)"""
+    hits = []
+    for contract_id, owner in corpus["contract_owner"].items():
+        if owner != user_id:
+            continue
+        rows = np.flatnonzero(corpus["contract_id"] == contract_id)
+        hits.extend(top_k(corpus["embeddings"], rows, query, k))
+    return hits
+
+
+def search_heap_tenant(corpus, user_id: int, query, k: int):
+    rows = np.flatnonzero(corpus["user_id"] == user_id)
+    return top_k(corpus["embeddings"], rows, query, k)
+
+
+def search_partition_tenant(parts, user_id: int, query, k: int):
+    part = parts[user_id % len(parts)]
+    local = np.flatnonzero(part["user_id"] == user_id)
+    hits = top_k(part["embeddings"], local, query, k)
+    return part["rows"][hits]
+
+
+def timed(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_offline(args):
+    corpus = build_corpus(args.tenants)
+    parts = partition(corpus, args.partitions)
+    sizes = [len(p["rows"]) for p in parts]
+    print(
+        f"Corpus: {args.tenants} tenants, {len(corpus['contract_owner'])} contracts, "
+        f"{len(corpus['user_id'])} chunks; {args.partitions} partitions of "
+        f"{min(sizes)}-{max(sizes)} chunks\n"
+    )
+
+    rng = random.Random(11)
+    np_rng = np.random.default_rng(11)
+    tenants = rng.sample(range(1, args.tenants + 1), min(args.queries, args.tenants))
+    results = {"heap, per contract": [], "heap, tenant": [], "partitioned, tenant": []}
+    for user_id in tenants:
+        query = np_rng.standard_normal(DIM, dtype=np.float32)
+        query /= np.linalg.norm(query)
+        results["heap, per contract"].append(timed(lambda: search_heap_per_contract(corpus, user_id, query, args.top_k), args.runs))
+        results["heap, tenant"].append(timed(lambda: search_heap_tenant(corpus, user_id, query, args.top_k), args.runs))
+        results["partitioned, tenant"].append(timed(lambda: search_partition_tenant(parts, user_id, query, args.top_k), args.runs))
+
+        # Same rows whichever way the tenant's chunks are found
+        expected = set(search_heap_tenant(corpus, user_id, query, args.top_k))
+        assert set(search_partition_tenant(parts, user_id, query, args.top_k)) == expected
+
+    baseline = statistics.mean(results["heap, per contract"])
+    print(f"{'layout':22} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+    for name, timings in results.items():
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(
+            f"{name:22} {statistics.median(timings) * 1000:8.2f} {p95 * 1000:8.2f} "
+            f"{baseline / statistics.mean(timings):7.1f}x"
+        )
+
+
+def run_live(args):
+    from sqlalchemy import text
+    from app.database import SessionLocal
+    from app.hybrid_search import _STATEMENTS, TENANT_SCOPE
+
+    vector_sql, _ = _STATEMENTS[(TENANT_SCOPE, False)]
+    db = SessionLocal()
+    try:
+        embedding = db.execute(
+            text("SELECT embedding FROM contract_chunks WHERE user_id = :user_id LIMIT 1"),
+            {"user_id": args.user_id}
+        ).scalar()
+        if embedding is None:
+            sys.exit(f"User {args.user_id} has no chunks (or contract_chunks isn't migrated yet)")
+
+        plan = db.execute(
+            text(f"EXPLAIN (ANALYZE, COSTS OFF) {vector_sql.text}"),
+            {"query_embedding": str(list(embedding)), "user_id": args.user_id, "limit": args.top_k}
+        ).scalars().all()
+        print("\n".join(plan))
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=50, help="tenants to search")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--live", action="store_true", help="EXPLAIN ANALYZE the tenant query against DATABASE_URL")
+    parser.add_argument("--user-id", type=int, help="tenant to search with --live")
+    args = parser.parse_args()
+
+    if args.live:
+        if args.user_id is None:
+            parser.error("--live needs --user-id")
+        run_live(args)
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Retrieval quality and latency of hybrid search, per configuration.
+
+Loads a labeled contract Q&A set into a scratch pgvector database, the way
+/upload stores it (same chunking, Cohere embeddings, one tenant per
+contract), then runs every question through the real hybrid_search() /
+hybrid_search_tenant() (vector + keyword SQL, reciprocal_rank_fusion) and
+rerank_chunks() for each combination of:
+  --index   none | hnsw | ivfflat   embedding index on contract_chunks
+  --top-k   candidates fetched by hybrid search before reranking
+  --rrf-k   Reciprocal Rank Fusion constant (RRF_K)
+
+and reports, for the fused and the reranked list:
+  recall@k  share of a question's relevant chunks in the top --k
+  MRR       1 / rank of the first relevant chunk
+  nDCG@k    rank-weighted recall
+plus p50/p95/p99 latency of the search, the rerank, and each stage
+(embed_query, vector_sql, keyword_sql, rrf, rerank).
+
+A chunk is relevant to a question when it contains (part of) one of the
+question's answer spans. Datasets:
+  default      synthetic contracts from contract_corpus.py, answers = the
+               clause the question asks about
+  --dataset    SQuAD-format JSON, e.g. CUAD (CUAD_v1.json): one contract
+               per title, questions without answers skipped
+
+Embeddings come from Cohere, or from benchmarks/fake_services.py with
+COHERE_BASE_URL=http://localhost:9101/v1 (a lexical stand-in: good for
+catching regressions in fusion, reranking and index settings, not for
+judging Cohere). The first run downloads the reranker model.
+
+The database must be a scratch one: the benchmark creates the tables,
+replaces the embedding index per --index, and restores the HNSW index at
+the end. --skip-load reuses the data of an earlier run.
+
+Regression gate (exit code 1 on failure):
+  --save FILE                 write the results
+  --baseline FILE             compare with saved results, same configurations
+  --max-quality-drop 0.02     allowed absolute drop of recall / MRR / nDCG
+  --max-latency-increase 0.25 allowed relative p95 increase of search / rerank
+  --min-recall 0.8            absolute floor, every configuration
+
+Usage:
+    python benchmarks/retrieval_quality.py --database-url postgresql://localhost/jurisai_bench
+    python benchmarks/retrieval_quality.py --database-url ... --index none hnsw ivfflat --top-k 10 20 --rrf-k 10 60
+    python benchmarks/retrieval_quality.py --database-url ... --dataset CUAD_v1.json --max-contracts 20
+    python benchmarks/retrieval_quality.py --database-url ... --skip-load --baseline main.json --save pr.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BENCH_EMAIL = "retrieval-bench-{}@example.invalid"
+EMBEDDING_INDEXES = ("idx_chunk_embedding_hnsw", "idx_chunk_embedding_ivfflat")
+STAGES = ("embed_query", "vector_sql", "keyword_sql", "rrf", "rerank")
+
+
+# ---------------------------
+# Dataset
+# ---------------------------
+
+def synthetic_dataset(count: int, clauses: int, seed: int) -> list:
+    import random
+    from contract_corpus import QUESTIONS, make_contract, contract_lines
+
+    rng = random.Random(seed)
+    documents = []
+    for index in range(count):
+        contract = make_contract(rng, index, clauses)
+        documents.append({
+            "name": contract["filename"],
+            "text": "\n".join(contract_lines(contract)),
+            "questions": [
+                {"question": QUESTIONS[clause], "answers": contract["answers"][clause]}
+                for clause in contract["clause_types"]
+            ],
+        })
+    return documents
+
+
+def squad_dataset(path: str, max_contracts: int, max_questions: int) -> list:
+    """SQuAD-format file (CUAD): one document per title"""
+    documents = []
+    for entry in json.loads(Path(path).read_text())["data"][:max_contracts]:
+        text = "\n".join(paragraph["context"] for paragraph in entry["paragraphs"])
+        questions = [
+            {"question": qa["question"], "answers": [a["text"] for a in qa["answers"]]}
+            for paragraph in entry["paragraphs"] for qa in paragraph["qas"] if qa["answers"]
+        ]
+        documents.append({"name": entry["title"][:200], "text": text, "questions": questions[:max_questions]})
+    return documents
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def relevant_chunks(chunks: list, answers: list, edge: int = 40) -> set:
+    """Indexes of the chunks holding an answer span (or its start / end, for spans cut by chunking)"""
+    normalized = [_normalize(chunk) for chunk in chunks]
+    relevant = set()
+    for answer in map(_normalize, answers):
+        if not answer:
+            continue
+        probes = {answer[:edge], answer[-edge:]}
+        for index, chunk in enumerate(normalized):
+            if answer in chunk or chunk in answer or any(probe in chunk for probe in probes):
+                relevant.add(index)
+    return relevant
+
+
+# ---------------------------
+# Database
+# ---------------------------
+
+def load(documents: list) -> list:
+    """Store the documents as one tenant each; returns the questions with their chunk ids"""
+    from sqlalchemy import delete, select
+    from app.database import User, Contract, ContractChunk, init_db, session_scope
+    from app.embeddingmaker import generate_many_embeddings
+    from app.pdf_read_chunk import chunk_text
+
+    init_db()
+    with session_scope() as db:
+        db.execute(delete(User).where(User.email.like(BENCH_EMAIL.format("%"))))
+
+    questions = []
+    for number, document in enumerate(documents):
+        chunks = chunk_text(document["text"], chunk_size=500, overlap=50)
+        embeddings = generate_many_embeddings(chunks)
+        with session_scope() as db:
+            user = User(email=BENCH_EMAIL.format(number), hashed_password="!")
+            db.add(user)
+            db.flush()
+            contract = Contract(user_id=user.id, filename=document["name"], num_chunks=len(chunks))
+            db.add(contract)
+            db.flush()
+            db.add_all([
+                ContractChunk(user_id=user.id, contract_id=contract.id, chunk_text=chunk,
+                              chunk_index=index, embedding=embedding)
+                for index, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+            ])
+            db.flush()
+            ids = dict(db.execute(
+                select(ContractChunk.chunk_index, ContractChunk.id).where(ContractChunk.contract_id == contract.id)
+            ).all())
+            for question in document["questions"]:
+                relevant = relevant_chunks(chunks, question["answers"])
+                if relevant:
+                    questions.append({
+                        "question": question["question"], "user_id": user.id, "contract_id": contract.id,
+                        "relevant": sorted(ids[index] for index in relevant),
+                    })
+        print(f"📄 Loaded {document['name']}: {len(chunks)} chunks")
+    return questions
+
+
+def build_index(kind: str, ivfflat_lists: int):
+    """Replace the embedding index on contract_chunks (created on every partition)"""
+    from sqlalchemy import text
+    from app.database import engine
+
+    with engine.connect() as conn:
+        for name in EMBEDDING_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        start = time.perf_counter()
+        if kind == "hnsw":
+            conn.execute(text(
+                "CREATE INDEX idx_chunk_embedding_hnsw ON contract_chunks USING hnsw (embedding vector_l2_ops)"
+            ))
+        elif kind == "ivfflat":
+            rows = conn.execute(text("SELECT count(*) FROM contract_chunks")).scalar()
+            lists = ivfflat_lists or max(4, rows // 1000)
+            conn.execute(text(
+                f"CREATE INDEX idx_chunk_embedding_ivfflat ON contract_chunks "
+                f"USING ivfflat (embedding vector_l2_ops) WITH (lists = {lists})"
+            ))
+        conn.execute(text("ANALYZE contract_chunks"))
+        conn.commit()
+    if kind != "none":
+        print(f"🗂️ Built {kind} index in {time.perf_counter() - start:.1f}s")
+
+
+def _session_settings(db, args):
+    from sqlalchemy import text
+    db.execute(text("SELECT set_config('hnsw.ef_search', :value, false)"), {"value": str(args.hnsw_ef_search)})
+    db.execute(text("SELECT set_config('ivfflat.probes', :value, false)"), {"value": str(args.ivfflat_probes)})
+
+
+def uses_vector_index(db, question: dict, scope: str, top_k: int) -> bool:
+    """Whether Postgres plans the vector query on an embedding index"""
+    from sqlalchemy import text
+    from app.embeddingmaker import generate_embedding
+    from app.hybrid_search import _search_scope, _search_statements, _search_params
+
+    contract_id = question["contract_id"] if scope == "contract" else None
+    scope_sql, scope_params = _search_scope(contract_id, question["user_id"])
+    vector_sql, _ = _search_statements(scope_sql, None)
+    vector_params, _ = _search_params(question["question"], generate_embedding(question["question"]), scope_params, top_k, None)
+    plan = db.execute(text("EXPLAIN " + vector_sql.text), vector_params).scalars().all()
+    return any(name in line for line in plan for name in EMBEDDING_INDEXES)
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+
+def recall_at(ranked: list, relevant: set, k: int) -> float:
+    return len(set(ranked[:k]) & relevant) / len(relevant)
+
+
+def reciprocal_rank(ranked: list, relevant: set) -> float:
+    for rank, chunk_id in enumerate(ranked, start=1):
+        if chunk_id in relevant:
+            return 1 / rank
+    return 0.0
+
+
+def ndcg_at(ranked: list, relevant: set, k: int) -> float:
+    dcg = sum(1 / math.log2(rank + 1) for rank, chunk_id in enumerate(ranked[:k], start=1) if chunk_id in relevant)
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return dcg / ideal
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {f"p{q}": ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] * 1000 for q in (50, 95, 99)}
+
+
+def quality(rankings: list, k: int) -> dict:
+    return {
+        "recall": sum(recall_at(ranked, relevant, k) for ranked, relevant in rankings) / len(rankings),
+        "mrr": sum(reciprocal_rank(ranked, relevant) for ranked, relevant in rankings) / len(rankings),
+        "ndcg": sum(ndcg_at(ranked, relevant, k) for ranked, relevant in rankings) / len(rankings),
+    }
+
+
+# ---------------------------
+# Runs
+# ---------------------------
+
+def run_config(db, questions: list, args, index: str, top_k: int, rrf_k: int) -> dict:
+    from app.config import settings
+    from app.hybrid_search import hybrid_search, hybrid_search_tenant, rerank_chunks
+    from app.metrics import collect_timings
+
+    settings.RRF_K = rrf_k
+    fused, reranked = [], []
+    search_seconds, rerank_seconds = [], []
+    stages = {stage: [] for stage in STAGES}
+
+    for question in questions:
+        relevant = set(question["relevant"])
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet, collect_timings() as timings:
+            start = time.perf_counter()
+            if args.scope == "contract":
+                results = hybrid_search(db, question["question"], question["contract_id"], top_k, user_id=question["user_id"])
+            else:
+                results = hybrid_search_tenant(db, question["question"], question["user_id"], top_k)
+            search_seconds.append(time.perf_counter() - start)
+            fused.append(([r["chunk_id"] for r in results], relevant))
+
+            if not args.no_rerank:
+                start = time.perf_counter()
+                top = rerank_chunks(question["question"], [dict(r) for r in results], args.k)
+                rerank_seconds.append(time.perf_counter() - start)
+                reranked.append(([r["chunk_id"] for r in top], relevant))
+
+        for stage, (seconds, _count) in timings.stages.items():
+            if stage in stages:
+                stages[stage].append(seconds)
+
+    return {
+        "config": {"index": index, "top_k": top_k, "rrf_k": rrf_k, "scope": args.scope, "k": args.k},
+        "index_used": uses_vector_index(db, questions[0], args.scope, top_k) if index != "none" else False,
+        "hybrid": quality(fused, args.k),
+        "reranked": quality(reranked, args.k) if reranked else None,
+        "latency_ms": {
+            "search": percentiles(search_seconds),
+            "rerank": percentiles(rerank_seconds),
+            "stages": {stage: percentiles(values) for stage, values in stages.items() if values},
+        },
+    }
+
+
+def config_key(config: dict) -> str:
+    return f"{config['index']}/top_k={config['top_k']}/rrf_k={config['rrf_k']}/{config['scope']}/k={config['k']}"
+
+
+def report(results: list):
+    print(
+        f"\n{'configuration':36} {'recall':>7} {'MRR':>6} {'nDCG':>6} │ {'+rerank':>7} {'MRR':>6} {'nDCG':>6} │ "
+        f"{'search p50/p95/p99 ms':>22} {'rerank p50/p95 ms':>18}"
+    )
+    for result in results:
+        hybrid, reranked = result["hybrid"], result["reranked"] or {}
+        search, rerank = result["latency_ms"]["search"], result["latency_ms"]["rerank"]
+        label = config_key(result["config"]).rsplit("/", 2)[0] + ("" if result["index_used"] or result["config"]["index"] == "none" else " (unused)")
+        print(
+            f"{label:36} {hybrid['recall']:7.3f} {hybrid['mrr']:6.3f} {hybrid['ndcg']:6.3f} │ "
+            f"{reranked.get('recall', float('nan')):7.3f} {reranked.get('mrr', float('nan')):6.3f} "
+            f"{reranked.get('ndcg', float('nan')):6.3f} │ "
+            f"{search['p50']:8.1f}/{search['p95']:6.1f}/{search['p99']:6.1f} "
+            f"{rerank.get('p50', 0):9.1f}/{rerank.get('p95', 0):6.1f}"
+        )
+
+    print(f"\n{'configuration':36} " + " ".join(f"{stage + ' p95':>15}" for stage in STAGES))
+    for result in results:
+        stages = result["latency_ms"]["stages"]
+        print(
+            f"{config_key(result['config']).rsplit('/', 2)[0]:36} "
+            + " ".join(f"{stages[stage]['p95']:15.1f}" if stage in stages else f"{'-':>15}" for stage in STAGES)
+        )
+
+
+def regressions(results: list, args) -> list:
+    failures = []
+    baseline = {}
+    if args.baseline:
+        baseline = {config_key(r["config"]): r for r in json.loads(Path(args.baseline).read_text())["results"]}
+
+    for result in results:
+        key = config_key(result["config"])
+        metrics = result["reranked"] or result["hybrid"]
+        if args.min_recall is not None and metrics["recall"] < args.min_recall:
+            failures.append(f"{key}: recall@{args.k} {metrics['recall']:.3f} < {args.min_recall}")
+
+        before = baseline.get(key)
+        if before is None:
+            continue
+        before_metrics = before["reranked"] or before["hybrid"]
+        for name in ("recall", "mrr", "ndcg"):
+            if before_metrics[name] - metrics[name] > args.max_quality_drop:
+                failures.append(f"{key}: {name} {before_metrics[name]:.3f} -> {metrics[name]:.3f}")
+        for part in ("search", "rerank"):
+            old, new = before["latency_ms"][part].get("p95"), result["latency_ms"][part].get("p95")
+            if old and new and new > old * (1 + args.max_latency_increase):
+                failures.append(f"{key}: {part} p95 {old:.1f}ms -> {new:.1f}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="scratch pgvector database (default $BENCH_DATABASE_URL)")
+    parser.add_argument("--dataset", help="SQuAD-format Q&A file (e.g. CUAD_v1.json); default synthetic contracts")
+    parser.add_argument("--contracts", type=int, default=30, help="synthetic contracts")
+    parser.add_argument("--clauses", type=int, default=14, help="sections per synthetic contract")
+    parser.add_argument("--max-contracts", type=int, default=20, help="contracts taken from --dataset")
+    parser.add_argument("--max-questions", type=int, default=41, help="questions per --dataset contract")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-load", action="store_true", help="reuse the data loaded by the last run")
+    parser.add_argument("--index", nargs="+", choices=["none", "hnsw", "ivfflat"], default=["hnsw"])
+    parser.add_argument("--top-k", nargs="+", type=int, default=[10], help="hybrid search candidates")
+    parser.add_argument("--rrf-k", nargs="+", type=int, default=[60])
+    parser.add_argument("--k", type=int, default=5, help="cutoff for recall / nDCG (chunks given to the LLM)")
+    parser.add_argument("--scope", choices=["contract", "tenant"], default="contract",
+                        help="search_contract tool vs multi-document search")
+    parser.add_argument("--no-rerank", action="store_true")
+    parser.add_argument("--hnsw-ef-search", type=int, default=40)
+    parser.add_argument("--ivfflat-lists", type=int, default=0, help="0 = rows / 1000 (min 4)")
+    parser.add_argument("--ivfflat-probes", type=int, default=10)
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare with")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-increase", type=float, default=0.25)
+    parser.add_argument("--min-recall", type=float)
+    parser.add_argument("--verbose", action="store_true", help="keep the search log lines")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("give --database-url (or BENCH_DATABASE_URL) of a scratch database")
+    # Before app.config is imported: every engine points at the scratch database
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_REPLICA_URL"] = ""
+
+    # Labels of the loaded data, for --skip-load
+    questions_file = Path(tempfile.gettempdir()) / f"retrieval_questions_{args.database_url.rsplit('/', 1)[-1]}.json"
+    if args.skip_load:
+        questions = json.loads(questions_file.read_text())
+    else:
+        if args.dataset:
+            documents = squad_dataset(args.dataset, args.max_contracts, args.max_questions)
+        else:
+            documents = synthetic_dataset(args.contracts, args.clauses, args.seed)
+        questions = load(documents)
+        questions_file.write_text(json.dumps(questions))
+    print(f"❓ {len(questions)} questions with relevant chunks")
+
+    from app.database import SessionLocal
+    from app.hybrid_search import get_reranker
+
+    if not args.no_rerank:
+        get_reranker()
+    results = []
+    db = SessionLocal()
+    try:
+        for index in args.index:
+            # No open transaction on contract_chunks while its index is replaced
+            db.close()
+            build_index(index, args.ivfflat_lists)
+            _session_settings(db, args)
+            for top_k in args.top_k:
+                for rrf_k in args.rrf_k:
+                    results.append(run_config(db, questions, args, index, top_k, rrf_k))
+                    print(f"✅ {config_key(results[-1]['config'])}")
+    finally:
+        db.close()
+        if args.index != ["hnsw"]:
+            build_index("hnsw", 0)
+
+    report(results)
+    if args.save:
+        Path(args.save).write_text(json.dumps({"args": vars(args), "results": results}, indent=2, default=str))
+        print(f"\n💾 Wrote {args.save}")
+
+    failures = regressions(results, args)
+    if failures:
+        print("\n❌ Regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    if args.baseline or args.min_recall is not None:
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Unique vs shared memory per worker process.
+
+Reads /proc/<pid>/smaps_rollup (Linux) for each worker:
+  RSS     - resident memory, shared pages counted in full
+  PSS     - shared pages split evenly between the processes sharing them
+  unique  - private pages (what one more worker costs)
+  shared  - pages shared with the master / other workers
+
+Two modes:
+  --pid MASTER        measure the workers of a running gunicorn master, e.g.
+                      PRELOAD_MODELS=true gunicorn -c gunicorn.conf.py app.main:app
+  --simulate          no server needed: a stand-in model (--model-mb of
+                      weights) is either loaded by every worker after the fork,
+                      or preloaded in the parent with app.preload (shared
+                      weights + gc.freeze) and only used by the workers.
+                      Each worker runs inference before being measured.
+
+Usage:
+    python benchmarks/shared_memory.py --pid $(pgrep -o -f "gunicorn -c gunicorn.conf.py")
+    python benchmarks/shared_memory.py --simulate --workers 4 --model-mb 200
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def smaps(pid: int) -> dict:
+    """smaps_rollup fields of a process, in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            key, _, rest = line.partition(":")
+            if key in FIELDS:
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def children(pid: int) -> list:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # ppid is the 4th field, after "(comm)" which may contain spaces
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def report(title: str, pids: list):
+    print(f"\n{title}")
+    print(f"{'pid':>8} {'RSS MB':>8} {'PSS MB':>8} {'unique MB':>10} {'shared MB':>10}")
+    total_pss = total_unique = 0.0
+    for pid in pids:
+        m = smaps(pid)
+        unique = m["Private_Clean"] + m["Private_Dirty"]
+        shared = m["Shared_Clean"] + m["Shared_Dirty"]
+        total_pss += m["Pss"]
+        total_unique += unique
+        print(f"{pid:>8} {m['Rss']:8.0f} {m['Pss']:8.0f} {unique:10.0f} {shared:10.0f}")
+    print(f"{'workers':>8} {'':8} {total_pss:8.0f} {total_unique:10.0f}   (PSS = their real share of RAM)")
+
+
+# ---------------------------
+# Simulation
+# ---------------------------
+
+def build_model(model_mb: int):
+    import torch
+    width = 1024
+    layers = max(1, model_mb * 1024 * 1024 // (width * width * 4))
+    return torch.nn.Sequential(*[torch.nn.Linear(width, width) for _ in range(layers)])
+
+
+def infer(model):
+    import torch
+    with torch.inference_mode():
+        model(torch.randn(8, 1024))
+
+
+def hold_forever(value):
+    """Keep value referenced, like a worker holds its model, until killed"""
+    while True:
+        time.sleep(60)
+
+
+def fork_workers(count: int, work):
+    """Fork workers that run work() and keep its result, report ready, then sleep until killed"""
+    pids, ready = [], []
+    for _ in range(count):
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            result = work()
+            os.write(write_end, b"1")
+            hold_forever(result)
+        os.close(write_end)
+        pids.append(pid)
+        ready.append(read_end)
+    for read_end in ready:
+        os.read(read_end, 1)
+        os.close(read_end)
+    return pids
+
+
+def stop(pids):
+    for pid in pids:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def simulate(args):
+    import gc
+    import importlib
+    # Loaded before fork in both scenarios, like the app's imports
+    importlib.import_module("torch")
+
+    def load_in_worker():
+        model = build_model(args.model_mb)
+        infer(model)
+        gc.collect()
+        return model
+
+    pids = fork_workers(args.workers, load_in_worker)
+    report(f"Each worker loads its own {args.model_mb} MB model", pids)
+    stop(pids)
+
+    from app.preload import _share_weights, freeze_heap, after_fork
+    gc.disable()
+    model = build_model(args.model_mb)
+    _share_weights(model)
+    freeze_heap()
+
+    def use_preloaded():
+        after_fork()
+        infer(model)
+        gc.collect()
+
+    pids = fork_workers(args.workers, use_preloaded)
+    report(f"{args.model_mb} MB model preloaded in the parent (app.preload)", pids)
+    stop(pids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pid", type=int, help="gunicorn master pid")
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("Needs Linux (/proc/<pid>/smaps_rollup)")
+    if args.simulate:
+        simulate(args)
+    elif args.pid:
+        workers = children(args.pid)
+        if not workers:
+            sys.exit(f"No worker processes under pid {args.pid}")
+        report(f"Master {args.pid}", [args.pid])
+        report(f"{len(workers)} worker(s)", workers)
+    else:
+        parser.error("give --pid or --simulate")
+
+
+if __name__ == "__main__":
+    main()
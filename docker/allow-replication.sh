@@ -0,0 +1,5 @@
+#!/bin/bash
+# Let the local replica (docker-compose.replica.yml) stream WAL from this server.
+# Runs once, when the data volume is first initialized.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,44 @@
+"""
+gunicorn settings for production.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Workers are uvicorn workers (the app is ASGI). With PRELOAD_MODELS=true the
+app and the local models (reranker, clause model) are loaded once in the
+master and shared copy-on-write by the forked workers - see app/preload.py.
+"""
+import gc
+import os
+
+from app.config import settings
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# Import app.main (and the models, in when_ready) in the master, before fork
+preload_app = settings.PRELOAD_MODELS
+
+
+def on_starting(server):
+    if preload_app:
+        # No collections in the master until the fork: a collection now would
+        # leave free slots that later allocations fill in, scattered over the
+        # pages the workers are meant to share
+        gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first fork
+    if preload_app:
+        from app.preload import preload_models, freeze_heap
+        preload_models()
+        freeze_heap()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.preload import after_fork
+        after_fork()